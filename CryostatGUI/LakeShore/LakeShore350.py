@@ -2265,6 +2265,9 @@ class LakeShore350_bare:
 class LakeShore350(AbstractGPIBDeviceDriver, LakeShore350_bare):
     """docstring for LakeShore350"""
 
+    # chained queries (query_batch) must fit into the input buffer
+    batch_max_length = 64
+
     def __init__(self, *args, **kwargs):
         self._logger = logging.getLogger(
             "CryoGUI."
@@ -2280,6 +2283,9 @@ class LakeShore350(AbstractGPIBDeviceDriver, LakeShore350_bare):
 class LakeShore350_ethernet(AbstractEthernetDeviceDriver, LakeShore350_bare):
     """docstring for LakeShore350"""
 
+    # chained queries (query_batch) must fit into the input buffer
+    batch_max_length = 64
+
     def __init__(self, *args, **kwargs):
 
         super().__init__(*args, log=None, **kwargs)
@@ -208,26 +208,40 @@ class LakeShore350_ControlClient(AbstractLoopThreadClient):
         # self.t = self.t1
         self.run_finished = False
         # -------------------------------------------------------------------------------------------------------------------------
-        self.data["Temp_K"] = self.LakeShore350.ControlSetpointQuery(1)
+        # all queries in as few transmissions as possible
+        (
+            self.data["Temp_K"],
+            rampdata,
+            temp_list,
+            temp_list3,
+            self.data["Heater_Range"],
+            self.data["Heater_Output_percentage"],
+            temp_list2,
+            output,
+        ) = self.LakeShore350.query_batch(
+            (self.LakeShore350.ControlSetpointQuery, 1),
+            (self.LakeShore350.ControlSetpointRampParameterQuery, 1),
+            (self.LakeShore350.KelvinReadingQuery, 0),
+            (self.LakeShore350.SensorUnitsInputReadingQuery, 0),
+            (self.LakeShore350.HeaterRangeQuery, 1),
+            (self.LakeShore350.HeaterOutputQuery, 1),
+            (self.LakeShore350.ControlLoopPIDValuesQuery, 1),
+            (self.LakeShore350.OutputModeQuery, 1),
+        )
 
-        rampdata = self.LakeShore350.ControlSetpointRampParameterQuery(1)
         self.data["Ramp_Rate_Status"] = rampdata[0]
         self.data["Ramp_Rate"] = rampdata[1]
 
-        temp_list = self.LakeShore350.KelvinReadingQuery(0)
         self.data["Sensor_1_K"] = temp_list[0]
         self.data["Sensor_2_K"] = temp_list[1]
         self.data["Sensor_3_K"] = temp_list[2]
         self.data["Sensor_4_K"] = temp_list[3]
 
-        temp_list3 = self.LakeShore350.SensorUnitsInputReadingQuery(0)
         self.data["Sensor_1_Ohm"] = temp_list3[0]
         self.data["Sensor_2_Ohm"] = temp_list3[1]
         self.data["Sensor_3_Ohm"] = temp_list3[2]
         self.data["Sensor_4_Ohm"] = temp_list3[3]
 
-        self.data["Heater_Range"] = self.LakeShore350.HeaterRangeQuery(1)
-        self.data["Heater_Output_percentage"] = self.LakeShore350.HeaterOutputQuery(1)
         self.data["Heater_Output_mW"] = (
             self.data["Heater_Output_percentage"]
             / 100
@@ -237,11 +251,9 @@ class LakeShore350_ControlClient(AbstractLoopThreadClient):
         )
 
         self.data["Heater_Range_times_10"] = self.data["Heater_Range"] * 10
-        temp_list2 = self.LakeShore350.ControlLoopPIDValuesQuery(1)
         self.data["Loop_P_Param"] = temp_list2[0]
         self.data["Loop_I_Param"] = temp_list2[1]
         self.data["Loop_D_Param"] = temp_list2[2]
-        output = self.LakeShore350.OutputModeQuery(1)
         self.data["OutputMode"] = output[0]
         self.data["Input_Sensor"] = output[1]
 
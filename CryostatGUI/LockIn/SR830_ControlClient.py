@@ -31,6 +31,8 @@ import time
 
 from pymeasure.instruments.srs import SR830
 from drivers import ApplicationExit
+from simulation import is_simulated
+from simulation import SimulatedResource
 
 from util import AbstractLoopThreadClient
 from util import Window_trayService_ui
@@ -67,7 +69,11 @@ class SR830_ControlClient(AbstractLoopThreadClient):
 
         # -------------------------------------------------------------------------------------------------------------------------
         # Interface with hardware device
-        self.lockin = Lockin(InstrumentAddress, read_termination="\n")
+        if is_simulated(InstrumentAddress):
+            # the simulated resource serves as pymeasure adapter
+            self.lockin = Lockin(SimulatedResource(InstrumentAddress))
+        else:
+            self.lockin = Lockin(InstrumentAddress, read_termination="\n")
         # -------------------------------------------------------------------------------------------------------------------------
 
         # -------------------------------------------------------------------------------------------------------------------------
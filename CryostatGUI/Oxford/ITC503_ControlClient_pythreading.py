@@ -229,6 +229,8 @@ class ITC503_ControlClient_pythreading(Timerthread_Clients):
         )
 
         for key in self.sensors:
+            # answer commands in between the (slow) serial queries
+            self.zmq_interleave()
             try:
 
                 value = self.ITC.getValue(self.sensors[key])
@@ -889,6 +891,8 @@ class ITC503_ControlClient(AbstractLoopThreadClient):
         )
 
         for key in self.sensors:
+            # answer commands in between the (slow) serial queries
+            self.zmq_interleave()
             try:
 
                 value = self.ITC.getValue(self.sensors[key])
@@ -14,9 +14,6 @@ from pid import PidFileError
 from datetime import datetime as dt
 
 
-import pandas as pd
-import numpy as np
-
 from noconflict import classmaker
 
 import measureSequences as mS
@@ -28,7 +25,9 @@ from util.zmqcomms import dictdump
 from util.zmqcomms import zmqMainControl
 from util.util_misc import CustomStreamHandler
 from util.util_misc import calculate_timediff
+from util.util_misc import check_stability
 from util import problemAbort
+from util import CsvRowWriter
 
 from Sequence_abstract_measurements import AbstractMeasureResistance
 
@@ -65,6 +64,7 @@ class Sequence_functionsConvenience:
         implemented inside the class inheritance tree:
         self.getTemperature()
         self.readDataFromList()
+        self.watchStable()
     """
 
     def __init__(self, thresholdsconf: dict, tempdefinition: list, **kwargs):
@@ -167,6 +167,10 @@ class Sequence_functionsConvenience:
                 if set to 0, timeout is infinite, method blocks until stability
                 is reached
         """
+        getfunc = None
+        if type(self).getTemperature is not Sequence_functionsPersonal.getTemperature:
+            # a getTemperature of a child class is polled
+            getfunc = self.getTemperature
         return self._checkStable_Value(
             val=temp,
             direction=direction,
@@ -177,7 +181,7 @@ class Sequence_functionsConvenience:
             dataindicator2=self.tempdefinition[sensortype][1],
             value_name="temperature",
             value_unit="K",
-            getfunc=self.getTemperature,
+            getfunc=getfunc,
             thresholdsconf=self.thresholdsconf["temperature"],
         )
 
@@ -225,156 +229,130 @@ class Sequence_functionsConvenience:
                 if set to 0, timeout is infinite, method blocks until stability
                 is reached
 
+        param: getfunc:
+            callable returning the current value, if it is not the one
+            stored in the dataStore. If given, the value is polled every
+            second and its statistics are retrieved from the dataStore,
+            otherwise the dataStore is asked with watchStable
+
         TODO: change thresholdsconf to variable thing for different values
         """
-
-        if getfunc is None:
-
-            def getfunc():
-                return self.readDataFromList(
-                    dataindicator1=dataindicator1,
-                    dataindicator2=dataindicator2,
-                    Live=False,
-                )
-
         self._logger.debug(
             f"checking for stable {value_name}: {val} {value_unit} with mode {ApproachMode}"
         )
+        if ApproachMode != "Sweep":
+            # no information, value should really stabilize
+            direction = 0
 
         starttime = dt.now()
-
-        if direction == 0 or ApproachMode != "Sweep":
-            # no information, temp should really stabilize
-
-            stable = False
-            # count = None
-            value_now = 0
-            stable_values = []
-            while not stable:
-                if timeout == 0:
-                    pass
-                else:
-                    within_time_window, timediff = calculate_timediff(
-                        starttime, float(timeout)
-                    )
-                    if not within_time_window:
-                        return False
-
-                stable_values = []
-                self.check_running()
-
-                value_now = getfunc()
-                qdict = {
-                    "mean": {
-                        "instr": dataindicator1,
-                        "value": dataindicator2 + "_calc_ar_mean",
-                    },
-                    "stderr_rel": {
-                        "instr": dataindicator1,
-                        "value": dataindicator2 + "_calc_stderr_rel",
-                    },
-                    "relslope_Xpmin": {
-                        "instr": dataindicator1,
-                        "value": dataindicator2 + "_calc_slope_rel",
-                    },
-                    "slope_residuals": {
-                        "instr": dataindicator1,
-                        "value": dataindicator2 + "_calc_slope_residuals",
-                    },
-                }
-                all_data = self.retrieveDataMultiple(dataindicators=qdict, Live=True)
-                all_data["data"].update({"value": value_now})
-
-                all_values = [
-                    "value",
-                    "mean",
-                    "stderr_rel",
-                    "relslope_Xpmin",
-                    "slope_residuals",
-                ]
-                for ct, label in enumerate(all_values):
-                    try:
-                        vn = all_data["data"][label]
-                        if ct < 2:
-                            compared_value = abs(vn - val)
-                        else:
-                            compared_value = abs(vn)
-                        if compared_value < thresholdsconf[label]:
-                            stable_values.append(label)
-                    except TypeError as e_type:
-                        # self._logger.warning("received wrong type (possibly None): ")
-                        self._logger.exception(e_type)
-                        continue
-
-                missing_values = [
-                    v_missing
-                    for v_missing in all_values
-                    if v_missing not in stable_values
-                ]
+        stable = False
+        while not stable:
+            if timeout != 0:
+                within_time_window, timediff = calculate_timediff(
+                    starttime, float(timeout)
+                )
+                if not within_time_window:
+                    return False
+            self.check_running()
+
+            if getfunc is None:
+                # the dataStore answers as soon as the criteria hold
+                answer = self.watchStable(
+                    dataindicator1,
+                    dataindicator2,
+                    target=val,
+                    thresholds=thresholdsconf,
+                    direction=direction,
+                    weak=weak,
+                )
+            else:
+                answer = self._pollStable(
+                    getfunc,
+                    dataindicator1,
+                    dataindicator2,
+                    target=val,
+                    thresholds=thresholdsconf,
+                    direction=direction,
+                    weak=weak,
+                )
+            value_now = answer["data"]["value"]
+            stable = answer["stable"] and answer["uptodate"]
+            if direction == 0:
+                stable_values = answer["stable_values"]
                 self._logger.info(
                     f"waiting for {value_name}: {val:.4f}, current: {value_now:.4f}{value_unit}, "
                     + f"indicators ({len(stable_values):d}/5): {stable_values}, "
-                    + f"missing ({len(stable_values):d}/5): {missing_values}"
-                )
-
-                if len(stable_values) >= 5:
-                    stable = True
-                elif (
-                    weak
-                    and len(stable_values) >= 3
-                    and all(
-                        v_missing in missing_values for v_missing in ("value", "mean")
-                    )
-                ):
-                    stable = True
-                else:
-                    time.sleep(1)
-
-        elif direction == 1:
-            # temp should be rising, all temps above 'temp' are fine
-            value_now = getfunc()
-            while value_now < val:
-                value_now = getfunc()
-                try:
-                    float(value_now)
-                except TypeError as e_type:
-                    self._logger.exception(e_type)
-                    value_now = -np.inf
-                self.check_running()
-                self._logger.debug(
-                    f"{value_name} not yet above {val} (current: {value_now:.3f})"
+                    + f"missing ({len(answer['missing_values']):d}/5): {answer['missing_values']}"
                 )
-                time.sleep(1)
-        elif direction == -1:
-            # temp should be falling, all temps below 'temp' are fine
-            value_now = getfunc()
-            while value_now > val:
-                value_now = getfunc()
-                try:
-                    float(value_now)
-                except TypeError as e_type:
-                    self._logger.exception(e_type)
-                    value_now = np.inf
-                self.check_running()
+            elif not stable:
                 self._logger.debug(
-                    f"{value_name} not yet below {val} (current: {value_now:.3f})"
+                    f"{value_name} not yet {'above' if direction == 1 else 'below'} {val} (current: {value_now:.3f})"
                 )
-                time.sleep(1)
 
         self._logger.info(
             f"{value_name} {val} is stable! ({value_now}), ApproachMode = {ApproachMode}, direction = {direction}"
         )
         return True
 
+    def _pollStable(
+        self,
+        getfunc,
+        dataindicator1,
+        dataindicator2,
+        target,
+        thresholds,
+        direction=0,
+        weak=False,
+    ):
+        """check once whether the value from getfunc is stable
+
+        The statistics are retrieved from the live data of the dataStore,
+        the criteria are those of the dataStore (util_misc.check_stability).
+        If the value is not stable, wait a second before answering.
+        Answers like watchStable.
+        """
+        data = dict(value=getfunc())
+        if not direction:
+            qdict = {
+                label: {"instr": dataindicator1, "value": dataindicator2 + suffix}
+                for label, suffix in (
+                    ("mean", "_calc_ar_mean"),
+                    ("stderr_rel", "_calc_stderr_rel"),
+                    ("relslope_Xpmin", "_calc_slope_rel"),
+                    ("slope_residuals", "_calc_slope_residuals"),
+                )
+            }
+            data.update(
+                self.retrieveDataMultiple(dataindicators=qdict, Live=True)["data"]
+            )
+        stable, stable_values, missing_values = check_stability(
+            data, target, thresholds, direction=direction, weak=weak
+        )
+        if not stable:
+            time.sleep(1)
+        return dict(
+            stable=stable,
+            uptodate=True,
+            data=data,
+            stable_values=stable_values,
+            missing_values=missing_values,
+        )
+
 
 class Sequence_functionsPersonal:
     """docstring for Sequence_functionsPersonal"""
 
+    # flush policy of the datafile: seconds between flushes
+    # (0: after every data point), and whether to fsync
+    datafile_flush_interval = 0.0
+    datafile_fsync = False
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._logger = logging.getLogger(
             "CryoGUI." + __name__ + "." + self.__class__.__name__
         )
+        self.datafile_writer = None
 
     def setTemperature(self, temperature: float) -> None:
         """set the system temperature to parameter temperature
@@ -640,18 +618,34 @@ class Sequence_functionsPersonal:
         # return dict(res1=5, exc1=10, res2=8, exc2=10)
 
     def measuring_store_data(self, data: dict, datafile: str) -> None:
-        """Store measured data"""
+        """Store measured data
+
+        as one csv row: the scalar values, or the last ones
+        if all values are lists
+        """
         if not all(isinstance(data[key], list) for key in data):
-            df = pd.DataFrame(
-                {key: [data[key]] for key in data if not isinstance(data[key], list)}
-            )
+            row = {key: data[key] for key in data if not isinstance(data[key], list)}
         else:
-            df = pd.DataFrame(data)
+            row = {key: data[key][-1] for key in data}
+
+        if self.datafile_writer is None or self.datafile_writer.path != datafile:
+            self.close_datafile()
+            self.datafile_writer = CsvRowWriter(
+                datafile,
+                flush_interval=self.datafile_flush_interval,
+                fsync=self.datafile_fsync,
+            )
+        self.datafile_writer.write_row(row)
 
-        with open(datafile, "a", newline="") as f:
-            df.tail(1).to_csv(f, header=f.tell() == 0, index=False)
+        self._logger.debug(
+            " store the measured data: %s in the file: %s.", data, datafile
+        )
 
-        self._logger.debug(f" store the measured data: {data} in the file: {datafile}.")
+    def close_datafile(self) -> None:
+        """close the datafile which is kept open, writing what is buffered"""
+        if self.datafile_writer is not None:
+            self.datafile_writer.close()
+            self.datafile_writer = None
 
     def res_datafilecomment(self, comment: str, datafile: str) -> None:
         """write a comment to the datafile
@@ -669,6 +663,7 @@ class Sequence_functionsPersonal:
             'w': written over
         (to) the new datafile
         """
+        self.close_datafile()
         self.datafile = datafile
         if mode == "w":
             with open(datafile, "w") as f:
@@ -790,6 +785,7 @@ class Sequence_Thread_zmq(
             self._logger.error(fin)
 
         finally:
+            self.close_datafile()
             try:
                 self.sig_finished.emit(fin)
             except NameError:
@@ -0,0 +1,95 @@
+"""Benchmark: reading from a columnar archive vs the cooldown database
+
+The synthetic cooldown database of cooldown_queries.py is converted into
+an archive, compressed (zlib) and raw, reporting the time, the peak memory
+of the conversion (traced, in a separate run) and the sizes. Then one
+column of the LakeShore350 is read
+    - for the whole cooldown
+    - for one tenth of it, in the middle
+    - for the last hour
+from the database (CooldownDB.read) and from both archives
+(CooldownArchive.read), each time opening them anew.
+
+usage (from the CryostatGUI directory):
+    python benchmarks/archive_reads.py --rows 2000000 --db /tmp/cooldown.db
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import shutil
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from loggingFunctionality.dbquery import CooldownDB
+from loggingFunctionality.archive import archive
+from loggingFunctionality.archive import CooldownArchive
+
+from cooldown_queries import create
+from cooldown_queries import timed
+
+
+def size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def read(opener, path, t0, t1):
+    with opener(path) as source:
+        return source.read("LakeShore350", ["Sensor_1_K"], t0, t1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="reading from a columnar archive")
+    parser.add_argument("--rows", "-n", type=int, default=2000000)
+    parser.add_argument("--db", default="cooldown_benchmark.db")
+    parser.add_argument("--chunk-rows", type=int, default=65536)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        timed(f"creating {args.rows} rows", lambda: create(args.db, args.rows))
+    with CooldownDB(args.db, create_indexes=True) as db:
+        first, last = db.time_range("LakeShore350")
+    base = os.path.splitext(args.db)[0]
+    archives = dict(zlib=(base + ".zlib.archive", 1), raw=(base + ".raw.archive", 0))
+    for name, (path, level) in archives.items():
+        shutil.rmtree(path, ignore_errors=True)
+        timed(
+            f"archiving ({name})",
+            lambda: archive(args.db, path, args.chunk_rows, level),
+        )
+        shutil.rmtree(path)
+        peak = peak_memory(lambda: archive(args.db, path, args.chunk_rows, level))
+        print(f"{'':45} peak {peak / 1e6:7.1f} MB, size {size(path) / 1e6:7.1f} MB")
+    print(f"{'database':45} {'':12} size {size(args.db) / 1e6:7.1f} MB")
+
+    tenth = (last - first) / 10
+    ranges = {
+        "whole cooldown": (None, None),
+        "one tenth": (first + 4.5 * tenth, first + 5.5 * tenth),
+        "last hour": (last - 3600, last),
+    }
+    for label, (t0, t1) in ranges.items():
+        expected = timed(
+            f"{label}: database", lambda: read(CooldownDB, args.db, t0, t1)
+        )
+        for name, (path, _) in archives.items():
+            data = timed(
+                f"{label}: archive ({name})",
+                lambda: read(CooldownArchive, path, t0, t1),
+            )
+            assert np.array_equal(data["Sensor_1_K"], expected["Sensor_1_K"])
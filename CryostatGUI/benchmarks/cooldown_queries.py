@@ -0,0 +1,125 @@
+"""Benchmark: reading from a cooldown database
+
+A synthetic cooldown database (LakeShore350 and SR830, one row per second
+each) is created once, then the same data are read
+    - the former way: SELECT one column of the whole table, fetchall
+    - by CooldownDB.read, all rows of the whole cooldown
+    - by CooldownDB.read, binned to --points, for the whole cooldown
+    - by CooldownDB.read, binned to --points, for the last hour
+    - by CooldownDB.read, binned to --points, for the whole cooldown,
+      from the rollups, after backfilling them (which is timed as well)
+The binned reads before the backfill go through the rows (the rollups
+are not complete yet). The backfill is done once per database.
+
+usage (from the CryostatGUI directory):
+    python benchmarks/cooldown_queries.py --rows 2000000 --db /tmp/cooldown.db
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import argparse
+import sqlite3
+
+import numpy as np
+
+from loggingFunctionality.dbquery import CooldownDB
+from loggingFunctionality.dbquery import backfill_all
+from loggingFunctionality.dbquery import rollups_complete
+
+COLUMNS = [f"Sensor_{k}_K" for k in range(1, 5)] + [
+    f"Sensor_{k}_Ohm" for k in range(1, 5)
+]
+
+
+def create(dbname, rows, start=1.6e9):
+    """fill a new database with rows, like main_Logger (without index)"""
+    conn = sqlite3.connect(dbname)
+    conn.execute(
+        "CREATE TABLE LakeShore350 (id INTEGER PRIMARY KEY, timeseconds REAL,"
+        + ",".join(f"{c} REAL" for c in COLUMNS)
+        + ", realtime TEXT)"
+    )
+    conn.execute(
+        "CREATE TABLE SR830 (id INTEGER PRIMARY KEY, timeseconds REAL,"
+        " SampleResistance_Ohm REAL, realtime TEXT)"
+    )
+    rng = np.random.default_rng(0)
+    chunk = 100000
+    for first in range(0, rows, chunk):
+        n = min(chunk, rows - first)
+        times = (start + np.arange(first, first + n)).tolist()
+        values = (300 * rng.random((n, len(COLUMNS)))).tolist()
+        with conn:
+            conn.executemany(
+                "INSERT INTO LakeShore350 (timeseconds,{},realtime) VALUES ({})".format(
+                    ",".join(COLUMNS), ",".join("?" * (len(COLUMNS) + 2))
+                ),
+                [(t, *v, "UTC+0200") for t, v in zip(times, values)],
+            )
+            conn.executemany(
+                "INSERT INTO SR830 (timeseconds,SampleResistance_Ohm,realtime)"
+                " VALUES (?,?,?)",
+                [(t + 0.3, v[0], "UTC+0200") for t, v in zip(times, values)],
+            )
+    conn.close()
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:45} {(time.perf_counter() - start) * 1e3:10.1f} ms")
+    return result
+
+
+def legacy_read(dbname):
+    conn = sqlite3.connect(dbname)
+    cur = conn.cursor()
+    cur.execute("SELECT Sensor_1_K from LakeShore350")
+    temps = np.array(cur.fetchall())[:, 0]
+    cur.execute("SELECT timeseconds from LakeShore350")
+    times = np.array(cur.fetchall())[:, 0]
+    conn.close()
+    return times, temps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="reading from a cooldown database")
+    parser.add_argument("--rows", "-n", type=int, default=2000000)
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--db", default="cooldown_benchmark.db")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        timed(f"creating {args.rows} rows", lambda: create(args.db, args.rows))
+
+    timed("former: whole table, two SELECTs", lambda: legacy_read(args.db))
+    db = timed(
+        "CooldownDB (creating indexes)",
+        lambda: CooldownDB(args.db, create_indexes=True),
+    )
+    t0, t1 = db.time_range("LakeShore350")
+    timed("read: whole cooldown", lambda: db.read("LakeShore350", ["Sensor_1_K"]))
+    timed(
+        f"read: whole cooldown, {args.points} bins",
+        lambda: db.read("LakeShore350", ["Sensor_1_K"], max_points=args.points),
+    )
+    timed(
+        f"read: last hour, {args.points} bins",
+        lambda: db.read(
+            "LakeShore350", ["Sensor_1_K"], t1 - 3600, t1, max_points=args.points
+        ),
+    )
+    if not rollups_complete(db.conn.cursor(), "LakeShore350"):
+        timed("backfilling the rollups", lambda: backfill_all(args.db))
+    resolution = db.rollup_resolution(
+        "LakeShore350", ["Sensor_1_K"], t0, t1, args.points
+    )
+    timed(
+        f"read: whole cooldown, {args.points} bins, {resolution} s rollup",
+        lambda: db.read("LakeShore350", ["Sensor_1_K"], max_points=args.points),
+    )
+    db.close()
@@ -0,0 +1,155 @@
+"""Benchmark: writing data points into measurement datafiles
+
+Per data point, the time to append it to its datafile is compared
+    - measurement_Logger: the former store_data (isfile, open, nested
+      format passes, close per point) vs MeasurementRowWriter,
+      for 'multichannel' points
+    - Sequence measuring_store_data: the former pandas DataFrame and
+      to_csv per point vs CsvRowWriter
+and the files written both ways are checked to be identical.
+
+usage (from the CryostatGUI directory):
+    python benchmarks/measurement_writes.py --points 5000
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+
+from util import CsvRowWriter
+from util import MeasurementRowWriter
+
+HEADER = "# Measurement started on today\n"
+
+
+def legacy_measurement(data):
+    """measurement_Logger.store_data, as it was (multichannel only)"""
+    datastring = ""
+    temperatures = [
+        "{{{mean}:.5E}} {{{std}:.5E}} ".format(mean=mean, std=std)
+        for mean, std in zip(data["T_mean_K"], data["T_std_K"])
+    ]
+    for t in temperatures:
+        datastring += t
+    datastring = datastring.format(**data["T_mean_K"], **data["T_std_K"])
+    for instrument in data["resistances"]:
+        res_instr = [
+            "{{{name}:.10E}} ".format(name=key)
+            for key in data["resistances"][instrument]
+        ]
+        for r in res_instr:
+            datastring += r
+        datastring = datastring.format(**data["resistances"][instrument])
+    for group in ("voltages", "currents"):
+        for instrument in data[group]:
+            values = [
+                "{{{num}:.5E}} ".format(num=ct)
+                for ct, value in enumerate(data[group][instrument])
+            ]
+            datastring += "{} ".format(len(values))
+            for v in values:
+                datastring += v
+            datastring = datastring.format(*data[group][instrument])
+    datastring = "\n{ReadableTime} ".format(**data) + datastring
+    if os.path.isfile(data["datafile"]):
+        with open(data["datafile"], "a") as f:
+            f.write(datastring)
+    else:
+        with open(data["datafile"], "w") as f:
+            f.write(HEADER)
+            f.write(datastring)
+
+
+def legacy_csv(data, datafile):
+    """Sequence measuring_store_data, as it was"""
+    df = pd.DataFrame({key: [data[key]] for key in data})
+    with open(datafile, "a", newline="") as f:
+        df.tail(1).to_csv(f, header=f.tell() == 0, index=False)
+
+
+def multichannel(datafile):
+    return dict(
+        type="multichannel",
+        datafile=datafile,
+        ReadableTime=datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"),
+        T_mean_K={f"T{k}_mean": random.uniform(1.5, 300) for k in range(4)},
+        T_std_K={f"T{k}_std": random.uniform(0, 1e-2) for k in range(4)},
+        resistances={
+            f"Keithley2182_{i}": dict(
+                R=random.uniform(1, 1e4), residuals=random.random(), nonohmic=0
+            )
+            for i in (1, 2)
+        },
+        voltages={
+            f"Keithley2182_{i}": [random.random() for _ in range(4)] for i in (1, 2)
+        },
+        currents={
+            f"Keithley6221_{i}": [random.random() for _ in range(4)] for i in (1, 2)
+        },
+    )
+
+
+def csvrow():
+    return dict(
+        T_mean_K=random.uniform(1.5, 300),
+        T_std_K=random.uniform(0, 1e-2),
+        R_mean_Ohm=random.uniform(1, 1e4),
+        R_std_Ohm=random.random(),
+        timeseconds=time.time(),
+        ReadableTime=datetime.now(),
+        sample="S1",
+    )
+
+
+def timed(label, points, func):
+    start = time.perf_counter()
+    for point in points:
+        func(point)
+    elapsed = time.perf_counter() - start
+    print(f"{label:40} {elapsed / len(points) * 1e6:10.1f} us per point")
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="writing measurement datafiles")
+    parser.add_argument("--points", "-n", type=int, default=5000)
+    parser.add_argument("--flush-interval", type=float, default=0.0)
+    args = parser.parse_args()
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy, streamed = (os.path.join(tmp, f"{k}.dat") for k in ("a", "b"))
+        points = [multichannel(legacy) for _ in range(args.points)]
+        timed("measurement_Logger: former", points, legacy_measurement)
+        writer = MeasurementRowWriter(
+            streamed, header=HEADER, flush_interval=args.flush_interval
+        )
+        timed("measurement_Logger: MeasurementRowWriter", points, writer.write_point)
+        writer.close()
+        assert read(legacy) == read(streamed), "measurement files differ"
+
+        legacy, streamed = (os.path.join(tmp, f"{k}.csv") for k in ("a", "b"))
+        rows = [csvrow() for _ in range(args.points)]
+        timed(
+            "measuring_store_data: former (pandas)",
+            rows,
+            lambda row: legacy_csv(row, legacy),
+        )
+        writer = CsvRowWriter(streamed, flush_interval=args.flush_interval)
+        timed("measuring_store_data: CsvRowWriter", rows, writer.write_row)
+        writer.close()
+        assert read(legacy) == read(streamed), "csv files differ"
+    print("files written both ways are identical")
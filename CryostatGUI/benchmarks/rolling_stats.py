@@ -0,0 +1,102 @@
+"""Benchmark: incremental statistics (RollingStats) vs full-window recalculation
+
+Synthetic sensor data (a large offset with small noise and a drift, and a
+sine with missing values) is fed sample by sample into RingBuffers. After
+every sample, the statistics are obtained
+    - by RollingStats, updated with the new and the dropped sample
+    - by CALCULATIONS and SLOPES (as used by live_Logger_bare) over
+      the whole window, the fit on the non-NaN values
+The largest deviation per statistic, relative to the largest magnitude
+of that statistic during the run (slopes pass through zero), and the
+time per update are reported. The agreement within tolerance is checked
+by tests/test_rollingstats.py.
+
+usage (from the CryostatGUI directory):
+    python benchmarks/rolling_stats.py --samples 5000 --window 600
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import argparse
+
+import numpy as np
+
+from util import RingBuffer
+from util import RollingStats
+from util import CALCULATIONS
+from util import SLOPES
+
+
+def signals(n, rng):
+    """per sample: time, and the values of two channels"""
+    for k in range(n):
+        yield (
+            1.6e9 + k * 0.1 + rng.uniform(0, 0.01),
+            {
+                "offset_drift": 300 + rng.normal(0, 1e-4) + k * 1e-6,
+                "sine_gaps": np.nan if k % 97 == 0 else 4.2 + 0.1 * np.sin(k / 50),
+            },
+        )
+
+
+def reference(times, values):
+    """CALCULATIONS and SLOPES over the whole window, the fit redone on
+    the non-NaN values for windows containing NaN (see tests)"""
+    results = {c: f(times, values) for c, f in CALCULATIONS.items() if c != "slope"}
+    valid = ~np.isnan(values)
+    fit = CALCULATIONS["slope"](times[valid], values[valid])
+    results.update({c: f(fit, results["ar_mean"]) for c, f in SLOPES.items()})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="incremental vs full-window live statistics"
+    )
+    parser.add_argument("--samples", "-n", type=int, default=5000)
+    parser.add_argument("--window", "-w", type=int, default=600)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    buffers, stats, worst, scale = {}, {}, {}, {}
+    t_incremental = t_reference = 0
+    for k, (timestamp, sample) in enumerate(signals(args.samples, rng)):
+        for key, value in sample.items():
+            if key not in buffers:
+                buffers[key] = RingBuffer(args.window)
+                stats[key] = RollingStats(reanchor=args.window)
+            buffer, stat = buffers[key], stats[key]
+
+            start = time.perf_counter()
+            dropped = buffer.append(value, timestamp)
+            if stat.due():
+                stat.recompute(buffer.times(), buffer.view())
+            else:
+                stat.push(timestamp, value, dropped)
+            results = stat.results()
+            t_incremental += time.perf_counter() - start
+
+            if k < 3:
+                continue
+            start = time.perf_counter()
+            expected = reference(buffer.times(), buffer.view())
+            t_reference += time.perf_counter() - start
+
+            for calc, ref in expected.items():
+                deviation = abs(results[calc] - ref)
+                worst[key, calc] = max(worst.get((key, calc), 0), deviation)
+                scale[key, calc] = max(scale.get((key, calc), 0), abs(ref))
+
+    print(f"{'channel':14} {'statistic':16} {'max. rel. deviation':>20}")
+    for (key, calc), deviation in sorted(worst.items()):
+        print(f"{key:14} {calc:16} {deviation / scale[key, calc]:20.2e}")
+    updates = args.samples * len(buffers)
+    print(
+        f"\nper update: incremental {t_incremental / updates * 1e6:8.1f} us, "
+        f"full window {t_reference / updates * 1e6:8.1f} us  "
+        f"(window {args.window})"
+    )
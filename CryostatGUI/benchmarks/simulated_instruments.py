@@ -0,0 +1,144 @@
+"""Benchmark: duration of one iteration of the read loops of the
+ControlClients, against simulated instruments (see simulation.py)
+
+Every loop reads what the `running` method of its ControlClient reads,
+through the real driver, so the figures include the delays and locks
+of the drivers, and the modelled interface and device timings.
+With the same --seed, runs are reproducible.
+
+usage (from the CryostatGUI directory):
+    python benchmarks/simulated_instruments.py --iterations 20
+    python benchmarks/simulated_instruments.py --loops LakeShore350 LakeShore350_batched
+"""
+import sys
+import os
+
+base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(base)
+# the drivers of these two are imported by module name in their packages
+sys.path.append(os.path.join(base, "LakeShore"))
+sys.path.append(os.path.join(base, "Keithley"))
+
+import time
+import argparse
+import statistics
+
+from simulation import simulate
+from simulation import SimulatedResource
+from Oxford.itc503 import itc503
+from Oxford.ilm211 import ilm211
+from Oxford.ips120 import ips120
+from LakeShore350 import LakeShore350_ethernet
+from Keithley2182 import Keithley2182
+from Keithley6221 import Keithley6221
+
+
+def loop_LakeShore350(ls):
+    ls.ControlSetpointQuery(1)
+    ls.ControlSetpointRampParameterQuery(1)
+    ls.KelvinReadingQuery(0)
+    ls.SensorUnitsInputReadingQuery(0)
+    ls.HeaterRangeQuery(1)
+    ls.HeaterOutputQuery(1)
+    ls.ControlLoopPIDValuesQuery(1)
+    ls.OutputModeQuery(1)
+
+
+def loop_LakeShore350_batched(ls):
+    ls.query_batch(
+        (ls.ControlSetpointQuery, 1),
+        (ls.ControlSetpointRampParameterQuery, 1),
+        (ls.KelvinReadingQuery, 0),
+        (ls.SensorUnitsInputReadingQuery, 0),
+        (ls.HeaterRangeQuery, 1),
+        (ls.HeaterOutputQuery, 1),
+        (ls.ControlLoopPIDValuesQuery, 1),
+        (ls.OutputModeQuery, 1),
+    )
+
+
+def loop_ITC503(itc):
+    itc.getStatus()
+    for variable in (4, 0, 1, 2, 3, 5, 6, 7, 8, 9, 10):
+        itc.getValue(variable)
+
+
+def loop_ILM211(ilm):
+    ilm.getValue(1)
+    ilm.getValue(2)
+
+
+def loop_IPS120(ips):
+    ips.getStatus()
+    for variable in (0, 1, 2, 7, 8, 9, 18):
+        ips.getValue(variable)
+
+
+def loop_Keithley2182(nv):
+    nv.measureVoltage()
+
+
+def loop_SR830(lockin):
+    # the queries of pymeasure's SR830, as used by SR830_ControlClient
+    for command in ("FREQ?", "SLVL?", "OUTP?1", "OUTP?2", "OUTP?3", "OUTP?4"):
+        lockin.values(command)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="duration of the read loops against simulated instruments"
+    )
+    parser.add_argument("--iterations", "-n", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    parser.add_argument(
+        "--loops", nargs="*", default=None, help="e.g. LakeShore350_batched"
+    )
+    args = parser.parse_args()
+
+    options = dict(seed=args.seed, time_scale=args.time_scale)
+    addresses = dict(
+        LakeShore350="TCPIP::192.168.2.105::7777::SOCKET",
+        ITC503="ASRL6::INSTR",
+        ILM211="ASRL5::INSTR",
+        IPS120="ASRL4::INSTR",
+        Keithley6221="GPIB0::13::INSTR",
+        Keithley2182="GPIB0::7::INSTR",
+        SR830="GPIB0::9::INSTR",
+    )
+    for model, address in addresses.items():
+        simulate(address, model, **options)
+    simulate(
+        addresses["Keithley2182"],
+        "Keithley2182",
+        current_source=addresses["Keithley6221"],
+        **options,
+    )
+
+    instruments = dict(
+        LakeShore350=LakeShore350_ethernet(InstrumentAddress=addresses["LakeShore350"]),
+        ITC503=itc503(InstrumentAddress=addresses["ITC503"]),
+        ILM211=ilm211(InstrumentAddress=addresses["ILM211"]),
+        IPS120=ips120(InstrumentAddress=addresses["IPS120"]),
+        Keithley2182=Keithley2182(InstrumentAddress=addresses["Keithley2182"]),
+        SR830=SimulatedResource(addresses["SR830"]),
+    )
+    instruments["LakeShore350_batched"] = instruments["LakeShore350"]
+    source = Keithley6221(InstrumentAddress=addresses["Keithley6221"])
+    source.setCurrent(1e-5)
+    source.enable()
+
+    for name, instrument in instruments.items():
+        if args.loops and name not in args.loops:
+            continue
+        loop = globals()["loop_" + name]
+        times = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            loop(instrument)
+            times.append((time.perf_counter() - start) * 1e3)
+        print(
+            f"{name:<20} mean {statistics.mean(times):8.2f} ms, "
+            f"median {statistics.median(times):8.2f} ms, "
+            f"max {max(times):8.2f} ms  ({len(times)} iterations)"
+        )
@@ -0,0 +1,163 @@
+"""Benchmark: writing rows into a cooldown database, as main_Logger does
+Rows as sent by the LakeShore350_ControlClient are written into a fresh
+database file
+    - by main_Logger: one INSERT with all columns per row, executemany
+    - the former way: an INSERT of timeseconds, then one UPDATE per column,
+      each looking up the row by timeseconds (not indexed)
+committing every --commit-every rows. The rate is reported for the first
+and the last tenth of the rows, to see whether writing slows down as the
+table grows.
+
+The former way scans the whole table for every column of every row, so
+it is run with fewer rows (--legacy-rows).
+usage (from the CryostatGUI directory):
+    python benchmarks/sqlite_logger_writes.py --rows 1000000 --legacy-rows 5000
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import random
+import argparse
+import sqlite3
+import tempfile
+from types import SimpleNamespace
+from datetime import datetime
+
+from PyQt5.QtCore import QCoreApplication
+
+from loggingFunctionality.logger import main_Logger
+from loggingFunctionality.logger import testing_NaN
+from loggingFunctionality.logger import SQLFormatting
+from loggingFunctionality.logger import typeof
+from loggingFunctionality.logger import sql_buildDictTableString
+
+
+class LegacyWriter:
+    """INSERT + UPDATE per column -- as formerly in main_Logger"""
+
+    def __init__(self, cursor):
+        self.mycursor = cursor
+        self.houroffset = (datetime.now() - datetime.utcnow()).total_seconds() / 3600
+
+    def createtable(self, tablename, dictname):
+        sql = "CREATE TABLE IF NOT EXISTS {} ".format(tablename)
+        sql += sql_buildDictTableString(dictname)
+        self.mycursor.execute(sql)
+        for key in dictname.keys():
+            try:
+                sql = """ALTER TABLE  {} ADD COLUMN {} {}""".format(
+                    tablename, key, typeof(dictname[key])
+                )
+                self.mycursor.execute(sql)
+            except sqlite3.OperationalError:
+                pass
+
+    def updatetable(self, tablename, dictname):
+        sql = """INSERT INTO {} ({}) VALUES ({})""".format(
+            tablename, "timeseconds", dictname["timeseconds"]
+        )
+        self.mycursor.execute(sql)
+        for key in dictname:
+            var, bools = testing_NaN(dictname[key])
+            if isinstance(var, datetime):
+                var = (
+                    "UTC"
+                    + "{:+05.0f} ".format(self.houroffset)
+                    + var.strftime("%Y-%m-%d  %H:%M:%S.%f")
+                )
+            if not bools:
+                sql = """UPDATE {table} SET {column}={value} WHERE {sec}={sec_now}""".format(
+                    table=tablename,
+                    column=key,
+                    value=SQLFormatting(var),
+                    sec="""timeseconds""",
+                    sec_now=dictname["timeseconds"],
+                )
+                self.mycursor.execute(sql)
+
+    def store(self, datalist, names):
+        for data in datalist:
+            for name in names:
+                self.createtable(name, data[name])
+                self.updatetable(name, data[name])
+
+
+class Writer:
+    """main_Logger, only its database part"""
+
+    def __init__(self, cursor):
+        mainthread = SimpleNamespace(
+            sig_logging=SimpleNamespace(connect=lambda slot: None),
+            sig_logging_newconf=SimpleNamespace(connect=lambda slot: None),
+        )
+        self.logger = main_Logger(mainthread=mainthread)
+        self.logger.mycursor = cursor
+
+    def store(self, datalist, names):
+        self.logger.storing_to_database_many(datalist, names)
+
+
+def datapackage(n):
+    data = {f"Sensor_{k}_K": random.uniform(1.5, 300) for k in range(1, 5)}
+    data.update({f"Sensor_{k}_Ohm": random.uniform(50, 5e4) for k in range(1, 5)})
+    data.update(
+        Heater_Range=3,
+        Heater_Output_percentage=random.uniform(0, 100),
+        Heater_Output_mW=random.uniform(0, 10),
+        Loop_P_Param=50.0,
+        Loop_I_Param=20.0,
+        Loop_D_Param=0.0,
+        Input_Sensor=1,
+        Sensor_4_status=None,
+        realtime=datetime.now(),
+        timeseconds=1.6e9 + n * 0.5,
+    )
+    return {"LakeShore350": data}
+
+
+def run(writer_class, rows, commit_every):
+    """rates (rows/s) of the first and the last tenth, and overall"""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "cooldown.db"))
+        writer = writer_class(conn.cursor())
+        tenth = max(rows // 10, 1)
+        marks = [(0, 0.0)]
+        elapsed = 0
+        for first in range(0, rows, commit_every):
+            batch = [
+                datapackage(n) for n in range(first, min(first + commit_every, rows))
+            ]
+            start = time.perf_counter()
+            with conn:
+                writer.store(batch, ["LakeShore350"])
+            elapsed += time.perf_counter() - start
+            marks.append((first + len(batch), elapsed))
+        conn.close()
+
+    n_first, t_first = next((n, t) for n, t in marks if n >= tenth)
+    n_last, t_last = [(n, t) for n, t in marks if n <= rows - tenth][-1]
+    n_total, t_total = marks[-1]
+    return n_first / t_first, (n_total - n_last) / (t_total - t_last), rows / t_total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="rows/s into a cooldown database")
+    parser.add_argument("--rows", "-n", type=int, default=1000000)
+    parser.add_argument("--legacy-rows", type=int, default=5000)
+    parser.add_argument("--commit-every", type=int, default=1000)
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    random.seed(0)
+    print(
+        f"{'writer':10} {'rows':>8} {'first 10%':>12} {'last 10%':>12} {'overall':>12}"
+    )
+    for name, writer_class, rows in (
+        ("legacy", LegacyWriter, args.legacy_rows),
+        ("batched", Writer, args.rows),
+    ):
+        first, last, overall = run(writer_class, rows, args.commit_every)
+        print(f"{name:10} {rows:8d} {first:10.0f}/s {last:10.0f}/s {overall:10.0f}/s")
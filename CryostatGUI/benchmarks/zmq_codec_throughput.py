@@ -0,0 +1,133 @@
+"""Benchmark: throughput of the zmq message codecs
+
+A data package as it is sent upstream by the LakeShore350_ControlClient
+is encoded and decoded with
+    - the former wire format: dictdump (indented, sorted JSON)
+    - every codec in util.zmqcodecs which is available
+once on its own, and once sent through a PUB/SUB pair over tcp.
+
+usage (from the CryostatGUI directory):
+    python benchmarks/zmq_codec_throughput.py --messages 20000
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import random
+import argparse
+from json import loads as dictload
+from datetime import datetime
+from threading import Thread
+
+import zmq
+
+from util.zmqcomms import dictdump
+from util.zmqcodecs import CODECS
+from util.zmqcodecs import get_codec
+from util.zmqcodecs import encode_message
+from util.zmqcodecs import decode_message
+
+
+class LegacyCodec:
+    """indented, sorted JSON -- as formerly used in zmqcomms"""
+
+    name = "json (legacy dictdump)"
+    tag = None
+
+    @staticmethod
+    def encode(obj):
+        return dictdump(obj).encode("utf-8")
+
+    @staticmethod
+    def decode(data):
+        return dictload(data.decode("utf-8"))
+
+
+def datapackage():
+    """data as sent upstream by the LakeShore350_ControlClient"""
+    data = {f"Sensor_{n}_K": random.uniform(1.5, 300) for n in range(1, 5)}
+    data.update({f"Sensor_{n}_Ohm": random.uniform(50, 5e4) for n in range(1, 5)})
+    data.update(
+        Temp_K=4.2,
+        Ramp_Rate_Status=0,
+        Ramp_Rate=1.0,
+        Heater_Range=3,
+        Heater_Output_percentage=12.5,
+        Heater_Output_mW=1.25,
+        Heater_Range_times_10=30,
+        Loop_P_Param=50.0,
+        Loop_I_Param=20.0,
+        Loop_D_Param=0.0,
+        OutputMode=1,
+        Input_Sensor=1,
+        noblock=False,
+        realtime=datetime.now(),
+    )
+    return data
+
+
+def run_codec(codec, data, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        payload = codec.encode(data)
+    t_enc = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(n):
+        codec.decode(payload)
+    t_dec = time.perf_counter() - start
+    return len(payload), n / t_enc, n / t_dec
+
+
+def run_pubsub(codec, data, n, port):
+    """messages per second through PUB/SUB, including encoding and decoding"""
+    context = zmq.Context()
+    sub = context.socket(zmq.SUB)
+    sub.bind(f"tcp://127.0.0.1:{port}")
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    sub.setsockopt(zmq.RCVHWM, 0)
+    pub = context.socket(zmq.PUB)
+    pub.setsockopt(zmq.SNDHWM, 0)
+    pub.connect(f"tcp://127.0.0.1:{port}")
+    # wait until the subscription went through
+    while not sub.poll(10):
+        pub.send_multipart([b"warmup", b""])
+    while sub.poll(100):
+        sub.recv_multipart()
+
+    def receive():
+        for _ in range(n):
+            decode_message(sub.recv_multipart()[1])
+
+    receiver = Thread(target=receive)
+    start = time.perf_counter()
+    receiver.start()
+    for _ in range(n):
+        pub.send_multipart([b"LakeShore350", encode_message(data, codec)])
+    receiver.join()
+    elapsed = time.perf_counter() - start
+    pub.close()
+    sub.close()
+    context.term()
+    return n / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="throughput of the zmq codecs")
+    parser.add_argument("--messages", "-n", type=int, default=20000)
+    parser.add_argument("--port", type=int, default=5599)
+    args = parser.parse_args()
+
+    data = datapackage()
+    codecs = [LegacyCodec()] + [get_codec(name) for name in CODECS]
+
+    print(f"{'codec':25} {'bytes':>6} {'encode/s':>10} {'decode/s':>10}")
+    for codec in codecs:
+        size, enc_rate, dec_rate = run_codec(codec, data, args.messages)
+        print(f"{codec.name:25} {size:6d} {enc_rate:10.0f} {dec_rate:10.0f}")
+
+    print(f"\nPUB/SUB over tcp, {args.messages} messages")
+    for codec in codecs:
+        rate = run_pubsub(codec, data, args.messages, args.port)
+        print(f"{codec.name:25} {rate:10.0f} msg/s")
@@ -0,0 +1,104 @@
+"""Benchmark: round-trip latency of zmqMainControl.query_device_command
+
+A simulated instrument (no hardware, no VISA) is run in a Timerthread_Clients
+loop, once with the plain polling loop, and once in reactor mode.
+Every hardware cycle of the instrument consists of a number of slow
+"queries" (sleeps), between which zmq_interleave() is called, as it is done
+in the ITC503_ControlClient. The brokers are started in-process.
+
+usage (from the CryostatGUI directory):
+    python benchmarks/zmq_reactor_latency.py --requests 50
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import random
+import argparse
+import statistics
+from threading import Thread
+from datetime import datetime
+
+from util import Timerthread_Clients
+from util import zmqMainControl
+from util.broker import main as broker
+from util.broker_app_clients import main as broker_app_clients
+from util.broker_reqp import main as broker_reqp
+
+
+class SimulatedInstrument(Timerthread_Clients):
+    """instrument without hardware, every query in running() takes read_s"""
+
+    def __init__(self, n_reads=8, read_s=0.05, **kwargs):
+        super().__init__(**kwargs)
+        self.n_reads = n_reads
+        self.read_s = read_s
+
+    def running(self):
+        self.run_finished = False
+        for ct in range(self.n_reads):
+            self.zmq_interleave()
+            time.sleep(self.read_s)
+            self.data[f"Sensor_{ct + 1}_K"] = 4.2 + random.gauss(0, 1e-3)
+        self.data["realtime"] = datetime.now()
+        self.run_finished = True
+
+    def act_on_command(self, command):
+        pass
+
+    def query_on_command(self, command):
+        return dict(OK=True, Temperature_K=self.data.get("Sensor_1_K", None))
+
+
+def measure(control, device_id, n_requests, interval):
+    """query the device n times, at random phases of its loop"""
+    times = []
+    for _ in range(n_requests):
+        time.sleep(random.uniform(0, interval))
+        start = time.perf_counter()
+        control.query_device_command(
+            device_id, command={"measure_Sensor_K": "Sensor_1_K"}
+        )
+        times.append((time.perf_counter() - start) * 1e3)
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="round-trip latency of query_device_command"
+    )
+    parser.add_argument("--requests", "-n", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=1.0, help="loop interval [s]")
+    parser.add_argument("--reads", type=int, default=8, help="queries per cycle")
+    parser.add_argument("--read_s", type=float, default=0.05, help="time per query [s]")
+    args = parser.parse_args()
+
+    for target in (broker, broker_app_clients, broker_reqp):
+        Thread(target=target, daemon=True).start()
+    control = zmqMainControl(_ident="benchmark")
+
+    for reactor in (False, True):
+        identity = "SimulatedInstrument_reactor" if reactor else "SimulatedInstrument"
+        instrument = SimulatedInstrument(
+            identity=identity,
+            n_reads=args.reads,
+            read_s=args.read_s,
+            interval=args.interval,
+            zmq_reactor=reactor,
+            daemon=True,
+        )
+        instrument.start()
+        time.sleep(2 * args.interval)
+
+        times = measure(control, identity, args.requests, args.interval)
+        instrument.stopped.set()
+        instrument.join()
+
+        print(
+            f"reactor={reactor!s:5}: "
+            f"mean {statistics.mean(times):8.2f} ms, "
+            f"median {statistics.median(times):8.2f} ms, "
+            f"max {max(times):8.2f} ms  ({len(times)} requests)"
+        )
@@ -0,0 +1,73 @@
+"""Benchmark: round-trip latency of zmqMainControl.retrieveDataIndividual
+
+A minimal dataStore, which answers every question right away, is served
+in a thread, the PUB/SUB brokers are started in-process (for the
+handshakes). Every request is timed from sending until the answer
+with the matching uuid was decoded.
+
+usage (from the CryostatGUI directory):
+    python benchmarks/zmq_request_latency.py --requests 1000
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import argparse
+import statistics
+from threading import Thread
+from threading import Event
+from datetime import datetime
+
+from util import zmqMainControl
+from util.zmqcomms import zmqDataStore
+from util.broker import main as broker
+from util.broker_app_clients import main as broker_app_clients
+
+
+class AnsweringDataStore(zmqDataStore):
+    """dataStore without any data, answers with a constant"""
+
+    def get_answer(self, qdict):
+        return dict(data=4.2, uptodate=True, timediff=0, realtime=datetime.now())
+
+    def store_data(self, ID, data):
+        pass
+
+    def act_on_command(self, command):
+        pass
+
+
+def serve(datastore, stopped):
+    while not stopped.is_set():
+        datastore.zmq_serve(0.1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="round-trip latency of retrieveDataIndividual"
+    )
+    parser.add_argument("--requests", "-n", type=int, default=1000)
+    parser.add_argument("--codec", default="json")
+    args = parser.parse_args()
+
+    Thread(target=broker, daemon=True).start()
+    Thread(target=broker_app_clients, daemon=True).start()
+    datastore = AnsweringDataStore()
+    stopped = Event()
+    Thread(target=serve, args=(datastore, stopped), daemon=True).start()
+
+    control = zmqMainControl(_ident="benchmark", codec=args.codec)
+    times = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        control.retrieveDataIndividual("LakeShore350", "Sensor_1_K")
+        times.append((time.perf_counter() - start) * 1e3)
+    stopped.set()
+
+    print(
+        f"mean {statistics.mean(times):8.3f} ms, "
+        f"median {statistics.median(times):8.3f} ms, "
+        f"max {max(times):8.3f} ms  ({len(times)} requests)"
+    )
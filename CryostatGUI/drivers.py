@@ -16,6 +16,9 @@ Classes:
 
         AbstractGPIBDeviceDriver: used for interactions with a GPIB connection
 
+    Instruments at addresses which are simulated (see simulation.py) are
+    talked to without any VISA library.
+
 Author(s):
     bklebel (Benjamin Klebel)
 """
@@ -27,8 +30,11 @@ import visa
 from pyvisa.errors import VisaIOError
 from visa import constants as vconst
 import functools
+from collections import deque
 
 from util import ApplicationExit
+from simulation import is_simulated
+from simulation import SimulatedResourceManager
 
 connError = VisaIOError(-1073807194)
 timeouterror = VisaIOError(-1073807339)
@@ -38,7 +44,10 @@ visaNotFoundError = VisaIOError(-1073807343)
 logger = logging.getLogger("CryoGUI." + __name__)
 
 
-def get_rm(_unused_visalib="ni"):
+def get_rm(_unused_visalib="ni", address=None):
+    if is_simulated(address):
+        # see simulation.py, no VISA library needed
+        return SimulatedResourceManager()
     try:
         # the pyvisa manager we'll use to connect to the GPIB resources
         NI_RESOURCE_MANAGER = visa.ResourceManager()
@@ -223,7 +232,7 @@ class AbstractVISADriver:
         time.sleep(0.1)
 
     def res_open(self):
-        self._resource_manager = get_rm(self.visalib_kw)
+        self._resource_manager = get_rm(self.visalib_kw, self._instrumentaddress)
         try:
             self._visa_resource = self._resource_manager.get_instrument(
                 self._instrumentaddress
@@ -345,10 +354,35 @@ class AbstractSerialDeviceDriver(AbstractVISADriver):
         # self._visa_resource.timeout = 500
 
 
+class _Collected(Exception):
+    """raised by query() while the queries of a batch are collected"""
+
+
+class _QueryBatch:
+    """the queries of one query_batch, and their answers once received"""
+
+    def __init__(self):
+        self.commands = []
+        self.answers = None
+
+    def answer(self, command):
+        if self.answers is None:
+            self.commands.append(command)
+            raise _Collected
+        return self.answers.popleft()
+
+
 class AbstractModernVISADriver(AbstractVISADriver):
-    """docstring for Instrument_GPIB"""
+    """docstring for Instrument_GPIB
+
+    batch_max_length: longest transmission of chained queries the device
+        accepts (input buffer), None for no limit
+    """
+
+    batch_max_length = None
 
     def __init__(self, *args, **kwargs):
+        self._batch = threading.local()
         super().__init__(*args, **kwargs)
         self._logger = logging.getLogger(
             "CryoGUI." + __name__ + "." + self.__class__.__name__
@@ -362,12 +396,75 @@ class AbstractModernVISADriver(AbstractVISADriver):
 
         :return: answer from the device
         """
-        q = super().query(command)
+        batch = getattr(self._batch, "current", None)
+        if batch is not None:
+            return batch.answer(command)
+        return self._split_answer(super().query(command))
+
+    @staticmethod
+    def _split_answer(q):
+        """the answer split at ',', or, if it is no string, e.g. the
+        result of a failing query, repeated for every position"""
         try:
             return q.strip().split(",")
         except AttributeError:
             return [q] * 50
 
+    def query_batch(self, *calls):
+        """results of several query methods, with their queries chained
+        with ';' into one transmission (or a few, see batch_max_length)
+
+        :param calls: (method, *args) of query methods of this driver, each
+            sending exactly one query, e.g. (self.KelvinReadingQuery, 0)
+
+        :return: list of the results of the methods
+
+        Every method runs twice: first only to collect its query, then to
+        parse its part of the compound answer. If the number of parts of
+        an answer does not match, its queries are sent one by one.
+        """
+        batch = _QueryBatch()
+        self._batch.current = batch
+        try:
+            for method, *args in calls:
+                try:
+                    method(*args)
+                except _Collected:
+                    pass
+            batch.answers = deque(self._query_chained(batch.commands))
+            return [method(*args) for method, *args in calls]
+        finally:
+            self._batch.current = None
+
+    def _query_chained(self, commands):
+        """answers (split at ',') of commands, chained into transmissions"""
+        chains, chain = [], []
+        for command in commands:
+            if (
+                chain
+                and self.batch_max_length is not None
+                and len(";".join(chain + [command])) > self.batch_max_length
+            ):
+                chains.append(chain)
+                chain = []
+            chain.append(command)
+        if chain:
+            chains.append(chain)
+
+        answers = []
+        for chain in chains:
+            q = AbstractVISADriver.query(self, ";".join(chain))
+            parts = q.strip().split(";") if isinstance(q, str) else []
+            if len(parts) != len(chain):
+                self._logger.warning(
+                    "chained queries %s answered with %s, querying one by one",
+                    chain,
+                    q,
+                )
+                parts = [AbstractVISADriver.query(self, command) for command in chain]
+            answers += [self._split_answer(part) for part in parts]
+        return answers
+
     def go(self, command):
         """Sends commands as strings to the device
 
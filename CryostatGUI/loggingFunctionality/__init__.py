@@ -1,3 +1,7 @@
 from . import logger
 from . import sqlBaseFunctions
+from . import sqlWriter
+from . import spool
+from . import archive
+from . import replay
 from . import saveFileHeaders
@@ -0,0 +1,309 @@
+"""Module containing a columnar archive for finished cooldown databases
+
+An archive is a directory with one data file per instrument table
+(<table>.bin) and a small index (index.json). The rows of a table are
+converted in chunks of chunk_rows rows, ordered by id; each chunk stores
+every column as one block in the data file -- float64 for numeric
+columns (NaN for NULL), a JSON list for text columns -- compressed with
+zlib (or raw, with level=0). The index keeps per chunk the number of
+rows, the first and last `timeseconds`, and per column offset, length
+and format of its block.
+
+Reading maps the data file into memory and only touches the blocks of
+the requested columns in chunks which overlap the requested time range.
+Raw blocks are used in place, without a copy.
+
+Conversion streams through the database, one chunk at a time, so it runs
+in bounded memory for databases of any size. The index is written last,
+so an interrupted conversion does not leave an archive which looks valid.
+
+This module does not depend on the rest of the package, apart from dbquery.
+From the command line:
+    python archive.py Logs/cooldown.db [--out Logs/cooldown.archive]
+
+Classes:
+    CooldownArchive: read access to one archive
+
+Functions:
+    archive: convert a cooldown database into an archive
+"""
+import os
+import mmap
+import json
+import zlib
+import sqlite3
+import logging
+import argparse
+
+import numpy as np
+
+try:
+    from loggingFunctionality.dbquery import _quote
+    from loggingFunctionality.dbquery import instrument_tables
+except ImportError:  # run as a script, or from the plotting scripts
+    from dbquery import _quote
+    from dbquery import instrument_tables
+
+logger = logging.getLogger("CryostatGUI.archive")
+
+INDEX = "index.json"
+NUMERIC = ("REAL", "INTEGER", "FLOAT", "NUMERIC")
+ALIGNMENT = 8
+
+
+def _column_array(values, numeric):
+    """one column of a chunk as float64 (numeric) or object array"""
+    if not numeric:
+        return np.array(values, dtype=object)
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):  # text in a numeric column
+        array = np.full(len(values), np.nan)
+        for index, value in enumerate(values):
+            try:
+                array[index] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return array
+
+
+def _encode(array, level):
+    """the block of one column: (bytes, format)
+
+    compressed numbers are stored byte-shuffled (all first bytes of the
+    chunk, then all second bytes, ...), which compresses much better
+    """
+    if array.dtype == object:
+        data = json.dumps(array.tolist(), default=str).encode("utf-8")
+        kind = "json"
+    else:
+        array = np.ascontiguousarray(array, dtype="<f8")
+        if not level:
+            return array.tobytes(), "f8"
+        data = array.view(np.uint8).reshape(-1, 8).T.tobytes()
+        kind = "f8+shuffle"
+    if level:
+        return zlib.compress(data, level), kind + "+zlib"
+    return data, kind
+
+
+def _decode(buffer, kind):
+    """a column from its block (buffer: memoryview of the data file)"""
+    kind = kind.split("+")
+    if "zlib" in kind:
+        buffer = zlib.decompress(buffer)
+    if kind[0] == "json":
+        return np.array(json.loads(bytes(buffer).decode("utf-8")), dtype=object)
+    if "shuffle" in kind:
+        shuffled = np.frombuffer(buffer, dtype=np.uint8).reshape(8, -1)
+        return np.ascontiguousarray(shuffled.T).view("<f8").ravel()
+    return np.frombuffer(buffer, dtype="<f8")
+
+
+def _archive_table(conn, table, path, chunk_rows, level, progress):
+    """write the data file of table, return its entry of the index"""
+    info = conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+    columns = [row[1] for row in info if row[1] != "id"]
+    numeric = {row[1]: row[2].upper() in NUMERIC for row in info}
+    select = "SELECT id{} FROM {} WHERE id > ? ORDER BY id LIMIT ?".format(
+        "".join("," + _quote(column) for column in columns), _quote(table)
+    )
+    (total,) = conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()
+    chunks, last_id, done = [], -1, 0
+    with open(path, "wb") as handle:
+        while True:
+            rows = conn.execute(select, (last_id, chunk_rows)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            values = list(zip(*rows))[1:]
+            chunk = dict(rows=len(rows), blocks={})
+            for column, column_values in zip(columns, values):
+                array = _column_array(column_values, numeric[column])
+                if column == "timeseconds":
+                    chunk["t_min"] = float(np.nanmin(array, initial=np.inf))
+                    chunk["t_max"] = float(np.nanmax(array, initial=-np.inf))
+                data, kind = _encode(array, level)
+                handle.write(b"\0" * (-handle.tell() % ALIGNMENT))
+                chunk["blocks"][column] = [handle.tell(), len(data), kind]
+                handle.write(data)
+            chunks.append(chunk)
+            done += len(rows)
+            if progress is not None:
+                progress(table, done, total)
+    return dict(file=os.path.basename(path), columns=columns, chunks=chunks)
+
+
+def archive(dbname, out=None, chunk_rows=65536, level=1, progress=None):
+    """convert the cooldown database dbname into an archive
+
+    out: directory of the archive, default: dbname without '.db',
+        plus '.archive'
+    chunk_rows: rows per chunk, which bounds the memory needed
+    level: zlib compression level, 0 for raw blocks
+    progress: called with (table, rows done, rows in total) after every chunk
+
+    returns: the directory of the archive
+    """
+    if out is None:
+        out = os.path.splitext(dbname)[0] + ".archive"
+    os.makedirs(out, exist_ok=True)
+    conn = sqlite3.connect(f"file:{dbname}?mode=ro", uri=True)
+    try:
+        index = dict(source=os.path.abspath(dbname), tables={})
+        for table in instrument_tables(conn.cursor()):
+            columns = [
+                row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")
+            ]
+            if "timeseconds" not in columns:
+                continue
+            index["tables"][table] = _archive_table(
+                conn,
+                table,
+                os.path.join(out, table + ".bin"),
+                chunk_rows,
+                level,
+                progress,
+            )
+    finally:
+        conn.close()
+    with open(os.path.join(out, INDEX + ".tmp"), "w") as handle:
+        json.dump(index, handle)
+    os.replace(os.path.join(out, INDEX + ".tmp"), os.path.join(out, INDEX))
+    return out
+
+
+class CooldownArchive:
+    """read access to one archive
+
+    read() returns the data of some columns of one instrument in a time
+    range as numpy arrays, like CooldownDB.read without max_points.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self._logger = logging.getLogger(
+            "CryoGUI." + __name__ + "." + self.__class__.__name__
+        )
+        self.path = path
+        with open(os.path.join(path, INDEX)) as handle:
+            self.index = json.load(handle)
+        self._maps = {}
+
+    def close(self):
+        for handle, mapped in self._maps.values():
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # raw arrays still use it, unmapped once they are gone
+            handle.close()
+        self._maps = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def instruments(self):
+        """names of all archived tables"""
+        return list(self.index["tables"])
+
+    def columns(self, instrument):
+        """names of all archived columns of instrument"""
+        return list(self.index["tables"][instrument]["columns"])
+
+    def time_range(self, instrument):
+        """first and last `timeseconds` of instrument, (None, None) if empty"""
+        chunks = [
+            chunk
+            for chunk in self.index["tables"][instrument]["chunks"]
+            if chunk["t_min"] <= chunk["t_max"]
+        ]
+        if not chunks:
+            return None, None
+        return (
+            min(chunk["t_min"] for chunk in chunks),
+            max(chunk["t_max"] for chunk in chunks),
+        )
+
+    def _mapped(self, instrument):
+        """the data file of instrument, mapped into memory"""
+        if instrument not in self._maps:
+            handle = open(
+                os.path.join(self.path, self.index["tables"][instrument]["file"]), "rb"
+            )
+            if os.fstat(handle.fileno()).st_size == 0:
+                handle.close()
+                return memoryview(b"")
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[instrument] = handle, mapped
+        return memoryview(self._maps[instrument][1])
+
+    def read(self, instrument, columns, t0=None, t1=None):
+        """read columns of instrument between the times t0 and t1
+
+        t0, t1: in seconds (as `timeseconds`), default: all data
+
+        returns: dict of numpy arrays, with the keys of CooldownDB.read:
+            'timeseconds', '<column>', '<column>_min', '<column>_max', 'count'
+            ordered by time
+        """
+        if isinstance(columns, str):
+            columns = [columns]
+        t0 = -np.inf if t0 is None else t0
+        t1 = np.inf if t1 is None else t1
+        mapped = self._mapped(instrument)
+        parts = {column: [] for column in ["timeseconds"] + columns}
+        for chunk in self.index["tables"][instrument]["chunks"]:
+            if chunk["t_max"] < t0 or chunk["t_min"] > t1:
+                continue
+            times = self._block(mapped, chunk, "timeseconds")
+            inside = (times >= t0) & (times <= t1)
+            if not inside.all():
+                # only a part of the chunk is in the range
+                parts["timeseconds"].append(times[inside])
+                for column in columns:
+                    parts[column].append(self._block(mapped, chunk, column)[inside])
+                continue
+            parts["timeseconds"].append(times)
+            for column in columns:
+                parts[column].append(self._block(mapped, chunk, column))
+
+        data = {
+            column: np.concatenate(arrays) if arrays else np.array([])
+            for column, arrays in parts.items()
+        }
+        times = data["timeseconds"]
+        if len(times) and np.any(np.diff(times) < 0):
+            order = np.argsort(times, kind="stable")
+            data = {column: array[order] for column, array in data.items()}
+        for column in columns:
+            data[column + "_min"] = data[column + "_max"] = data[column]
+        data["count"] = np.ones(len(data["timeseconds"]), dtype=int)
+        return data
+
+    def _block(self, mapped, chunk, column):
+        """one column of one chunk"""
+        offset, length, kind = chunk["blocks"][column]
+        return _decode(mapped[offset : offset + length], kind)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="convert a cooldown database into a columnar archive"
+    )
+    parser.add_argument("dbname")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--chunk-rows", type=int, default=65536)
+    parser.add_argument("--level", type=int, default=1, help="zlib level, 0: raw")
+    args = parser.parse_args()
+
+    def report(table, done, total):
+        print(f"\r{table}: {done} / {total} rows", end="", flush=True)
+        if done == total:
+            print()
+
+    out = archive(args.dbname, args.out, args.chunk_rows, args.level, report)
+    print(f"archived to {out}")
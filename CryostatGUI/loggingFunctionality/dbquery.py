@@ -0,0 +1,552 @@
+"""Module containing range queries and rollups over cooldown databases
+
+Every instrument has its own table in a cooldown database, with one
+column per variable and the time of logging in `timeseconds`.
+Reading a time range uses an index on `timeseconds`, which CooldownDB
+creates if it is missing and indexing is requested. If a number of points is requested, the data are
+aggregated per time bin by sqlite, so only the aggregates travel
+into Python.
+
+Rollups: for every instrument table, the tables <table>_rollup_<r>s
+(r in RESOLUTIONS, seconds) hold per time bucket of r seconds the number
+of rows (n), their mean and last time, and per numeric column its
+count, min, max, mean and last value. The logger updates them with
+every row it writes. Rows which were in the table before that are
+added by backfill(), which can be interrupted and resumed: the table
+rollup_state keeps per instrument table the first row id which was
+rolled up live (live_from_id) and the last row id which was backfilled.
+Once a table is fully backfilled, binned reads over long ranges take
+the coarsest rollup which still resolves the bins.
+
+This module does not depend on the rest of the package, so that the
+plotting scripts can use it without importing Qt.
+Backfilling existing databases, from the command line:
+    python dbquery.py Logs/cooldown.db [more.db ...]
+
+Classes:
+    CooldownDB: read access to one cooldown database
+
+Functions:
+    ensure_index: create the index on `timeseconds` for one table
+    ensure_indexes: create the indexes for all tables in a database
+    ensure_rollups: create the rollup tables for one table
+    update_rollups: merge new rows into the rollup tables
+    backfill: roll up the rows which are not yet rolled up
+"""
+import re
+import sys
+import sqlite3
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("CryostatGUI.dbquery")
+
+
+RESOLUTIONS = (10, 60, 600)
+ROLLUP_STATE = "rollup_state"
+ROLLUP_STATS = ("count", "min", "max", "mean", "last")
+_rollup_name = re.compile(r".+_rollup_\d+s")
+
+
+def _quote(name):
+    """quote an sql identifier (table or column name)"""
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def rollup_table(table, resolution):
+    """name of the rollup table of table, at resolution (in seconds)"""
+    return f"{table}_rollup_{resolution}s"
+
+
+def instrument_tables(cursor):
+    """names of all tables with logged data (no rollups)"""
+    return [
+        row[0]
+        for row in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type='table'"
+            " AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()
+        if row[0] != ROLLUP_STATE and not _rollup_name.fullmatch(row[0])
+    ]
+
+
+def numeric_columns(cursor, table):
+    """columns of table declared as numbers, except id and timeseconds"""
+    return [
+        row[1]
+        for row in cursor.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+        if row[2].upper() in ("REAL", "INTEGER", "FLOAT", "NUMERIC")
+        and row[1] not in ("id", "timeseconds")
+    ]
+
+
+def ensure_index(cursor, table):
+    """create the index on `timeseconds` for table, if it does not exist"""
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS {} ON {} (timeseconds)".format(
+            _quote(f"idx_{table}_timeseconds"), _quote(table)
+        )
+    )
+
+
+def ensure_indexes(conn):
+    """create the index on `timeseconds` for every table which has this column"""
+    cursor = conn.cursor()
+    for table in instrument_tables(cursor):
+        columns = [
+            row[1] for row in cursor.execute(f"PRAGMA table_info({_quote(table)})")
+        ]
+        if "timeseconds" in columns:
+            ensure_index(cursor, table)
+    conn.commit()
+
+
+def ensure_rollups(cursor, table):
+    """create the rollup tables of table, or add new columns to them
+
+    the first time, the rows which are already in table are marked
+    for backfill()
+
+    returns: the numeric columns of table, which are rolled up
+    """
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {ROLLUP_STATE} (tablename TEXT PRIMARY KEY,"
+        " live_from_id INTEGER, backfilled_id INTEGER)"
+    )
+    columns = numeric_columns(cursor, table)
+    for resolution in RESOLUTIONS:
+        name = _quote(rollup_table(table, resolution))
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} (bucket INTEGER PRIMARY KEY,"
+            " n INTEGER, t_mean REAL, t_last REAL)"
+        )
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({name})")}
+        for column in columns:
+            for stat in ROLLUP_STATS:
+                if f"{column}_{stat}" not in existing:
+                    cursor.execute(
+                        "ALTER TABLE {} ADD COLUMN {} {}".format(
+                            name,
+                            _quote(f"{column}_{stat}"),
+                            "INTEGER" if stat == "count" else "REAL",
+                        )
+                    )
+    cursor.execute(f"SELECT 1 FROM {ROLLUP_STATE} WHERE tablename = ?", (table,))
+    if cursor.fetchone() is None:
+        (max_id,) = cursor.execute(f"SELECT MAX(id) FROM {_quote(table)}").fetchone()
+        cursor.execute(
+            f"INSERT INTO {ROLLUP_STATE} VALUES (?, ?, 0)", (table, (max_id or 0) + 1)
+        )
+    return columns
+
+
+def rollups_complete(cursor, table):
+    """whether all rows of table are rolled up"""
+    try:
+        row = cursor.execute(
+            f"SELECT live_from_id, backfilled_id FROM {ROLLUP_STATE}"
+            " WHERE tablename = ?",
+            (table,),
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return False  # no rollups in this database
+    return row is not None and row[1] >= row[0] - 1
+
+
+def to_float(value):
+    """value as float, NaN if it is not a number"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def rows_to_arrays(rows, columns):
+    """times and values (rows x columns) of a list of dicts, NaN if missing"""
+    times = np.array([to_float(row.get("timeseconds")) for row in rows])
+    values = np.array(
+        [[to_float(row.get(column)) for column in columns] for row in rows]
+    ).reshape(len(rows), len(columns))
+    return times, values
+
+
+def aggregate(times, values, resolution):
+    """reduce rows to one set of rollup values per bucket of resolution seconds
+
+    times: 1-D array, values: array (rows x columns), NaN where missing
+
+    returns: list of parameter lists, as in the rollup tables:
+        bucket, n, t_mean, t_last, (count, min, max, mean, last) per column
+    """
+    keep = ~np.isnan(times)
+    times, values = times[keep], values[keep]
+    if not len(times):
+        return []
+    buckets = np.floor(times / resolution).astype(np.int64)
+    order = np.argsort(buckets, kind="stable")
+    buckets, times, values = buckets[order], times[order], values[order]
+    unique, starts = np.unique(buckets, return_index=True)
+    n = np.diff(np.append(starts, len(buckets)))
+
+    valid = ~np.isnan(values)
+    count = np.add.reduceat(valid, starts, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.add.reduceat(np.where(valid, values, 0), starts, axis=0) / count
+    minimum = np.fmin.reduceat(values, starts, axis=0)
+    maximum = np.fmax.reduceat(values, starts, axis=0)
+    positions = np.where(valid, np.arange(len(values))[:, np.newaxis], -1)
+    last_position = np.maximum.reduceat(positions, starts, axis=0)
+    last = np.where(
+        last_position >= 0,
+        values[np.maximum(last_position, 0), np.arange(values.shape[1])],
+        np.nan,
+    )
+
+    per_column = np.stack([count, minimum, maximum, mean, last], axis=-1)
+    table = np.column_stack(
+        [
+            unique,
+            n,
+            np.add.reduceat(times, starts) / n,
+            np.maximum.reduceat(times, starts),
+            per_column.reshape(len(unique), -1),
+        ]
+    ).astype(object)
+    table[np.isnan(table.astype(float))] = None
+    rows = table.tolist()
+    for row in rows:
+        row[0], row[1] = int(row[0]), int(row[1])
+    return rows
+
+
+def _upsert_sql(name, columns):
+    """INSERT a bucket, or merge it into the existing one"""
+    fields = ["bucket", "n", "t_mean", "t_last"] + [
+        f"{column}_{stat}" for column in columns for stat in ROLLUP_STATS
+    ]
+    merges = [
+        "n = n + excluded.n",
+        "t_mean = (t_mean * n + excluded.t_mean * excluded.n) / (n + excluded.n)",
+        "t_last = MAX(t_last, excluded.t_last)",
+    ]
+    for column in columns:
+        c = {stat: _quote(f"{column}_{stat}") for stat in ROLLUP_STATS}
+        merges += [
+            "{count} = COALESCE({count}, 0) + excluded.{count}".format(**c),
+            "{min} = MIN(COALESCE({min}, excluded.{min}),"
+            " COALESCE(excluded.{min}, {min}))".format(**c),
+            "{max} = MAX(COALESCE({max}, excluded.{max}),"
+            " COALESCE(excluded.{max}, {max}))".format(**c),
+            "{mean} = CASE WHEN excluded.{count} = 0 THEN {mean}"
+            " WHEN COALESCE({count}, 0) = 0 THEN excluded.{mean}"
+            " ELSE ({mean} * {count} + excluded.{mean} * excluded.{count})"
+            " / ({count} + excluded.{count}) END".format(**c),
+            "{last} = CASE WHEN excluded.t_last >= t_last"
+            " THEN COALESCE(excluded.{last}, {last})"
+            " ELSE COALESCE({last}, excluded.{last}) END".format(**c),
+        ]
+    return (
+        "INSERT INTO {} ({}) VALUES ({}) ON CONFLICT(bucket) DO UPDATE SET {}".format(
+            _quote(name),
+            ",".join(_quote(field) for field in fields),
+            ",".join("?" * len(fields)),
+            ", ".join(merges),
+        )
+    )
+
+
+def update_rollups(cursor, table, columns, times, values):
+    """merge rows (times, values as from rows_to_arrays) into the rollups"""
+    for resolution in RESOLUTIONS:
+        rows = aggregate(times, values, resolution)
+        if rows:
+            cursor.executemany(
+                _upsert_sql(rollup_table(table, resolution), columns), rows
+            )
+
+
+def backfill(conn, table, chunk=50000, progress=None):
+    """roll up the rows of table which were there before the live rollups
+
+    works through the rows in chunks, committing each together with the
+    progress, so it can be interrupted and resumed at any time
+
+    progress: called with (table, rows done, rows in total) after every chunk
+    """
+    cursor = conn.cursor()
+    with conn:
+        columns = ensure_rollups(cursor, table)
+    live_from, done = cursor.execute(
+        f"SELECT live_from_id, backfilled_id FROM {ROLLUP_STATE} WHERE tablename = ?",
+        (table,),
+    ).fetchone()
+    (total,) = cursor.execute(
+        f"SELECT COUNT(*) FROM {_quote(table)} WHERE id < ?", (live_from,)
+    ).fetchone()
+    (finished,) = cursor.execute(
+        f"SELECT COUNT(*) FROM {_quote(table)} WHERE id <= ?", (done,)
+    ).fetchone()
+    select = "SELECT id, timeseconds{} FROM {} WHERE id > ? AND id < ? ORDER BY id LIMIT ?".format(
+        "".join("," + _quote(column) for column in columns), _quote(table)
+    )
+    while done < live_from - 1:
+        rows = cursor.execute(select, (done, live_from, chunk)).fetchall()
+        last_id = rows[-1][0] if rows else live_from - 1
+        with conn:
+            if rows:
+                try:
+                    data = np.array([row[1:] for row in rows], dtype=float)
+                except (TypeError, ValueError):  # text in a numeric column
+                    data = np.array(
+                        [[to_float(value) for value in row[1:]] for row in rows]
+                    )
+                data = data.reshape(len(rows), len(columns) + 1)
+                update_rollups(cursor, table, columns, data[:, 0], data[:, 1:])
+            cursor.execute(
+                f"UPDATE {ROLLUP_STATE} SET backfilled_id = ? WHERE tablename = ?",
+                (last_id, table),
+            )
+        done = last_id
+        finished += len(rows)
+        if progress is not None:
+            progress(table, finished, total)
+
+
+def backfill_all(dbname, chunk=50000, progress=None):
+    """backfill the rollups of all instrument tables in the database"""
+    conn = sqlite3.connect(dbname, timeout=20)
+    try:
+        for table in instrument_tables(conn.cursor()):
+            columns = [
+                row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")
+            ]
+            if "timeseconds" in columns:
+                backfill(conn, table, chunk, progress)
+    finally:
+        conn.close()
+
+
+def _to_array(values):
+    """numpy array of the values, float if possible (None becomes NaN)"""
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return np.array(values, dtype=object)
+
+
+class CooldownDB:
+    """read access to one cooldown database
+
+    read() returns the data of some columns of one instrument
+    (table) as numpy arrays, optionally aggregated per time bin,
+    latest() those of the newest row.
+
+    The database is opened read-only, unless create_indexes is set,
+    in which case the missing indexes on `timeseconds` are created.
+    """
+
+    def __init__(self, dbname, create_indexes=False, timeout=20):
+        super().__init__()
+        self._logger = logging.getLogger(
+            "CryoGUI." + __name__ + "." + self.__class__.__name__
+        )
+        self.dbname = dbname
+        if create_indexes:
+            self.conn = sqlite3.connect(dbname, timeout=timeout)
+        else:
+            self.conn = sqlite3.connect(
+                f"file:{dbname}?mode=ro", uri=True, timeout=timeout
+            )
+        if create_indexes:
+            try:
+                ensure_indexes(self.conn)
+            except sqlite3.OperationalError as err:
+                # e.g. read-only, queries still work, only slower
+                self._logger.warning("could not create indexes: %s", err)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def instruments(self):
+        """names of all tables with logged data"""
+        return instrument_tables(self.conn.cursor())
+
+    def columns(self, instrument):
+        """names of all columns of the table of instrument"""
+        return [
+            row[1]
+            for row in self.conn.execute(f"PRAGMA table_info({_quote(instrument)})")
+        ]
+
+    def time_range(self, instrument):
+        """first and last `timeseconds` of instrument, (None, None) if empty"""
+        # MIN and MAX in separate queries, so both are looked up in the index
+        return tuple(
+            self.conn.execute(
+                "SELECT {}(timeseconds) FROM {}".format(func, _quote(instrument))
+            ).fetchone()[0]
+            for func in ("MIN", "MAX")
+        )
+
+    def read(self, instrument, columns, t0=None, t1=None, max_points=None):
+        """read columns of instrument between the times t0 and t1
+
+        t0, t1: in seconds (as `timeseconds`), default: all data
+        max_points: if given, the range is divided into max_points bins
+            of equal length, and every bin is reduced to the mean, minimum
+            and maximum of each column (by sqlite). The arrays then have
+            exactly max_points entries, NaN for bins without data, so
+            several instruments read with the same range line up.
+            If the bins are at least as long as one of the RESOLUTIONS,
+            the coarsest such rollup is read instead of the rows (once
+            it is complete), the bins' edges are then those of its buckets.
+
+        returns: dict of numpy arrays, with keys
+            'timeseconds': the times of the rows (mean time per bin)
+            '<column>': the values (mean per bin)
+            '<column>_min', '<column>_max': minimum and maximum per bin
+                (the values themselves without max_points)
+            'count': the number of rows per bin (ones without max_points)
+        """
+        if isinstance(columns, str):
+            columns = [columns]
+        if t0 is None or t1 is None:
+            first, last = self.time_range(instrument)
+            t0 = first if t0 is None else t0
+            t1 = last if t1 is None else t1
+        if max_points is None or t0 is None:
+            return self._read_raw(instrument, columns, t0, t1)
+        max_points = int(max_points)
+        resolution = self.rollup_resolution(instrument, columns, t0, t1, max_points)
+        if resolution is not None:
+            return self._read_rollup(
+                instrument, columns, t0, t1, max_points, resolution
+            )
+        return self._read_binned(instrument, columns, t0, t1, max_points)
+
+    def latest(self, instrument, columns):
+        """the newest row of instrument, as read() without max_points"""
+        if isinstance(columns, str):
+            columns = [columns]
+        sql = "SELECT timeseconds{} FROM {} ORDER BY id DESC LIMIT 1".format(
+            "".join("," + _quote(c) for c in columns), _quote(instrument)
+        )
+        return self._raw_arrays(self.conn.execute(sql).fetchall(), columns)
+
+    def rollup_resolution(self, instrument, columns, t0, t1, max_points):
+        """the coarsest rollup resolving bins of (t1 - t0) / max_points, or None"""
+        width = (t1 - t0) / max_points
+        fitting = [r for r in RESOLUTIONS if r <= width]
+        if not fitting:
+            return None
+        cursor = self.conn.cursor()
+        if not rollups_complete(cursor, instrument):
+            return None
+        if not set(columns) <= set(numeric_columns(cursor, instrument)):
+            return None
+        return max(fitting)
+
+    def _read_raw(self, instrument, columns, t0, t1):
+        sql = "SELECT timeseconds{} FROM {}".format(
+            "".join("," + _quote(c) for c in columns), _quote(instrument)
+        )
+        params = ()
+        if t0 is not None:
+            sql += " WHERE timeseconds BETWEEN ? AND ?"
+            params = (t0, t1)
+        sql += " ORDER BY timeseconds"
+        return self._raw_arrays(self.conn.execute(sql, params).fetchall(), columns)
+
+    @staticmethod
+    def _raw_arrays(rows, columns):
+        """rows of (timeseconds, *columns) as returned by read()"""
+        data = dict(timeseconds=_to_array([row[0] for row in rows]))
+        for index, column in enumerate(columns, start=1):
+            data[column] = _to_array([row[index] for row in rows])
+            data[column + "_min"] = data[column + "_max"] = data[column]
+        data["count"] = np.ones(len(rows), dtype=int)
+        return data
+
+    def _read_binned(self, instrument, columns, t0, t1, max_points):
+        edges = np.linspace(t0, t1, max_points + 1)
+        # one index range scan per bin: a GROUP BY over an expression
+        # of timeseconds would sort all rows of the range instead
+        sql = "SELECT COUNT(*), AVG(timeseconds){} FROM {} WHERE ".format(
+            "".join(",AVG({c}),MIN({c}),MAX({c})".format(c=_quote(c)) for c in columns),
+            _quote(instrument),
+        )
+        inner = sql + "timeseconds >= ? AND timeseconds < ?"
+        last = sql + "timeseconds >= ? AND timeseconds <= ?"  # includes t1
+        cursor = self.conn.cursor()
+        rows = [
+            cursor.execute(inner, (edges[b], edges[b + 1])).fetchone()
+            for b in range(max_points - 1)
+        ]
+        rows.append(cursor.execute(last, (edges[-2], edges[-1])).fetchone())
+        result = np.array(rows, dtype=float).reshape(max_points, 2 + 3 * len(columns))
+
+        data = dict(count=result[:, 0].astype(int), timeseconds=result[:, 1])
+        for index, column in enumerate(columns):
+            data[column] = result[:, 2 + 3 * index]
+            data[column + "_min"] = result[:, 3 + 3 * index]
+            data[column + "_max"] = result[:, 4 + 3 * index]
+        return data
+
+    def _read_rollup(self, instrument, columns, t0, t1, max_points, resolution):
+        width = (t1 - t0) / max_points
+        aggregates = "".join(
+            ",SUM({mean} * {count}) / SUM({count}),MIN({min}),MAX({max})".format(
+                **{stat: _quote(f"{c}_{stat}") for stat in ROLLUP_STATS}
+            )
+            for c in columns
+        )
+        sql = (
+            "SELECT MAX(MIN(CAST((bucket * ? - ?) / ? AS INTEGER), ?), 0) AS bin,"
+            " SUM(n), SUM(t_mean * n) / SUM(n){} FROM {}"
+            " WHERE bucket BETWEEN ? AND ? GROUP BY bin"
+        ).format(aggregates, _quote(rollup_table(instrument, resolution)))
+        rows = self.conn.execute(
+            sql,
+            (
+                resolution,
+                t0,
+                width,
+                max_points - 1,
+                int(t0 // resolution),
+                int(t1 // resolution),
+            ),
+        ).fetchall()
+        result = np.array(rows, dtype=float).reshape(len(rows), 3 + 3 * len(columns))
+        bins = result[:, 0].astype(int)
+
+        def binned(values, fill=np.nan):
+            array = np.full(max_points, fill)
+            array[bins] = values
+            return array
+
+        data = dict(count=binned(result[:, 1], 0).astype(int))
+        data["timeseconds"] = binned(result[:, 2])
+        for index, column in enumerate(columns):
+            data[column] = binned(result[:, 3 + 3 * index])
+            data[column + "_min"] = binned(result[:, 4 + 3 * index])
+            data[column + "_max"] = binned(result[:, 5 + 3 * index])
+        return data
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    def report(table, done, total):
+        print(f"\r{table}: {done} / {total} rows", end="", flush=True)
+
+    for dbname in sys.argv[1:]:
+        print(dbname)
+        backfill_all(dbname, progress=report)
+        print()
@@ -8,14 +8,17 @@ from PyQt5.QtCore import QTimer
 from PyQt5 import QtWidgets
 
 import time
+import atexit
 import pickle
 import sqlite3
 
 # import pandas as pd
 import numpy as np
-from numpy.polynomial.polynomial import polyfit as nppolyfit
 from copy import deepcopy
+from operator import itemgetter
+from contextlib import nullcontext
 from threading import Lock
+from threading import Thread
 import math
 
 from datetime import datetime
@@ -36,8 +39,24 @@ from util import AbstractMainApp
 from util import Window_trayService_ui
 
 from util import calculate_timediff
+from util import RingBuffer
+from util import RollingStats
+from util import CALCULATIONS
+from util import SLOPES
+from util import StageStats
+from util import MeasurementRowWriter
+from util.ringbuffer import is_numeric
 
 from loggingFunctionality.saveFileHeaders import headerstring1 as HEADERSTRING
+from loggingFunctionality.sqlWriter import SQLiteWriter
+from loggingFunctionality.spool import Spool
+from loggingFunctionality.dbquery import ensure_index
+from loggingFunctionality.dbquery import ensure_rollups
+from loggingFunctionality.dbquery import update_rollups
+from loggingFunctionality.dbquery import rows_to_arrays
+from loggingFunctionality.dbquery import instrument_tables
+from loggingFunctionality.dbquery import numeric_columns
+from loggingFunctionality.dbquery import _quote
 
 
 from sqlite3 import OperationalError
@@ -49,6 +68,9 @@ import logging
 
 logger = logging.getLogger("CryostatGUI.loggingFunctionality")
 
+# in snapshot_positions, for values of ring buffers which are still empty
+_EMPTY = object()
+
 
 class InitError(Exception):
     """docstring for InitError"""
@@ -89,6 +111,30 @@ def typeof(dictkey):
         return "TEXT"
 
 
+def sql_row(dictname, houroffset):
+    """columns and values of one row, as parameters for an INSERT
+
+    NaN and None are left out (they stay NULL),
+    timestamps are stored as text including the UTC offset
+    """
+    if not dictname:
+        raise AssertionError("Logger: dict does not yet exist")
+    columns, values = [], []
+    for key in dictname:
+        var, bools = testing_NaN(dictname[key])
+        if bools:
+            continue
+        if isinstance(var, datetime):
+            var = (
+                "UTC"
+                + "{:+05.0f} ".format(houroffset)
+                + var.strftime("%Y-%m-%d  %H:%M:%S.%f")
+            )
+        columns.append(key)
+        values.append(var if isinstance(var, (float, int)) else str(var))
+    return tuple(columns), values
+
+
 def sql_buildDictTableString(dictname):
     string = """(id INTEGER PRIMARY KEY"""
     for key in dictname.keys():
@@ -250,10 +296,29 @@ class Logger_configuration(Window_ui):
 
 
 class main_Logger(AbstractLoopThread):
-    """This is a the logging worker thread"""
+    """This is a the logging worker thread
+
+    data which cannot be stored (no connection to the database, or sqlite
+    errors) goes into a Spool on the local disk, which is replayed into
+    the database in the background once storing works again
+    """
 
     sig_configuring = pyqtSignal(bool)
     sig_log = pyqtSignal()
+    sig_spool_progress = pyqtSignal(dict)
+
+    names = [
+        "ITC",
+        "ILM",
+        "IPS",
+        "LakeShore350",
+        "Keithley2182_1",
+        "Keithley2182_2",
+        "Keithley2182_3",
+        "Keithley6220_1",
+        "Keithley6220_2",
+        "SR830",
+    ]
 
     def __init__(self, mainthread=None, **kwargs):
         super().__init__(**kwargs)
@@ -267,12 +332,20 @@ class main_Logger(AbstractLoopThread):
         self.mainthread.sig_logging.connect(self.store_data)
         self.mainthread.sig_logging_newconf.connect(self.update_conf)
 
-        QTimer.singleShot(5e2, lambda: self.sig_configuring.emit(True))
+        QTimer.singleShot(500, lambda: self.sig_configuring.emit(True))
         self.configuration_done = False
         self.conf_done_layer2 = False
 
         self.not_yet_initialised = False
-        self.local_list = []
+        self.spool = None
+        self.replaying = None
+        # held while storing, by the logger and by the spool replay
+        self.db_lock = Lock()
+        # columns per table which are known to exist in the current database
+        self.known_columns = {}
+        # numeric columns per table, which are rolled up (see dbquery)
+        self.rollup_columns = {}
+        self.dbname = None
 
         self.houroffset = (datetime.now() - datetime.utcnow()).total_seconds() / 3600
 
@@ -305,10 +378,13 @@ class main_Logger(AbstractLoopThread):
 
     def connectdb(self, dbname):
         """connect to the sqlite database"""
+        if dbname != self.dbname:
+            self.known_columns = {}
+            self.dbname = dbname
         try:
             self.conn = sqlite3.connect(dbname)
             return True
-        except sqlite3.connect.Error as err:
+        except sqlite3.Error as err:
             self.sig_assertion.emit(
                 "Logger: Couldn't establish connection: {}".format(err)
             )
@@ -318,21 +394,35 @@ class main_Logger(AbstractLoopThread):
     def createtable(self, tablename, dictname):
         """create the sql table if it does not exist,
         with all columns named after the keys in the dictionary
-        """
 
-        sql = "CREATE TABLE IF NOT EXISTS {} ".format(tablename)
-        sql += sql_buildDictTableString(dictname)
-        # print(sql)
-        try:
-            self.mycursor.execute(sql)
-        except OperationalError:
-            # print(err)
-            # self._logger.debug(
-            # "encountered OperationalError from sqlite (table of column might already exist)"
-            # )
-            pass
+        the columns of every table are cached, so only keys which
+        are new are added as columns (also to the rollup tables)
+        """
+        columns = self.known_columns.get(tablename)
+        added = columns is None
+        if columns is None:
+            sql = "CREATE TABLE IF NOT EXISTS {} ".format(tablename)
+            sql += sql_buildDictTableString(dictname)
+            # print(sql)
+            try:
+                self.mycursor.execute(sql)
+            except OperationalError:
+                # print(err)
+                # self._logger.debug(
+                # "encountered OperationalError from sqlite (table of column might already exist)"
+                # )
+                pass
+            self.mycursor.execute("PRAGMA table_info({})".format(tablename))
+            columns = self.known_columns[tablename] = {
+                row[1].lower() for row in self.mycursor.fetchall()
+            }
+            ensure_index(self.mycursor, tablename)
 
         for key in dictname.keys():
+            if key.lower() in columns:
+                continue
+            columns.add(key.lower())
+            added = True
             try:
                 sql = """ALTER TABLE  {} ADD COLUMN {} {}""".format(
                     tablename, key, typeof(dictname[key])
@@ -345,47 +435,43 @@ class main_Logger(AbstractLoopThread):
                 # )
                 # print(err)
                 pass  # Logger: probably the column already exists, no problem.
+        if added:
+            self.rollup_columns[tablename] = ensure_rollups(self.mycursor, tablename)
 
     def updatetable(self, tablename, dictname):
-        """insert a new row into the database table with all data
-        a table-updating scheme was chosen to loop through all key-value pairs,
-        instead of an approach where the sql command-string is built in the loop
-        thus:
-            - insert a new row into the database table with the time
-            - loop through the dict
-                - update the newly made row with the key-value pair of the dict in the loop
+        """insert a new row into the database table with all data"""
+        self.insert_rows(tablename, [dictname])
+
+    def insert_rows(self, tablename, rows):
+        """insert rows (dicts) into the database table
+
+        every row is one parameterized INSERT with all its columns,
+        consecutive rows with the same columns go in one executemany,
+        the rows are then merged into the rollup tables
+
+        sqlite errors (e.g. a locked database) are passed on, so that
+        the transaction is rolled back and the data spooled
         """
-        # print('ichi update')
-        if not dictname:
-            # print('no column like this!!!')
-            raise AssertionError("Logger: dict does not yet exist")
+        batch_columns, batch = None, []
+        for dictname in rows:
+            columns, values = sql_row(dictname, self.houroffset)
+            if columns != batch_columns and batch:
+                self._insert_batch(tablename, batch_columns, batch)
+                batch = []
+            batch_columns = columns
+            batch.append(values)
+        if batch:
+            self._insert_batch(tablename, batch_columns, batch)
+        columns = self.rollup_columns.get(tablename)
+        if rows and columns is not None:
+            times, values = rows_to_arrays(rows, columns)
+            update_rollups(self.mycursor, tablename, columns, times, values)
+
+    def _insert_batch(self, tablename, columns, batch):
         sql = """INSERT INTO {} ({}) VALUES ({})""".format(
-            tablename, "timeseconds", dictname["timeseconds"]
+            tablename, ",".join(columns), ",".join("?" * len(columns))
         )
-        self.mycursor.execute(sql)
-
-        try:
-            for key in dictname:
-                var, bools = testing_NaN(dictname[key])
-                if isinstance(var, type(datetime.now())):
-                    var = (
-                        "UTC"
-                        + "{:+05.0f} ".format(self.houroffset)
-                        + var.strftime("%Y-%m-%d  %H:%M:%S.%f")
-                    )
-                if not bools:
-                    sql = """UPDATE {table} SET {column}={value} WHERE {sec}={sec_now}""".format(
-                        table=tablename,
-                        column=key,
-                        value=SQLFormatting(var),
-                        sec="""timeseconds""",
-                        sec_now=dictname["timeseconds"],
-                    )
-                    self.mycursor.execute(sql)
-        except OperationalError as err:
-            print(err)
-            # do not know whether this will work
-            raise AssertionError(err.args[0])
+        self.mycursor.executemany(sql, batch)
 
     def printtable(self, tablename, dictname, date1, date2):
         """print the data of one table between two dates
@@ -396,10 +482,8 @@ class main_Logger(AbstractLoopThread):
             print(colnames, end=",", flush=True)
         print("\n")
 
-        sql = """SELECT * from {} WHERE timeseconds BETWEEN {} AND {}""".format(
-            tablename, date1, date2
-        )
-        self.mycursor.execute(sql)
+        sql = """SELECT * from {} WHERE timeseconds BETWEEN ? AND ?""".format(tablename)
+        self.mycursor.execute(sql, (date1, date2))
 
         data = self.mycursor.fetchall()
         for row in data:
@@ -413,18 +497,9 @@ class main_Logger(AbstractLoopThread):
             in the same order as in the colnamelist
         """
 
-        array = []
-        sql = """SELECT {}""".format(colnamelist[0])
-        if len(colnamelist) > 1:
-            for x in colnamelist[1:]:
-                sql += """,{}""".format(x)
-        sql += """ from {} """.format(tablename)
+        sql = """SELECT {} from {}""".format(",".join(colnamelist), tablename)
         self.mycursor.execute(sql)
-        data = self.mycursor.fetchall()
-        for row in data:
-            array.append(list(row))
-        nparray = np.asarray(array)
-        return nparray
+        return np.asarray(self.mycursor.fetchall())
 
     def correcting_database_types(self, name, data):
         """
@@ -443,23 +518,138 @@ class main_Logger(AbstractLoopThread):
 
     def storing_to_database(self, data, names):
         """store data to the database"""
-        self._logger.debug(f"storing {data} in database")
+        self.storing_to_database_many([data], names)
+
+    def storing_to_database_many(self, datalist, names):
+        """store several data packages to the database, batched per table"""
+        self._logger.debug(f"storing {len(datalist)} packages in database")
         for name in names:
             self._logger.debug(f"store {name}")
+            rows = []
+            for data in datalist:
+                try:
+                    # self.correcting_database_types(name, data)
+                    if not data[name]:
+                        raise AssertionError("Logger: dict does not yet exist")
+                    self.createtable(name, data[name])
+                    rows.append(data[name])
+                except AssertionError as assertion:
+                    self.sig_assertion.emit(assertion.args[0])
+                    self._logger.exception(assertion)
+                except KeyError as key:
+                    self.sig_assertion.emit(key.args[0])
+                    self._logger.exception(key)
             try:
-                # self.correcting_database_types(name, data)
-
-                self.createtable(name, data[name])
-
                 # inserting in the measured values:
-                self.updatetable(name, data[name])
-
+                self.insert_rows(name, rows)
             except AssertionError as assertion:
                 self.sig_assertion.emit(assertion.args[0])
                 self._logger.exception(assertion)
-            except KeyError as key:
-                self.sig_assertion.emit(key.args[0])
-                self._logger.exception(key)
+
+    def get_spool(self):
+        """the spool for data which could not be stored"""
+        path = self.conf["general"].get(
+            "spool_location", os.path.join("configurations", "log_spool.bin")
+        )
+        if self.spool is None or self.spool.path != path:
+            self.spool = Spool(path)
+        return self.spool
+
+    def spooling(self, data, message):
+        """keep data in the spool, to be stored later"""
+        try:
+            self.get_spool().append(data)
+            self.sig_assertion.emit(f"Logger: {message}, spooling to disk")
+        except OSError as err:
+            self._logger.exception(err)
+            self.sig_assertion.emit(f"Logger: {message}, spooling failed: {err}")
+
+    def start_replay(self):
+        """replay the spool into the database, in a background thread"""
+        if self.replaying is not None and self.replaying.is_alive():
+            return
+        self.replaying = Thread(
+            target=self.replay_spool,
+            args=(self.spool, self.dbname),
+            name="main_Logger_spool_replay",
+            daemon=True,
+        )
+        self.replaying.start()
+
+    def replay_spool(self, spool, dbname, batch_size=500):
+        """store the spooled data packages in batches"""
+        self._logger.info(
+            "replaying %d bytes of spooled data into %s", spool.pending(), dbname
+        )
+        try:
+            conn = sqlite3.connect(dbname, timeout=20)
+            try:
+                spool.replay(
+                    lambda datalist: self.storing_spooled(conn, datalist),
+                    batch_size=batch_size,
+                    progress=self.spool_progress,
+                )
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError) as err:
+            self._logger.warning("replaying the spool stopped: %s", err)
+
+    def storing_spooled(self, conn, datalist):
+        """store a batch of spooled data packages in one transaction
+
+        rows whose timeseconds are already in the table are left out,
+        so a batch can safely be replayed twice
+        """
+        with self.db_lock:
+            self.mycursor = conn.cursor()
+            try:
+                with conn:
+                    for name in self.names:
+                        stored = self.stored_times(name, datalist)
+                        packages = [
+                            data
+                            for data in datalist
+                            if data.get(name)
+                            and data[name].get("timeseconds") not in stored
+                        ]
+                        if packages:
+                            self.storing_to_database_many(packages, [name])
+            except sqlite3.Error:
+                # the transaction was rolled back, with possibly added columns
+                self.known_columns = {}
+                raise
+
+    def stored_times(self, name, datalist):
+        """timeseconds of the packages in datalist which are already in table name"""
+        times = [
+            data[name]["timeseconds"]
+            for data in datalist
+            if data.get(name) and "timeseconds" in data[name]
+        ]
+        if not times:
+            return set()
+        try:
+            self.mycursor.execute(
+                "SELECT timeseconds FROM {} WHERE timeseconds BETWEEN ? AND ?".format(
+                    name
+                ),
+                (min(times), max(times)),
+            )
+        except OperationalError as err:
+            if "no such table" not in str(err):
+                raise
+            return set()  # the table does not exist yet
+        return {row[0] for row in self.mycursor.fetchall()}
+
+    def spool_progress(self, done, total, replayed):
+        """report the progress of replaying the spool"""
+        progress = dict(done_bytes=done, total_bytes=total, packages=replayed)
+        self.sig_spool_progress.emit(progress)
+        self._logger.info(
+            "replayed %d spooled data packages (%.0f %%)",
+            replayed,
+            100 * done / max(total, 1),
+        )
 
     @pyqtSlot(dict)
     def store_data(self, data):
@@ -467,52 +657,33 @@ class main_Logger(AbstractLoopThread):
         what data should be logged is set in self.conf
         or will be set there eventually at any rate
         """
-        self.operror = False
         if self.not_yet_initialised:
             return
 
-        names = [
-            "ITC",
-            "ILM",
-            "IPS",
-            "LakeShore350",
-            "Keithley2182_1",
-            "Keithley2182_2",
-            "Keithley2182_3",
-            "Keithley6220_1",
-            "Keithley6220_2",
-            "SR830",
-        ]
-
         self.connected = self.connectdb(self.conf["general"]["logfile_location"])
         if not self.connected:
-            self.sig_assertion.emit("no connection, storing locally")
-            self.local_list.append(data)
+            self.spooling(data, "no connection")
             return
 
         try:
-            with self.conn:
-                self.mycursor = self.conn.cursor()
-                if len(self.local_list) > 0:
-                    for entry in self.local_list:
-                        self.storing_to_database(entry, names)
-                    self.local_list = []
-
-                self.storing_to_database(data, names)
-        except OperationalError as e:
-            self.operror = True
-            self.local_list.append(data)
-            self.sig_assertion.emit(e.args[0])
+            with self.db_lock:
+                with self.conn:
+                    self.mycursor = self.conn.cursor()
+                    self.storing_to_database_many([data], self.names)
         except sqlite3.Error as er:
-            if not self.operror:
-                self.local_list.append(data)
-            self.sig_assertion.emit(er.args[0])
-            print(er)
-        # data.update(timedict)
+            # the transaction was rolled back, with possibly added columns
+            self.known_columns = {}
+            self.spooling(data, er.args[0])
+            return
+        if self.get_spool().pending() > 0:
+            self.start_replay()
 
 
 class main_Logger_adaptable(main_Logger):
-    """This is a the logging worker thread"""
+    """This is a the logging worker thread
+
+    the data is stored by an SQLiteWriter, in its own thread
+    """
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -521,49 +692,90 @@ class main_Logger_adaptable(main_Logger):
         )
 
         self.interval = 1
+        self.writer = None
+        # once, for whichever writer is current at exit
+        atexit.register(self.close_writer, 10)
+        try:
+            self.writer_gauges = dict(
+                queue_depth=Gauge(
+                    "CryoGUI_logger_queue_depth", "data packages waiting to be stored"
+                ),
+                commit_latency=Gauge(
+                    "CryoGUI_logger_commit_latency_seconds",
+                    "duration of the last commit to the database",
+                ),
+            )
+        except ValueError:
+            self._logger.info("sth went wrong with registering prometheus Gauges")
+            self.writer_gauges = {}
+
+    def get_writer(self, dbname):
+        """the writer for the database dbname, (re)started if necessary"""
+        if self.writer is not None and self.writer.dbname != dbname:
+            self.writer.close()
+            self.writer = None
+        if self.writer is None:
+            self.known_columns = {}
+            self.writer = SQLiteWriter(
+                dbname,
+                self.storing_batch,
+                on_commit=self.writer_committed,
+                on_error=self.writer_failed,
+                name="main_Logger_adaptable_writer",
+            )
+            self.writer.start()
+        return self.writer
+
+    def close_writer(self, timeout=None):
+        """store what is queued, and close the writer"""
+        if self.writer is not None:
+            self.writer.close(timeout)
+
+    def storing_batch(self, cursor, datalist):
+        """store a group of data packages, called by the writer thread
+
+        sqlite errors are passed on to the writer, which retries the group
+        """
+        self.mycursor = cursor
+        names = dict.fromkeys(name for data in datalist for name in data)
+        for name in names:
+            self.storing_to_database_many(
+                [data for data in datalist if name in data], [name]
+            )
+
+    def writer_committed(self, stats):
+        """report queue depth and commit latency of the writer"""
+        if self.writer_gauges:
+            self.writer_gauges["queue_depth"].set(stats["queue_depth"])
+            self.writer_gauges["commit_latency"].set(stats["last_commit_latency_s"])
+        self._logger.debug(
+            "stored, %d data packages waiting, last commit took %.1f ms",
+            stats["queue_depth"],
+            stats["last_commit_latency_s"] * 1e3,
+        )
+
+    def writer_failed(self, err):
+        """the transaction was rolled back, with possibly added columns"""
+        self.known_columns = {}
+        self.sig_assertion.emit("Logger: " + str(err))
 
     @pyqtSlot(dict)
     def store_data(self, data):
         """storing logging data
         what data should be logged is set in self.conf
         or will be set there eventually at any rate
+
+        the data is only queued here, the writer thread stores it
         """
-        self._logger.debug("storing data in sqlite!")
-        self.operror = False
         if self.not_yet_initialised:
             return
-
-        names = data.keys()
-
-        self.connected = self.connectdb(self.conf["logfile_location"])
-        if not self.connected:
-            self.sig_assertion.emit("no connection, storing locally")
-            self._logger.debug("no connection to database, storing locally")
-            self.local_list.append(data)
-            return
-
-        try:
-            with self.conn:
-                self.mycursor = self.conn.cursor()
-                if len(self.local_list) > 0:
-                    for entry in self.local_list:
-                        self.storing_to_database(entry, names)
-                    self.local_list = []
-
-                self.storing_to_database(data, names)
-        except OperationalError as e:
-            self.operror = True
-            self.local_list.append(data)
-            self.sig_assertion.emit(e.args[0])
-            self._logger.exception(e)
-        except sqlite3.Error as er:
-            if not self.operror:
-                self.local_list.append(data)
-            self.sig_assertion.emit(er.args[0])
-            self._logger.exception(er)
-            print(er)
-        self._logger.debug("done storing data in sqlite!")
-        # data.update(timedict)
+        writer = self.get_writer(self.conf["logfile_location"])
+        if not writer.put(data, timeout=self.interval):
+            self.sig_assertion.emit("Logger: queue for the database full, data lost")
+            self._logger.error(
+                "queue for the database full, data lost (%d packages so far)",
+                writer.stats()["dropped"],
+            )
 
     def update_conf(self, conf):
         """
@@ -595,28 +807,13 @@ class live_Logger_bare:
         self.dataLock = mainthread.dataLock
         self.dataLock_live = mainthread.dataLock_live
 
-        self.calculations = {
-            "ar_mean": lambda time, value: np.nanmean(value),
-            # 'stddev': lambda time, value: np.nanstd(value),
-            "stderr": lambda time, value: np.nanstd(value) / np.sqrt(len(value)),
-            "stddev_rel": lambda time, value: np.nanstd(value) / np.nanmean(value),
-            "stderr_rel": lambda time, value: np.nanstd(value)
-            / (np.nanmean(value) * np.sqrt(len(value))),
-            # 'test': lambda time, value: print(time),
-            "slope": lambda time, value: nppolyfit(time, value, deg=1, full=True),
-            # 'slope_of_mean': lambda time, value: nppolyfit(time, value, deg=1)[1] * 60
-        }
+        # reference definitions of the statistics, which are
+        # calculated incrementally by RollingStats
+        self.calculations = CALCULATIONS
 
         start_http_server(8000)
 
-        self.slopes = {
-            "slope": lambda value, mean: value[0][1] * 60,  # minutes,
-            # minutes,
-            "slope_rel": lambda value, mean: value[0][1] / mean * 60,
-            "slope_residuals": lambda value, mean: value[1][0][0] * 60
-            if len(value[1][0]) > 0
-            else np.nan,
-        }
+        self.slopes = SLOPES
         self.noCalc = [
             "time",
             "Time",
@@ -634,6 +831,9 @@ class live_Logger_bare:
             "thread",
         ]
 
+        # windows to restore, by instrument, see initialisation
+        self.window_pending = {}
+
         self.pre_init()
         # self.initialisation() # this is done by starting this new thread
         # anyways!
@@ -642,74 +842,80 @@ class live_Logger_bare:
     def running(self):
         """
         go through all stored values for every instrument,
-        and append them to the list which will be plotted
+        and append them to the ring buffers which will be plotted
         """
         try:
             # print("live logger trying to log")
+            with self.dataLock:
+                # copied, so that storing data does not wait for the statistics
+                data = {instr: dict(values) for instr, values in self.data.items()}
             with self.dataLock_live:
-                with self.dataLock:
-                    # print(self.data_live)
-                    for instr in self.data:
-                        timedict = dict(
-                            logging_timeseconds=time.time() - self.startingtime,
-                            # logging_ReadableTime=convert_time(
-                            # time.time()),
-                            # logging_SearchableTime=convert_time_searchable(time.time())
+                # print(self.data_live)
+                for instr in data:
+                    timedict = dict(
+                        logging_timeseconds=time.time() - self.startingtime,
+                        # logging_ReadableTime=convert_time(
+                        # time.time()),
+                        # logging_SearchableTime=convert_time_searchable(time.time())
+                    )
+                    dic = data[instr]
+                    dic.update(timedict)
+
+                    try:
+                        channels = self.stats_channels[instr]
+                        # all channels subject to the statistics at once
+                        values = [dic.get(varkey) for varkey in channels]
+                        dropped = self.stats_values[instr].append(
+                            values, timedict["logging_timeseconds"]
+                        )
+                        self.calculations_perform(
+                            instr, timedict["logging_timeseconds"], dropped
+                        )
+                    except KeyError as e:
+                        self._logger.warning(
+                            "KeyError in %s, run initialisation again", instr
+                        )
+                        self._logger.exception(e)
+                        raise InitError(
+                            "Some instrument did not go through, trying init again"
                         )
-                        dic = deepcopy(self.data[instr])
-                        dic.update(timedict)
 
-                        for varkey in dic:
-                            # print(instr, varkey)
-                            try:
-                                self.data_live[instr][varkey].append(dic[varkey])
-                            except KeyError as e:
-                                # if e.args[0].startswith("'interval"):
-                                self._logger.warning(
-                                    "KeyError in %s, %s, run initialisation again",
-                                    instr,
-                                    varkey,
-                                )
-                                self._logger.exception(e)
-                                raise InitError(
-                                    "Some key did not go through, trying init again"
-                                )
-                                # self.initialisation()
-                                # else:
-                                #     raise e
-
-                        if self.time_init:
-                            times = [
-                                float(x)
-                                for x in self.data_live[instr]["logging_timeseconds"]
-                            ]
-                        else:
-                            times = [0]
+                    for varkey in dic:
+                        # print(instr, varkey)
+                        if varkey in channels:
+                            continue
+                        try:
+                            self.data_live[instr][varkey].append(
+                                dic[varkey], timedict["logging_timeseconds"]
+                            )
+                        except KeyError as e:
+                            # if e.args[0].startswith("'interval"):
+                            self._logger.warning(
+                                "KeyError in %s, %s, run initialisation again",
+                                instr,
+                                varkey,
+                            )
+                            self._logger.exception(e)
+                            raise InitError(
+                                "Some key did not go through, trying init again"
+                            )
+                            # self.initialisation()
+                            # else:
+                            #     raise e
+
                 for instr in self.data_live:
+                    # the ring buffers drop their oldest values by themselves
+                    uptodate, timediff = calculate_timediff(
+                        self.data_live[instr]["realtime"]
+                    )
+                    latest = self.latest_values(instr)
                     for varkey in self.data_live[instr]:
-                        for calc in self.calculations:
-                            if all((x not in varkey for x in self.noCalc)) and all(
-                                (x not in instr for x in self.noCalc)
-                            ):
-                                if self.time_init:
-                                    self.calculations_perform(
-                                        instr, varkey, calc, times
-                                    )
-                        if self.count > self.length_list:
-                            self.counting = False
-                            try:
-                                self.data_live[instr][varkey].pop(0)
-                            except IndexError as e:
-                                self._logger.error(
-                                    "IndexError in %s, %s", instr, varkey
-                                )
-                                self._logger.expeption(e)
-                        uptodate, timediff = calculate_timediff(
-                            self.data_live[instr]["realtime"]
-                        )
                         if uptodate:
                             try:
-                                _val = self.data_live[instr][varkey][-1]
+                                if varkey in latest:
+                                    _val = latest[varkey]
+                                else:
+                                    _val = self.data_live[instr][varkey][-1]
                                 self.Gauges[instr][varkey].set(_val)
                             except TypeError as err:
                                 if not err.args[0].startswith(
@@ -749,56 +955,37 @@ class live_Logger_bare:
             self.initialisation()
             self.running()
         self.time_init = True
-        if self.counting:
-            self.count += 1
 
-    def calculations_perform(self, instr, varkey, calc, times):
+    def calculations_perform(self, instr, timestamp, dropped):
         """
-        perform one specified calculation on all corresponding datasets
+        update the statistics of all channels of one instrument with their
+        newest values, append the results to the respective ring buffers
+
+        dropped: the values which dropped out of the window, if any
 
         return: None
         """
-        if calc == "slope":
-            fit = self.calculations[calc](times, self.data_live[instr][varkey])
-            for name, calc_slope in zip(self.slopes.keys(), self.slopes.values()):
-                self.data_live[instr][
-                    "{key}_calc_{c}".format(key=varkey, c=name)
-                ].append(
-                    calc_slope(
-                        fit,
-                        self.data_live[instr][
-                            "{key}_calc_{c}".format(key=varkey, c="ar_mean")
-                        ][-1],
-                    )
-                )
-        elif calc == "slope_of_mean":
-            times_spec = deepcopy(times)
-            while len(times_spec) > len(
-                self.data_live[instr]["{key}_calc_{c}".format(key=varkey, c="ar_mean")]
-            ):
-                times_spec.pop(0)
-            fit = self.data_live[instr][
-                "{key}_calc_{c}".format(key=varkey, c=calc)
-            ].append(
-                self.calculations[calc](
-                    times_spec,
-                    self.data_live[instr][
-                        "{key}_calc_{c}".format(key=varkey, c="ar_mean")
-                    ],
-                )
-            )
+        buffer = self.stats_values[instr]
+        stats = self.stats[instr]
+        if stats.due():
+            stats.recompute(buffer.times(), buffer.view())
         else:
-            try:
-                self.data_live[instr][
-                    "{key}_calc_{c}".format(key=varkey, c=calc)
-                ].append(self.calculations[calc](times, self.data_live[instr][varkey]))
-            except TypeError as e:
-                # raise AssertionError(e_type.args[0])
-                # print('TYPE CALC')
-                self._logger.exception(e)
-            except ValueError as e_val:
-                self._logger.exception(e_val)
-                # raise AssertionError(e_val.args[0])
+            stats.push(timestamp, buffer.view(1)[:, 0], dropped)
+        if not self.time_init:
+            return
+        for name, results in stats.results().items():
+            self.stats_results[instr][name].append(results, timestamp)
+
+    def latest_values(self, instr):
+        """newest values of all channels and results, read per block
+
+        return: dict of variable key: value
+        """
+        latest = {}
+        for buffer, keys in self.stats_blocks.get(instr, ()):
+            if len(buffer):
+                latest.update(zip(keys, buffer.view(1)[:, 0].tolist()))
+        return latest
 
     def pre_init(self):
         self.initialised = False
@@ -808,15 +995,29 @@ class live_Logger_bare:
         """
         copy the current data-dict,
         update for logging times,
-        insert empty lists in all values
+        insert empty ring buffers for all values
+
+        the windows of instruments which were there before are carried
+        over, those of new instruments are taken from window_pending
+        (e.g. a checkpoint), or from window_source, if possible
         """
+        carried = {}
+        if getattr(self, "stats_values", None):
+            with self.dataLock_live:
+                carried = self.window_state()
         self.startingtime = time.time()
         timedict = dict(
             logging_timeseconds=0,
         )
         self.time_init = False
-        self.count = 0
-        self.counting = True
+        # per instrument: the channels subject to the statistics (with their
+        # index), their values, statistics, and results, each as one block
+        self.stats_channels = {}
+        self.stats_values = {}
+        self.stats_results = {}
+        self.stats = {}
+        # per instrument: (block, its variable keys) for reading all at once
+        self.stats_blocks = {}
         try:
             self.Gauges["ITC"]
         except AttributeError:
@@ -834,8 +1035,50 @@ class live_Logger_bare:
                     if instrument not in self.Gauges.keys():
                         self.Gauges[instrument] = {}
                     self.data_live[instrument].update(timedict)
+                    # noCalc and non-numeric keys are sorted out once, here
+                    channels = [
+                        variablekey
+                        for variablekey in dic
+                        if all((x not in variablekey for x in self.noCalc))
+                        and all((x not in instrument for x in self.noCalc))
+                        and is_numeric(dic[variablekey])
+                    ]
+                    self.stats_channels[instrument] = {
+                        variablekey: index for index, variablekey in enumerate(channels)
+                    }
+                    self.stats_values[instrument] = RingBuffer(
+                        self.length_list, channels=len(channels)
+                    )
+                    self.stats[instrument] = RollingStats(
+                        shape=(len(channels),), reanchor=self.length_list
+                    )
+                    self.stats_results[instrument] = {
+                        calc: RingBuffer(self.length_list, channels=len(channels))
+                        for calc in dict.fromkeys(
+                            list(self.calculations) + list(self.slopes)
+                        )
+                    }
+                    self.stats_blocks[instrument] = [
+                        (self.stats_values[instrument], channels)
+                    ] + [
+                        (
+                            results,
+                            [
+                                "{key}_calc_{c}".format(key=variablekey, c=calc)
+                                for variablekey in channels
+                            ],
+                        )
+                        for calc, results in self.stats_results[instrument].items()
+                    ]
                     for variablekey in dic:
-                        self.data_live[instrument][variablekey] = []
+                        if variablekey in self.stats_channels[instrument]:
+                            self.data_live[instrument][variablekey] = self.stats_values[
+                                instrument
+                            ].channel(self.stats_channels[instrument][variablekey])
+                        else:
+                            self.data_live[instrument][
+                                variablekey
+                            ] = RingBuffer.for_value(self.length_list, dic[variablekey])
                         try:
                             # print(instrument, variablekey)
                             if variablekey not in self.Gauges[instrument].keys():
@@ -849,29 +1092,12 @@ class live_Logger_bare:
                             self._logger.info(
                                 "sth went wrong with registering prometheus Gauges"
                             )
-                        if all((x not in variablekey for x in self.noCalc)) and all(
-                            (x not in instrument for x in self.noCalc)
-                        ):
-                            for calc in self.calculations:
-                                self.data_live[instrument][
-                                    "{key}_calc_{c}".format(key=variablekey, c=calc)
-                                ] = []
-                                if (
-                                    "{key}_calc_{c}".format(key=variablekey, c=calc)
-                                    not in self.Gauges[instrument].keys()
-                                ):
-                                    self.Gauges[instrument][
-                                        "{key}_calc_{c}".format(key=variablekey, c=calc)
-                                    ] = Gauge(
-                                        "CryoGUI_{}_{}_calc_{}".format(
-                                            instrument, variablekey, calc
-                                        ),
-                                        "",
-                                    )
-                            for calc in self.slopes:
+                        if variablekey in self.stats_channels[instrument]:
+                            index = self.stats_channels[instrument][variablekey]
+                            for calc in self.stats_results[instrument]:
                                 self.data_live[instrument][
                                     "{key}_calc_{c}".format(key=variablekey, c=calc)
-                                ] = []
+                                ] = self.stats_results[instrument][calc].channel(index)
                                 if (
                                     "{key}_calc_{c}".format(key=variablekey, c=calc)
                                     not in self.Gauges[instrument].keys()
@@ -884,25 +1110,104 @@ class live_Logger_bare:
                                         ),
                                         "",
                                     )
+                for instrument in self.data_live:
+                    state = carried.get(instrument)
+                    if state is None:
+                        state = self.window_pending.pop(instrument, None)
+                    if state is None:
+                        state = self.window_source(instrument)
+                    if state is not None:
+                        self.restore_window(instrument, state)
         self.initialised = True
 
+    def window_state(self):
+        """the live windows of all instruments, with absolute times,
+        to be called with dataLock_live
+
+        returns: dict of instruments, of dicts of
+            channels: names of the channels subject to the statistics
+            values, times: their values (channels x n) and times
+            results: {calculation: (values, times)} of the statistics
+            rings: {key: (values, times)} of the other numeric values
+        """
+        state = {}
+        for instr, buffer in self.stats_values.items():
+            state[instr] = dict(
+                channels=np.array(list(self.stats_channels[instr]), dtype=str),
+                values=np.array(buffer.view()),
+                times=buffer.times() + self.startingtime,
+                results={
+                    calc: (
+                        np.array(results.view()),
+                        results.times() + self.startingtime,
+                    )
+                    for calc, results in self.stats_results[instr].items()
+                },
+                rings={
+                    key: (np.array(ring.view()), ring.times() + self.startingtime)
+                    for key, ring in self.data_live.get(instr, {}).items()
+                    if isinstance(ring, RingBuffer)
+                    and ring.channels is None
+                    and ring.dtype != object
+                },
+            )
+        return state
+
+    def restore_window(self, instr, state):
+        """fill the windows of instr from state (see window_state),
+        matching the channels by name, to be called with dataLock_live
+        right after they were created"""
+        try:
+            index = {name: i for i, name in enumerate(state["channels"])}
+            channels = self.stats_channels[instr]
+
+            def matched(values):
+                out = np.full((len(channels), values.shape[-1]), np.nan)
+                for name, i in channels.items():
+                    if name in index:
+                        out[i] = values[index[name]]
+                return out
+
+            buffer = self.stats_values[instr]
+            buffer.extend(matched(state["values"]), state["times"] - self.startingtime)
+            for calc, (values, times) in state.get("results", {}).items():
+                if calc in self.stats_results[instr]:
+                    self.stats_results[instr][calc].extend(
+                        matched(values), times - self.startingtime
+                    )
+            for key, (values, times) in state.get("rings", {}).items():
+                ring = self.data_live[instr].get(key)
+                if (
+                    isinstance(ring, RingBuffer)
+                    and ring.channels is None
+                    and ring.dtype != object
+                ):
+                    ring.extend(values, times - self.startingtime)
+            if len(buffer):
+                self.stats[instr].recompute(buffer.times(), buffer.view())
+        except (KeyError, ValueError, IndexError) as e:
+            self._logger.warning("could not restore the window of %s: %s", instr, e)
+
+    def window_source(self, instrument):
+        """the window of a new instrument, to fill its live windows with,
+        None if there is none, see window_state"""
+        return None
+
     def setLength(self, length):
         """set the number of measurements the calculation should be conducted over"""
-
-        if self.length_list > length:
-            with self.dataLock_live:
-                for instr in self.data_live:
-                    for varkey in self.data_live[instr]:
-                        self.data_live[instr][varkey] = self.data_live[instr][varkey][
-                            (self.length_list - length) :
-                        ]
-        elif self.length_list < length:
-            with self.dataLock_live:
-                for instr in self.data_live:
-                    for varkey in self.data_live[instr]:
-                        self.data_live[instr][varkey] = [np.nan] * (
-                            length - self.length_list
-                        ) + self.data_live[instr][varkey]
+        with self.dataLock_live:
+            for instr in self.data_live:
+                for varkey in self.data_live[instr]:
+                    # the channels resize their blocks, once
+                    self.data_live[instr][varkey].resize(length)
+            for instr, stats in self.stats.items():
+                self.stats_values[instr].resize(length)
+                for results in self.stats_results[instr].values():
+                    results.resize(length)
+                stats.reanchor = length
+                stats.recompute(
+                    self.stats_values[instr].times(), self.stats_values[instr].view()
+                )
         self.length_list = length
 
     def update_conf(self, conf):
@@ -958,9 +1263,39 @@ class live_Logger(live_Logger_bare, AbstractLoopThread):
 
 
 class live_zmqDataStoreLogger(live_Logger_bare, AbstractLoopThreadDataStore):
-    """docstring for live_Logger"""
-
-    def __init__(self, **kwargs):
+    """docstring for live_Logger
+
+    With pipeline=True, data is stored and questions are answered in
+    threads of their own (see zmqDataStore.start_pipeline), the loop of
+    this thread calculates the statistics. After every loop, it publishes
+    the newest live values as snapshot_live, from which live questions
+    are answered: dicts of instruments, of keys, of a list of the newest
+    value, which are never changed once published. Alongside, the same
+    values are published as a list in snapshot_positions, with the layout
+    of (instrument, key): position in the list, which only changes with
+    the ring buffers, so that prepared questions are answered from the
+    positions they resolved once.
+    """
+
+    # seconds between reports of the queue depths and latencies
+    pipeline_report_interval = 60
+
+    def __init__(
+        self,
+        pipeline=False,
+        checkpoint_file=None,
+        checkpoint_interval=60,
+        checkpoint_max_age=600,
+        backfill_db=None,
+        **kwargs,
+    ):
+        """checkpoint_file: the live windows are saved there every
+            checkpoint_interval seconds, and restored from there on start,
+            if they are at most checkpoint_max_age seconds old
+        backfill_db: cooldown database to fill the windows of instruments
+            from, which were not restored, with rows of at most
+            checkpoint_max_age seconds ago
+        """
         super().__init__(**kwargs)
         self._logger = logging.getLogger(
             "CryoGUI." + __name__ + "." + self.__class__.__name__
@@ -968,6 +1303,26 @@ class live_zmqDataStoreLogger(live_Logger_bare, AbstractLoopThreadDataStore):
         self.interval = 0.1
         self.length_list = 60 * 5 * 2
         del self.initialised
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_max_age = checkpoint_max_age
+        self.backfill_db = backfill_db
+        self._checkpointed = time.monotonic()
+        self._checkpoint_writer = None
+        self._backfilled = set()
+        if checkpoint_file is not None:
+            self.window_pending = self.load_checkpoint()
+        self.snapshot_live = None
+        self.snapshot_positions = None
+        self._layout = self._layout_of = None
+        self._reinitialise = False
+        self._ingested = 0
+        self._published = (0, time.time())
+        self._pipeline_reported = time.monotonic()
+        self._pipeline_gauges = {}
+        if pipeline:
+            self.start_pipeline()
+            self.pipeline_stats["statistics"] = StageStats("statistics")
 
     def zmq_handle(self):
         try:
@@ -980,12 +1335,210 @@ class live_zmqDataStoreLogger(live_Logger_bare, AbstractLoopThreadDataStore):
     def running(self):
         try:
             self.initialised
+            if self._reinitialise:
+                self._reinitialise = False
+                self.initialisation()
             super().running()
         except AttributeError:
             time.sleep(0.02)
             self.initialisation()
+        # the live ring buffers got new values, held questions about them
+        # (see zmqDataStore.question_to_self) might be answered now
+        if self.pipeline_running:
+            self.publish_snapshot()
+        elif self._waiting:
+            self.answer_waiting()
+        if (
+            self.checkpoint_file is not None
+            and time.monotonic() - self._checkpointed >= self.checkpoint_interval
+        ):
+            self.checkpoint()
         # TODO: NOT FINISHED !!!
 
+    def checkpoint(self):
+        """save the live windows to checkpoint_file, in a thread of its own"""
+        self._checkpointed = time.monotonic()
+        if self._checkpoint_writer is not None and self._checkpoint_writer.is_alive():
+            return
+        with self.dataLock_live:
+            state = self.window_state()
+        self._checkpoint_writer = Thread(
+            target=self.write_checkpoint, args=(state,), daemon=True
+        )
+        self._checkpoint_writer.start()
+
+    def write_checkpoint(self, state):
+        """write state (see window_state) as npz file, replacing the
+        checkpoint file at once"""
+        arrays = dict(saved=np.array(time.time()))
+        for instr, window in state.items():
+            for name in ("channels", "values", "times"):
+                arrays[f"{instr}/{name}"] = window[name]
+            for kind in ("results", "rings"):
+                for key, (values, times) in window[kind].items():
+                    arrays[f"{instr}/{kind}/{key}"] = values
+                    arrays[f"{instr}/{kind}_times/{key}"] = times
+        temporary = self.checkpoint_file + ".tmp"
+        try:
+            with open(temporary, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(temporary, self.checkpoint_file)
+        except OSError as e:
+            self._logger.warning("could not write the checkpoint: %s", e)
+
+    def load_checkpoint(self):
+        """the windows saved in checkpoint_file, if it is recent enough
+
+        returns: dict of instruments, of their state, see window_state
+        """
+        if not os.path.isfile(self.checkpoint_file):
+            return {}
+        try:
+            with np.load(self.checkpoint_file, allow_pickle=False) as npz:
+                age = time.time() - float(npz["saved"])
+                if age > self.checkpoint_max_age:
+                    self._logger.info("checkpoint is %.0f s old, not restored", age)
+                    return {}
+                state = {}
+                for name in npz.files:
+                    if name == "saved" or name.split("/", 2)[1].endswith("_times"):
+                        continue
+                    instr, kind, *key = name.split("/", 2)
+                    window = state.setdefault(instr, dict(results={}, rings={}))
+                    if key:
+                        times = npz[f"{instr}/{kind}_times/{key[0]}"]
+                        window[kind][key[0]] = (npz[name], times)
+                    else:
+                        window[kind] = npz[name]
+        except (OSError, ValueError, KeyError) as e:
+            self._logger.warning("could not read the checkpoint: %s", e)
+            return {}
+        self._logger.info(
+            "restoring the windows of %s from a checkpoint %.0f s old",
+            ", ".join(state),
+            age,
+        )
+        return state
+
+    def window_source(self, instrument):
+        """the latest rows of instrument in backfill_db, as window
+
+        These are the logged rows, at the logging interval, which thus
+        span a longer time than the live window does.
+        """
+        if self.backfill_db is None or instrument in self._backfilled:
+            return None
+        self._backfilled.add(instrument)
+        try:
+            conn = sqlite3.connect(f"file:{self.backfill_db}?mode=ro", uri=True)
+            try:
+                cursor = conn.cursor()
+                if instrument not in instrument_tables(cursor):
+                    return None
+                columns = numeric_columns(cursor, instrument)
+                rows = cursor.execute(
+                    "SELECT timeseconds{} FROM {} WHERE timeseconds > ?"
+                    " ORDER BY timeseconds DESC LIMIT ?".format(
+                        "".join("," + _quote(c) for c in columns),
+                        _quote(instrument),
+                    ),
+                    (time.time() - self.checkpoint_max_age, self.length_list),
+                ).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self._logger.warning("could not backfill %s: %s", instrument, e)
+            return None
+        if not rows:
+            return None
+        times, values = rows_to_arrays(
+            [dict(zip(["timeseconds"] + columns, row)) for row in reversed(rows)],
+            columns,
+        )
+        channels = [c for c in columns if c in self.stats_channels[instrument]]
+        self._logger.info("backfilling %s with %d logged rows", instrument, len(rows))
+        return dict(
+            channels=channels,
+            values=np.array([values[:, columns.index(c)] for c in channels]),
+            times=times,
+            rings={
+                c: (values[:, i], times)
+                for i, c in enumerate(columns)
+                if c not in self.stats_channels[instrument]
+            },
+        )
+
+    def publish_snapshot(self):
+        """publish the newest live values for the responder, record the
+        depth (samples stored meanwhile) and latency (since the oldest of
+        them arrived) of the statistics, report all stages when due"""
+        with self.dataLock_live:
+            layout = self._snapshot_layout()
+            values = [_EMPTY] * len(layout)
+            snapshot = {}
+            for instr, rings in self.data_live.items():
+                latest = self.latest_values(instr)
+                snapshot[instr] = {}
+                for key, ring in rings.items():
+                    if key in latest:
+                        value = latest[key]
+                    elif len(ring):
+                        value = ring[-1]
+                        if isinstance(value, np.generic):
+                            value = value.item()
+                    else:
+                        continue
+                    snapshot[instr][key] = [value]
+                    values[layout[instr, key]] = value
+        with self.dataLock:
+            arrivals = [
+                values["timeseconds"]
+                for values in self.data.values()
+                if values.get("timeseconds", 0) > self._published[1]
+            ]
+        self.snapshot_live = snapshot
+        self.snapshot_positions = (layout, values)
+        self.notify_responder()
+
+        now = time.time()
+        stage = self.pipeline_stats["statistics"]
+        ingested = self._ingested
+        stage.depth(ingested - self._published[0])
+        if arrivals:
+            stage.latency(now - min(arrivals))
+        self._published = (ingested, now)
+
+        if time.monotonic() - self._pipeline_reported >= self.pipeline_report_interval:
+            self._pipeline_reported = time.monotonic()
+            for name, stats in self.pipeline_report().items():
+                for figure in ("depth_mean", "latency_mean_s", "latency_max_s"):
+                    gauge = self._pipeline_gauges.get((name, figure))
+                    if gauge is None:
+                        gauge = self._pipeline_gauges[(name, figure)] = Gauge(
+                            f"CryoGUI_dataStore_{name}_{figure}", ""
+                        )
+                    gauge.set(stats[figure])
+
+    def _snapshot_layout(self):
+        """(instrument, key): position of all live values, a new dict
+        whenever the ring buffers changed (the published one is kept)"""
+        layout = self._layout
+        if (
+            layout is None
+            or self._layout_of is not self.data_live
+            or sum(map(len, self.data_live.values())) != len(layout)
+        ):
+            layout = {
+                (instr, key): position
+                for position, (instr, key) in enumerate(
+                    (instr, key)
+                    for instr, rings in self.data_live.items()
+                    for key in rings
+                )
+            }
+            self._layout, self._layout_of = layout, self.data_live
+        return layout
+
     def store_data(self, ID, data):
         timedict = {
             "timeseconds": time.time(),
@@ -995,13 +1548,118 @@ class live_zmqDataStoreLogger(live_Logger_bare, AbstractLoopThreadDataStore):
         data.update(timedict)
         with self.dataLock:
             self.data[ID] = data
+        self._ingested += 1
 
-        present = True
         with self.dataLock_live:
-            if ID not in self.data_live:
-                present = False
-        if not present:
-            self.initialisation()
+            if ID not in getattr(self, "data_live", {}):
+                # new instrument, done in the next loop
+                self._reinitialise = True
+
+    def compile_query(self, indicators, live):
+        """resolve the values in indicators to their positions once
+
+        Live values are read from the newest entry of their ring buffers,
+        the channels of one buffer at once, or, if it is published, from
+        their positions in snapshot_positions, other values from the data.
+        The resolution is renewed when the ring buffers are (see
+        initialisation), or the layout of the snapshot changes. Freshness
+        is judged by the arrival time of the oldest sample among the
+        instruments.
+        """
+        pairs = [(ind["instr"], ind["value"]) for ind in indicators.values()]
+        instruments = list(dict.fromkeys(instr for instr, _ in pairs))
+        resolved = dict(of=None, blocks=None, layout=None)
+
+        def resolve():
+            blocks = {}
+            for position, (instr, key) in enumerate(pairs):
+                ring = self.data_live[instr][key]
+                buffer = getattr(ring, "buffer", ring)
+                rows, positions = blocks.setdefault(id(buffer), (buffer, [], []))[1:]
+                rows.append(getattr(ring, "index", None))
+                positions.append(position)
+            resolved.update(of=self.data_live, blocks=list(blocks.values()))
+
+        def values_live():
+            if resolved["of"] is not self.data_live:
+                resolve()
+            values = [None] * len(pairs)
+            for buffer, rows, positions in resolved["blocks"]:
+                latest = buffer.view(1)
+                if rows[0] is None:
+                    newest = latest.tolist() * len(positions)
+                else:
+                    newest = latest[rows, 0].tolist()
+                for position, value in zip(positions, newest):
+                    values[position] = value
+            arrival = min(
+                self.data_live[instr]["timeseconds"][-1] for instr in instruments
+            )
+            return values, arrival
+
+        def values_stored():
+            values = [self.data[instr][key] for instr, key in pairs]
+            arrival = min(self.data[instr]["timeseconds"] for instr in instruments)
+            return values, arrival
+
+        def values_snapshot(published):
+            layout, snapshot = published
+            if resolved["layout"] is not layout:
+                resolved.update(layout=None)
+                for instr, key in pairs + [(i, "timeseconds") for i in instruments]:
+                    if (instr, key) not in layout:
+                        raise KeyError(key if instr in self.data_live else instr)
+                # the values, followed by the arrival times
+                resolved.update(
+                    layout=layout,
+                    take=itemgetter(
+                        *[layout[pair] for pair in pairs],
+                        *[layout[i, "timeseconds"] for i in instruments],
+                    ),
+                )
+            taken = resolved["take"](snapshot)
+            if any(value is _EMPTY for value in taken):
+                raise IndexError("no data yet")
+            return list(taken[: len(pairs)]), min(taken[len(pairs) :])
+
+        def answer():
+            published = self.snapshot_positions
+            try:
+                if live and published is not None:
+                    values, arrival = values_snapshot(published)
+                elif live:
+                    with self.dataLock_live:
+                        values, arrival = values_live()
+                else:
+                    with self.dataLock:
+                        values, arrival = values_stored()
+            except KeyError as e:
+                resolved["of"] = None
+                return dict(
+                    ERROR="KeyError",
+                    ERROR_message=e.args[0],
+                    info="the data you prepared is not present in the data",
+                    retry=False,
+                )
+            except IndexError as e:
+                return dict(
+                    ERROR="IndexError",
+                    ERROR_message=e.args[0],
+                    info="It seems there is no data in the live-list for your request,",
+                    uptodate=False,
+                    timediff=np.inf,
+                    retry=True,
+                )
+            arrival = float(arrival)
+            timediff = time.time() - arrival
+            return dict(
+                data=values,
+                uptodate=timediff < 3,
+                timediff=timediff,
+                timeseconds=arrival,
+            )
+
+        return answer
 
     def get_answer(self, qdict):
         self._logger.debug(f"getting answer for {qdict}")
@@ -1016,6 +1674,9 @@ class live_zmqDataStoreLogger(live_Logger_bare, AbstractLoopThreadDataStore):
                     return value[-1]
 
                 datadict = self.data_live
+                if self.snapshot_live is not None:
+                    # published, thus never changed anymore
+                    locked, datadict = nullcontext(), self.snapshot_live
             else:
                 locked = self.dataLock
 
@@ -1044,12 +1705,18 @@ class live_zmqDataStoreLogger(live_Logger_bare, AbstractLoopThreadDataStore):
                         timediffs.append(tdiff)
                     timediff = np.max(timediffs)
                     uptodate = True if timediff < 3 else False
+                    # arrival of the oldest sample among the answered ones
+                    timeseconds = min(
+                        taking(datadict[indicator["instr"]]["timeseconds"])
+                        for indicator in qdict["multiple"].values()
+                    )
                 else:
                     data = taking(datadict[qdict["instr"]][qdict["value"]])
                     uptodate, timediff = calculate_timediff(
                         datadict[qdict["instr"]]["realtime"],
                         allowed_delay_s=allowed_delay_s,
                     )
+                    timeseconds = taking(datadict[qdict["instr"]]["timeseconds"])
                     # calculate_timediff will take last of a list by itself, if it is passed a list
 
         except KeyError as e:
@@ -1075,6 +1742,7 @@ class live_zmqDataStoreLogger(live_Logger_bare, AbstractLoopThreadDataStore):
         adict["data"] = data
         adict["uptodate"] = uptodate
         adict["timediff"] = timediff
+        adict["timeseconds"] = timeseconds
         self._logger.debug(f"answer: {adict}")
         return adict
 
@@ -1137,7 +1805,13 @@ class LoggingGUI(AbstractMainApp, Window_trayService_ui):
         self.dataLock_live = Lock()
         # logger_live =
         self.running_thread_control(
-            live_zmqDataStoreLogger(mainthread=self), "zmq_liveLogger"
+            live_zmqDataStoreLogger(
+                mainthread=self,
+                pipeline=True,
+                checkpoint_file="./../configurations/live_checkpoint.npz",
+                backfill_db=self.conf.get("logfile_location") or None,
+            ),
+            "zmq_liveLogger",
         )
         # ----------------------------------------------------------------------
 
@@ -1234,11 +1908,18 @@ class Logger_measurement_configuration(Window_ui):
 
 
 class measurement_Logger(AbstractEventhandlingThread):
-    """This is the datasaving thread"""
+    """This is the datasaving thread
+
+    the datafile stays open between data points, and is flushed
+    according to flush_interval (seconds, 0: after every point) and fsync
+    """
 
     # sig_configuring = pyqtSignal(bool)
     sig_log = pyqtSignal()
 
+    flush_interval = 0.0
+    fsync = False
+
     def __init__(self, mainthread, **kwargs):
         super().__init__(**kwargs)
         self._logger = logging.getLogger(
@@ -1248,10 +1929,11 @@ class measurement_Logger(AbstractEventhandlingThread):
         self.mainthread.sig_log_measurement.connect(self.store_data)
 
         self.starttime = time.time()
+        self.datafile = None
 
         # self.mainthread.sig_log_measurement_newconf.connect(self.update_conf)
 
-        # QTimer.singleShot(5e2, lambda: self.sig_configuring.emit(True))
+        # QTimer.singleShot(500, lambda: self.sig_configuring.emit(True))
 
     def update_conf(self, conf):
         """
@@ -1260,84 +1942,50 @@ class measurement_Logger(AbstractEventhandlingThread):
         """
         self.conf = conf
 
-    @pyqtSlot(dict)
-    def store_data(self, data):
-        """storing logging data
-        what data should be logged is set in self.conf
-        or will be set there eventually at any rate
-        """
-        # if isinstance(data, dict):
+    def open_datafile(self, data):
+        """the writer for the datafile of data, (re)opened if it changed"""
+        if self.datafile is not None and self.datafile.path == data["datafile"]:
+            return self.datafile
+        self.close_datafile()
         if data["type"] == "multichannel":
-
-            datastring = ""
-            temperatures = [
-                "{{{mean}:.5E}} {{{std}:.5E}} ".format(mean=mean, std=std)
-                for mean, std in zip(data["T_mean_K"], data["T_std_K"])
-            ]
-            for t in temperatures:
-                datastring += t
-            datastring = datastring.format(**data["T_mean_K"], **data["T_std_K"])
-
-            for instrument in data["resistances"]:
-                res_instr = [
-                    "{{{name}:.10E}} ".format(name=key)
-                    for key in data["resistances"][instrument]
-                ]
-                for r in res_instr:
-                    datastring += r
-                datastring = datastring.format(**data["resistances"][instrument])
-
-            for instrument in data["voltages"]:
-                voltages = [
-                    "{{{num}:.5E}} ".format(num=ct)
-                    for ct, value in enumerate(data["voltages"][instrument])
-                ]
-                datastring += "{} ".format(len(voltages))
-                for v in voltages:
-                    datastring += v
-                datastring = datastring.format(*data["voltages"][instrument])
-
-            for instrument in data["currents"]:
-                currents = [
-                    "{{{num}:.5E}} ".format(num=ct)
-                    for ct, value in enumerate(data["currents"][instrument])
-                ]
-                datastring += "{} ".format(len(currents))
-                for v in currents:
-                    datastring += v
-                datastring = datastring.format(*data["currents"][instrument])
-
-            datastring = "\n{ReadableTime} ".format(**data) + datastring
-            # print(datastring)
-
             headerstring = HEADERSTRING.format(date=convert_time(self.starttime))
-
         else:
-            datastring = "\n {T_mean_K:.3E} {T_std_K:.3E} {R_mean_Ohm:.14E} {R_std_Ohm:.14E} {timeseconds} {ReadableTime}".format(
-                **data
-            )
             headerstring = str(
                 "# Measurement started on {date} \n".format(
                     date=convert_time(self.starttime)
                 )
                 + "# temp_sample [K], T_std [K], resistance [Ohm], R_std [Ohm], time [s], date \n"
             )
+        self.datafile = MeasurementRowWriter(
+            data["datafile"],
+            header=headerstring,
+            flush_interval=self.flush_interval,
+            fsync=self.fsync,
+        )
+        return self.datafile
 
-        if os.path.isfile(data["datafile"]):
+    def close_datafile(self):
+        """close the current datafile, writing what is buffered"""
+        if self.datafile is not None:
             try:
-                with open(data["datafile"], "a") as f:
-                    f.write(datastring)
+                self.datafile.close()
             except IOError as err:
-                self.sig_assertion.emit("DataSaver: " + err.args[0])
-                self._logger.exception(err)
-        else:
-            try:
-                with open(data["datafile"], "w") as f:
-                    f.write(headerstring)
-                    f.write(datastring)
-            except IOError as err:
-                self.sig_assertion.emit("DataSaver: " + err.args[0])
+                self.sig_assertion.emit("DataSaver: " + str(err))
                 self._logger.exception(err)
+            self.datafile = None
+
+    @pyqtSlot(dict)
+    def store_data(self, data):
+        """storing logging data
+        what data should be logged is set in self.conf
+        or will be set there eventually at any rate
+        """
+        try:
+            self.open_datafile(data).write_point(data)
+        except IOError as err:
+            self.sig_assertion.emit("DataSaver: " + str(err))
+            self._logger.exception(err)
+            self.close_datafile()
 
         # try:
         #     with open(data['datafile'][:-3]+'csv', 'a') as f:
@@ -0,0 +1,236 @@
+"""Module containing a replay of recorded cooldown databases into the
+zmq upstream, for load tests and profiling without hardware
+
+Every row of an instrument table is published on the upstream (through
+the broker, like a ControlClient does) under the identity of its table,
+e.g. 'LakeShore350', with the logged values. The rows of all tables
+are published in the order of their `timeseconds`, keeping their
+relative timing divided by a speed factor, or as fast as possible.
+
+From the command line (the upstream broker, util/broker.py, must run):
+    python replay.py Logs/cooldown.db --speed 60
+    python replay.py Logs/cooldown.db --speed 0 --instruments LakeShore350 ITC
+
+Classes:
+    CooldownReplay: publishes the rows of one cooldown database
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import heapq
+import sqlite3
+import logging
+import argparse
+from threading import Event
+from datetime import datetime as dt
+
+import zmq
+
+from util.zmqcomms import zmq_handshake
+from util.zmqcodecs import get_codec
+from util.zmqcodecs import encode_message
+
+from loggingFunctionality.dbquery import _quote
+from loggingFunctionality.dbquery import instrument_tables
+
+
+class CooldownReplay:
+    """publishes the rows of one cooldown database on the upstream
+
+    speed: factor by which the recorded timing is sped up,
+        0 (or None) publishes as fast as possible
+    instruments: names of the tables to replay, default: all
+    t0, t1: range of `timeseconds` to replay, default: all
+    report_interval: seconds between reports of the achieved rates,
+        which are logged, and handed to on_report(stats)
+
+    Every message is the row (without id and timeseconds, NULL as None)
+    as data dict, with 'realtime' set to the time of sending and
+    'noblock' False, as a ControlClient sends it. The tables are read
+    in chunks of chunk rows, so the memory needed is bounded.
+    """
+
+    def __init__(
+        self,
+        dbname,
+        speed=1.0,
+        instruments=None,
+        t0=None,
+        t1=None,
+        context=None,
+        ip_data="127.0.0.1",
+        port_upstream=5560,
+        port_handshake_upstream=5559,
+        handshake_timeout=10,
+        codec="json",
+        chunk=10000,
+        report_interval=5.0,
+        on_report=None,
+    ):
+        super().__init__()
+        self._logger = logging.getLogger(
+            "CryoGUI." + __name__ + "." + self.__class__.__name__
+        )
+        self.dbname = dbname
+        self.speed = speed
+        self.t0 = t0
+        self.t1 = t1
+        self.codec = get_codec(codec)
+        self.chunk = chunk
+        self.report_interval = report_interval
+        self.on_report = on_report
+        self._stop = Event()
+
+        self.conn = sqlite3.connect(f"file:{dbname}?mode=ro", uri=True)
+        tables = instrument_tables(self.conn.cursor())
+        self.instruments = [
+            table
+            for table in (tables if instruments is None else instruments)
+            if table in tables
+            and "timeseconds" in self._columns(table)
+        ]
+
+        self._zctx = context or zmq.Context()
+        self.comms_upstream = self._zctx.socket(zmq.PUB)
+        self.comms_upstream.connect(f"tcp://{ip_data}:{port_upstream}")
+        zmq_handshake(
+            self.comms_upstream,
+            f"tcp://{ip_data}:{port_handshake_upstream}",
+            timeout=handshake_timeout,
+        )
+
+    def _columns(self, table):
+        return [
+            row[1] for row in self.conn.execute(f"PRAGMA table_info({_quote(table)})")
+        ]
+
+    def rows(self, table):
+        """yield (timeseconds, table, data) of table, in chunks"""
+        columns = [c for c in self._columns(table) if c not in ("id", "timeseconds")]
+        sql = "SELECT id, timeseconds{} FROM {} WHERE id > ?".format(
+            "".join("," + _quote(c) for c in columns), _quote(table)
+        )
+        params = []
+        if self.t0 is not None:
+            sql += " AND timeseconds >= ?"
+            params.append(self.t0)
+        if self.t1 is not None:
+            sql += " AND timeseconds <= ?"
+            params.append(self.t1)
+        sql += " ORDER BY id LIMIT ?"
+        last_id = 0
+        while True:
+            rows = self.conn.execute(sql, [last_id] + params + [self.chunk]).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            for row in rows:
+                if row[1] is not None:
+                    yield row[1], table, dict(zip(columns, row[2:]))
+
+    def stop(self):
+        """stop the replay (from another thread)"""
+        self._stop.set()
+
+    def close(self):
+        self.comms_upstream.close(linger=1000)
+        self.conn.close()
+
+    def run(self):
+        """publish all rows, returns the stats of the whole replay"""
+        stream = heapq.merge(
+            *(self.rows(table) for table in self.instruments), key=lambda r: r[0]
+        )
+        counts = dict.fromkeys(self.instruments, 0)
+        start = last_report = time.monotonic()
+        reported = dict(counts)
+        first = lag = None
+        for timeseconds, table, data in stream:
+            if self._stop.is_set():
+                break
+            if first is None:
+                first = timeseconds
+            if self.speed:
+                lag = time.monotonic() - start - (timeseconds - first) / self.speed
+                if lag < 0 and self._stop.wait(-lag):
+                    break
+            data["noblock"] = False
+            data["realtime"] = dt.now()
+            self.comms_upstream.send_multipart(
+                [table.encode("ascii"), encode_message(data, self.codec)]
+            )
+            counts[table] += 1
+
+            now = time.monotonic()
+            if now - last_report >= self.report_interval:
+                self.report(counts, reported, now - last_report, now - start, lag)
+                reported, last_report = dict(counts), now
+        now = time.monotonic()
+        return self.report(counts, reported, now - last_report, now - start, lag)
+
+    def report(self, counts, reported, interval, elapsed, lag):
+        """log and hand out the achieved message rates"""
+        stats = dict(
+            messages=sum(counts.values()),
+            elapsed_s=elapsed,
+            rate=(sum(counts.values()) - sum(reported.values())) / max(interval, 1e-9),
+            mean_rate=sum(counts.values()) / max(elapsed, 1e-9),
+            rates={
+                table: (counts[table] - reported[table]) / max(interval, 1e-9)
+                for table in counts
+            },
+            lag_s=max(lag, 0) if lag is not None else None,
+        )
+        self._logger.info(
+            "replayed %d messages in %.1f s, now %.0f/s (mean %.0f/s)%s",
+            stats["messages"],
+            elapsed,
+            stats["rate"],
+            stats["mean_rate"],
+            ""
+            if stats["lag_s"] is None
+            else ", {:.3f} s behind schedule".format(stats["lag_s"]),
+        )
+        if self.on_report is not None:
+            self.on_report(stats)
+        return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(
+        description="replay a cooldown database into the zmq upstream"
+    )
+    parser.add_argument("dbname")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="speed-up factor, 0: no waiting"
+    )
+    parser.add_argument("--instruments", nargs="*", default=None)
+    parser.add_argument("--t0", type=float, default=None)
+    parser.add_argument("--t1", type=float, default=None)
+    parser.add_argument("--codec", default="json")
+    parser.add_argument("--ip-data", default="127.0.0.1")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    replay = CooldownReplay(
+        args.dbname,
+        speed=args.speed,
+        instruments=args.instruments,
+        t0=args.t0,
+        t1=args.t1,
+        ip_data=args.ip_data,
+        codec=args.codec,
+        report_interval=args.report_interval,
+    )
+    try:
+        replay.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replay.close()
@@ -0,0 +1,159 @@
+"""Module containing a durable spool for data packages, kept on disk
+while the database cannot be written to
+Classes:
+    Spool: append-only file of length-prefixed records
+"""
+import os
+import zlib
+import struct
+import pickle
+import logging
+from threading import Lock
+
+# per record: length and crc32 of the payload
+HEADER = struct.Struct("<II")
+
+
+class Spool:
+    """append-only file of data packages
+
+    Every record is the header (length and crc32 of the payload,
+    little-endian) followed by the pickled data package. Records are
+    written to disk one by one, so nothing is kept in memory however long
+    the database stays unreachable. A record which was only partly written
+    when the process died is cut off when the spool is opened again.
+
+    The records are replayed in batches with replay(). How far the replay
+    got is kept in the file <path>.pos, so an interrupted replay continues
+    where it stopped (the batch which was being stored may be replayed
+    again). Once everything is replayed, the spool file is emptied.
+
+    The file is only read by the logger which wrote it, so pickle is fine,
+    and keeps datetime objects as they are.
+    """
+
+    def __init__(self, path, fsync=False):
+        self._logger = logging.getLogger(
+            "CryoGUI." + __name__ + "." + self.__class__.__name__
+        )
+        self.path = path
+        self.fsync = fsync
+        self._lock = Lock()
+        self._file = None
+        self._repair()
+
+    def _records(self, handle):
+        """yield (package, position after it) from the current position,
+        until the end or a broken record"""
+        while True:
+            header = handle.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            length, crc = HEADER.unpack(header)
+            payload = handle.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            yield pickle.loads(payload), handle.tell()
+
+    def _repair(self):
+        """cut off a partly written record at the end of the file"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as handle:
+            handle.seek(self.position())
+            end = handle.tell()
+            for _, end in self._records(handle):
+                pass
+        if end < os.path.getsize(self.path):
+            self._logger.warning(
+                "spool %s: dropping %d bytes of a broken record at the end",
+                self.path,
+                os.path.getsize(self.path) - end,
+            )
+            with open(self.path, "r+b") as handle:
+                handle.truncate(end)
+
+    def append(self, data):
+        """write one data package to the end of the spool"""
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "ab")
+            self._file.write(HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def size(self):
+        """size of the spool file in bytes"""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def position(self):
+        """position up to which the spool was replayed"""
+        try:
+            with open(self.path + ".pos") as handle:
+                return int(handle.read())
+        except (OSError, ValueError):
+            return 0
+
+    def pending(self):
+        """number of bytes which still need to be replayed"""
+        return self.size() - self.position()
+
+    def _commit(self, position):
+        """store the replay position, returns whether the spool was emptied"""
+        with self._lock:
+            emptied = position >= self.size()
+            if emptied:
+                # everything is replayed, start afresh
+                # (truncated, as the file may still be open elsewhere)
+                with open(self.path, "r+b") as handle:
+                    handle.truncate(0)
+                position = 0
+            with open(self.path + ".tmp", "w") as handle:
+                handle.write(str(position))
+            os.replace(self.path + ".tmp", self.path + ".pos")
+        return emptied
+
+    def replay(self, store, batch_size=500, progress=None):
+        """hand the spooled packages to store(packages), in batches
+
+        the replay position is advanced after every batch which store
+        returned from, exceptions of store end the replay
+
+        progress: called with (bytes replayed, bytes in total,
+            packages replayed) after every batch
+        returns: the number of packages replayed
+        """
+        if not os.path.exists(self.path):
+            return 0
+        replayed = 0
+        total = self.size()
+        with open(self.path, "rb") as handle:
+            handle.seek(self.position())
+            batch = []
+            for package, position in self._records(handle):
+                batch.append(package)
+                if len(batch) < batch_size and handle.tell() < total:
+                    continue
+                store(batch)
+                replayed += len(batch)
+                batch = []
+                emptied = self._commit(position)
+                total = max(total, self.size())
+                if progress is not None:
+                    progress(position, total, replayed)
+                if emptied:
+                    # appended records go to the start of the file now
+                    return replayed
+            if batch:
+                # the file ended in a record which is still being written
+                store(batch)
+                replayed += len(batch)
+                self._commit(position)
+                if progress is not None:
+                    progress(position, total, replayed)
+        return replayed
@@ -40,6 +40,8 @@ from abc import abstractproperty
 
 from datetime import datetime as dt
 
+from loggingFunctionality.sqlWriter import SQLiteWriter
+
 # identity = lambda x: x
 
 
@@ -271,53 +273,120 @@ class SQLiteHandler(logging.Handler):
     Logging handler for SQLite.
     Based on Vinay Sajip's DBHandler class
     (http://www.red-dove.com/python_logging.html)
-    This version sacrifices performance for thread-safety:
-    Instead of using a persistent cursor, we open/close connections for each
-    entry.
-    AFAIK this is necessary in multi-threaded applications,
-    because SQLite doesn't allow access to objects across threads.
+
+    emit() only formats the record and queues its row, which never blocks
+    with policy 'drop' (records are dropped and counted when the queue is
+    full), and blocks until there is space with policy 'block'.
+    An SQLiteWriter thread stores the queued rows with executemany, in
+    grouped commits over one persistent connection in WAL mode, so neither
+    a connection per record nor the cross-process lock table are needed.
+    close() (also called by logging.shutdown() at exit) stores everything
+    which is still queued.
+
+    Records of the writer thread itself below WARNING (e.g. its debug
+    message about every commit) are not stored, as each would cause
+    another commit.
     """
 
-    def __init__(self, db=SQLBase.db):
+    def __init__(
+        self,
+        db=SQLBase.db,
+        maxsize=10000,
+        policy="drop",
+        commit_interval=0.5,
+        commit_size=500,
+    ):
 
         logging.Handler.__init__(self)
         self.db = db
         # Create table if needed:
         SQLiteRecord.init_table(db)
         # HttpSession.init_table(db)
+        self.sql_insert = SQLiteRecord.sql_insert.replace(
+            "INSERT INTO", "INSERT OR IGNORE INTO", 1
+        )
+        self.writer = SQLiteWriter(
+            db,
+            self._store,
+            maxsize=maxsize,
+            commit_interval=commit_interval,
+            commit_size=commit_size,
+            policy=policy,
+            name="SQLiteHandler_writer",
+        )
+        self.writer.start()
+
+    def _store(self, cursor, rows):
+        """store rows, called by the writer thread"""
+        cursor.executemany(self.sql_insert, rows)
+        if cursor.rowcount < len(rows):
+            # the same Created (asctime) as an earlier entry
+            logging.getLogger(
+                "CryoGUI." + __name__ + "." + self.__class__.__name__
+            ).warning(
+                "%d log entries did not seem unique, not stored",
+                len(rows) - cursor.rowcount,
+            )
+
+    def handle(self, record):
+        """emit without taking the handler's lock, which the queue does not
+        need -- logging.shutdown() holds it while close() waits for the
+        writer thread, which might be logging itself"""
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
 
     def emit(self, record):
-        # Use default formatting:
-        if record.exc_info:
-            record.exc_text = logging._defaultFormatter.formatException(record.exc_info)
-        else:
-            record.exc_text = ""
-        self.format(record)
+        if record.levelno < logging.WARNING and record.thread == self.writer.ident:
+            return
         try:
-            record.asctime
-        except AttributeError:
-            # record.asctime = record.created
-            record.asctime = dt.fromtimestamp(record.created).strftime(
-                "%Y-%m-%d %H:%M:%S.%f"
+            # Use default formatting:
+            if record.exc_info:
+                record.exc_text = logging._defaultFormatter.formatException(
+                    record.exc_info
+                )
+            else:
+                record.exc_text = ""
+            self.format(record)
+            try:
+                record.asctime
+            except AttributeError:
+                # record.asctime = record.created
+                record.asctime = dt.fromtimestamp(record.created).strftime(
+                    "%Y-%m-%d %H:%M:%S.%f"
+                )
+
+            # Queue the row of the log record:
+            self.writer.put(
+                SQLiteRecord(
+                    record.asctime,
+                    # record.asctime,
+                    # record.created,
+                    record.name,
+                    # record.args['request']['hostname'],
+                    # record.args['request']['port'],
+                    record.levelno,
+                    record.levelname,
+                    record.message,
+                    record.args,
+                    record.module,
+                    record.funcName,
+                    record.lineno,
+                    record.exc_text,
+                    record.process,
+                    record.thread,
+                    record.threadName,
+                ).as_row
             )
+        except Exception:
+            self.handleError(record)
+
+    def stats(self):
+        """queue depth, dropped records and commit latencies of the writer"""
+        return self.writer.stats()
 
-        # Insert log record:
-        SQLiteRecord(
-            record.asctime,
-            # record.asctime,
-            # record.created,
-            record.name,
-            # record.args['request']['hostname'],
-            # record.args['request']['port'],
-            record.levelno,
-            record.levelname,
-            record.message,
-            record.args,
-            record.module,
-            record.funcName,
-            record.lineno,
-            record.exc_text,
-            record.process,
-            record.thread,
-            record.threadName,
-        ).insert(self.db)
+    def close(self):
+        """store all queued records, then close"""
+        self.writer.close()
+        logging.Handler.close(self)
@@ -0,0 +1,231 @@
+"""Module containing a background writer for sqlite databases
+
+Classes:
+    SQLiteWriter: thread owning one long-lived connection (in WAL mode),
+        storing the items of a bounded queue in grouped commits
+"""
+import time
+import queue
+import sqlite3
+import logging
+from threading import Thread
+from threading import Event
+from threading import Lock
+
+
+class SQLiteWriter(Thread):
+    """writer thread for one sqlite database
+
+    Items are handed over with put() from any thread. The thread collects
+    them into groups, and stores every group with one call to
+    store(cursor, items) in one transaction. A group is committed once
+    it holds commit_size items, or commit_interval seconds after its
+    first item arrived.
+
+    The database is switched to WAL mode, so processes reading from it
+    (e.g. plotting scripts) neither block the writer nor are blocked by it.
+    If a commit fails (e.g. the database is locked for too long, or not
+    reachable), the group is kept and retried every retry_interval, taking
+    in new items only up to commit_size. Once the queue is full, put()
+    blocks (policy 'block') or drops the item (policy 'drop'). If store()
+    fails with any other error (e.g. on a malformed item), retrying would
+    not help, the group is dropped and counted in 'dropped'.
+
+    stats() reports the queue depth and the commit latencies, which are
+    also handed to on_commit(stats) after every commit.
+    """
+
+    def __init__(
+        self,
+        dbname,
+        store,
+        maxsize=10000,
+        commit_interval=1.0,
+        commit_size=500,
+        policy="block",
+        retry_interval=1.0,
+        timeout=20,
+        on_commit=None,
+        on_error=None,
+        **kwargs,
+    ):
+        super().__init__(daemon=True, **kwargs)
+        self._logger = logging.getLogger(
+            "CryoGUI." + __name__ + "." + self.__class__.__name__
+        )
+        if policy not in ("block", "drop"):
+            raise ValueError(f"policy must be 'block' or 'drop', not {policy!r}")
+        self.dbname = dbname
+        self.store = store
+        self.commit_interval = commit_interval
+        self.commit_size = commit_size
+        self.policy = policy
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.on_commit = on_commit
+        self.on_error = on_error
+
+        self._queue = queue.Queue(maxsize)
+        self._stopped = Event()
+        self._failing = False
+        self._stats_lock = Lock()
+        self._stats = dict(
+            commits=0,
+            items=0,
+            dropped=0,
+            errors=0,
+            last_commit_latency_s=0.0,
+            max_commit_latency_s=0.0,
+            total_commit_latency_s=0.0,
+        )
+
+    def put(self, item, timeout=None):
+        """hand an item over to be stored
+        returns: whether the item was queued (False if it was dropped)
+        """
+        if self._stopped.is_set():
+            raise RuntimeError("the writer is closed")
+        try:
+            if self.policy == "block":
+                self._queue.put(item, timeout=timeout)
+            else:
+                self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["dropped"] += 1
+            return False
+
+    def stats(self):
+        """queue depth, number of commits and items, commit latencies"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["mean_commit_latency_s"] = stats.pop("total_commit_latency_s") / max(
+            stats["commits"], 1
+        )
+        return stats
+
+    def close(self, timeout=None):
+        """store everything which is queued, then close the connection"""
+        self._stopped.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.dbname, timeout=self.timeout)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # in WAL mode, this keeps the database consistent,
+        # without an fsync for every commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _collect(self, group):
+        """take items from the queue until the group is due for a commit"""
+        first = time.monotonic() if group else None
+        while len(group) < self.commit_size:
+            if self._stopped.is_set():
+                timeout = 0  # closing: take what is there, do not wait
+            elif first is None:
+                timeout = 0.1  # wake up regularly, to notice close()
+            else:
+                timeout = first + self.commit_interval - time.monotonic()
+                if timeout <= 0:
+                    return
+            try:
+                group.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                if self._stopped.is_set():
+                    return
+                continue
+            if first is None:
+                first = time.monotonic()
+
+    def _commit(self, conn, group):
+        start = time.perf_counter()
+        with conn:
+            self.store(conn.cursor(), group)
+        latency = time.perf_counter() - start
+        self._failing = False
+        with self._stats_lock:
+            self._stats["commits"] += 1
+            self._stats["items"] += len(group)
+            self._stats["last_commit_latency_s"] = latency
+            self._stats["max_commit_latency_s"] = max(
+                self._stats["max_commit_latency_s"], latency
+            )
+            self._stats["total_commit_latency_s"] += latency
+        self._logger.debug(
+            "committed %d items in %.1f ms, %d queued",
+            len(group),
+            latency * 1e3,
+            self._queue.qsize(),
+        )
+        if self.on_commit is not None:
+            try:
+                self.on_commit(self.stats())
+            except Exception as err:
+                # the group is stored, whatever happens here
+                self._logger.exception(err)
+
+    def _failed(self, err):
+        with self._stats_lock:
+            self._stats["errors"] += 1
+        if self._failing:
+            self._logger.warning("still failing to store: %s", err)
+        else:
+            self._logger.exception(err)
+        self._failing = True
+        if self.on_error is not None:
+            self.on_error(err)
+
+    def _dropped(self, err, group):
+        self._failed(err)
+        self._logger.error("dropped %d items which could not be stored", len(group))
+        with self._stats_lock:
+            self._stats["dropped"] += len(group)
+
+    def run(self):
+        conn = None
+        group = []
+        try:
+            while True:
+                self._collect(group)
+                if not group:
+                    if self._stopped.is_set() and self._queue.empty():
+                        break
+                    continue
+                try:
+                    if conn is None:
+                        conn = self._connect()
+                    self._commit(conn, group)
+                    group = []
+                except sqlite3.Error as err:
+                    self._failed(err)
+                    if self._stopped.wait(self.retry_interval):
+                        # closing: one more try, without waiting
+                        try:
+                            if conn is None:
+                                conn = self._connect()
+                            self._commit(conn, group)
+                            group = []
+                        except sqlite3.Error as err:
+                            self._failed(err)
+                            break
+                        except Exception as err:
+                            self._dropped(err, group)
+                            group = []
+                except Exception as err:
+                    # not the database, but the items: drop them, so that
+                    # the thread goes on and put() does not block forever
+                    self._dropped(err, group)
+                    group = []
+        finally:
+            if group or not self._queue.empty():
+                self._logger.error(
+                    "writer for %s closed, %d items were not stored",
+                    self.dbname,
+                    len(group) + self._queue.qsize(),
+                )
+            if conn is not None:
+                conn.close()
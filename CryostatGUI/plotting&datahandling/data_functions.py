@@ -1,44 +1,60 @@
-import sqlite3
+import sys
+import os
 import pandas as pd
 import numpy as np
 
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "loggingFunctionality",
+    )
+)
+from dbquery import CooldownDB
 
-def create_connection(db_file):
-    """create a database connection to the SQLite database
-        specified by the db_file
-    :param db_file: database file
-    :return: Connection object or None
-    """
-    conn = None
-    # try:
-    conn = sqlite3.connect(db_file)
-    # except Error as e:
-    #     print(e)
-
-    return conn
-
-
-def conf(datafile):
-    conn = create_connection(datafile)
 
-    with conn:
-        cur = conn.cursor()
-        cur.execute("SELECT SampleResistance_Ohm from SR830")
-        res = np.array(cur.fetchall())[:, 0]
-        cur.execute("SELECT timeseconds from SR830")
-        times1 = np.array(cur.fetchall())[:, 0]
+def conf(datafile, max_points=None):
+    """read sample resistance and temperature of a whole cooldown
 
-        cur.execute("SELECT Sensor_1_K from LakeShore350")
-        temps = np.array(cur.fetchall())[:, 0]
-        cur.execute("SELECT timeseconds from LakeShore350")
-        times2 = np.array(cur.fetchall())[:, 0]
+    max_points: if given, both are reduced to the means over max_points
+        time bins (spanning both), which line up. Both times are then the
+        centres of the bins, so that the pairs of values match up, and
+        bins without data are NaN
+    """
+    with CooldownDB(datafile) as db:
+        t0 = t1 = None
+        if max_points is not None:
+            ranges = [db.time_range("SR830"), db.time_range("LakeShore350")]
+            t0 = min(r[0] for r in ranges)
+            t1 = max(r[1] for r in ranges)
+        res = db.read("SR830", ["SampleResistance_Ohm"], t0, t1, max_points)
+        temps = db.read("LakeShore350", ["Sensor_1_K"], t0, t1, max_points)
+
+    if max_points is not None:
+        edges = np.linspace(t0, t1, max_points + 1)
+        res["timeseconds"] = temps["timeseconds"] = (edges[:-1] + edges[1:]) / 2
 
     df = pd.DataFrame(
         dict(
-            times_temps=times2,
-            temps=temps,
-            times_res=times1,
-            res=res,
+            times_temps=temps["timeseconds"],
+            temps=temps["Sensor_1_K"],
+            times_res=res["timeseconds"],
+            res=res["SampleResistance_Ohm"],
         )
     )
     return df
+
+
+def latest(datafile):
+    """read the newest sample resistance and temperature of a cooldown
+
+    return: dict for appending to the DataFrame of conf()
+    """
+    with CooldownDB(datafile) as db:
+        res = db.latest("SR830", ["SampleResistance_Ohm"])
+        temps = db.latest("LakeShore350", ["Sensor_1_K"])
+    return dict(
+        times_res=res["timeseconds"],
+        res=res["SampleResistance_Ohm"],
+        times_temps=temps["timeseconds"],
+        temps=temps["Sensor_1_K"],
+    )
@@ -1,4 +1,3 @@
-import sqlite3
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 
@@ -6,6 +5,8 @@ import matplotlib.animation as animation
 import pandas as pd
 import numpy as np
 
+from data_functions import conf
+from data_functions import latest
 
 filebase = "./../Logs/"
 data_static = [
@@ -42,40 +43,6 @@ ax1.set_xlabel("Temperature K")  # overwrite the x-label added by `psd`
 plt.legend()
 
 
-def create_connection(db_file):
-    """create a database connection to the SQLite database
-        specified by the db_file
-    :param db_file: database file
-    :return: Connection object or None
-    """
-    conn = None
-    # try:
-    conn = sqlite3.connect(db_file)
-    # except Error as e:
-    #     print(e)
-
-    return conn
-
-
-def conf(datafile):
-    conn = create_connection(datafile)
-
-    with conn:
-        cur = conn.cursor()
-        cur.execute("SELECT SampleResistance_Ohm from SR830")
-        res = np.array(cur.fetchall())[:, 0]
-        cur.execute("SELECT timeseconds from SR830")
-        times1 = np.array(cur.fetchall())[:, 0]
-
-        cur.execute("SELECT Sensor_1_K from LakeShore350")
-        temps = np.array(cur.fetchall())[:, 0]
-        cur.execute("SELECT timeseconds from LakeShore350")
-        times2 = np.array(cur.fetchall())[:, 0]
-
-    df = pd.DataFrame(dict(times_res=times1, res=res, times_temps=times2, temps=temps))
-    return df
-
-
 def plotting(_unused_i, first=False):
     global data_static
     global data_dyn
@@ -83,31 +50,14 @@ def plotting(_unused_i, first=False):
     for dyn in data_dyn:
         df = dyn["df"]
 
-        conn = create_connection(dyn["filename"])
-
-        with conn:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT SampleResistance_Ohm from SR830 ORDER BY id DESC LIMIT 1"
-            )
-            res = np.array(cur.fetchall())[:, 0]
-            cur.execute("SELECT timeseconds from SR830 ORDER BY id DESC LIMIT 1")
-            times1 = np.array(cur.fetchall())[:, 0]
-
-            cur.execute("SELECT Sensor_1_K from LakeShore350 ORDER BY id DESC LIMIT 1")
-            temps = np.array(cur.fetchall())[:, 0]
-            cur.execute("SELECT timeseconds from LakeShore350 ORDER BY id DESC LIMIT 1")
-            times2 = np.array(cur.fetchall())[:, 0]
+        new = latest(dyn["filename"])
 
         # arr = np.array([times1, times2]).T
         # print(arr)
 
         # df = pd.DataFrame(dict(times_res=times1, res=res,
         #                        times_temps=times2, temps=temps))
-        df = df.append(
-            dict(times_res=times1, res=res, times_temps=times2, temps=temps),
-            ignore_index=True,
-        )
+        df = df.append(new, ignore_index=True)
         dyn["df"] = df
         plot_res = df.loc[df.times_res - df.times_temps < 1, "res"]
         plot_temp = df.loc[df.times_res - df.times_temps < 1, "temps"]
@@ -131,10 +81,12 @@ def plotting(_unused_i, first=False):
 
 if __name__ == "__main__":
 
+    # one point per pixel of the axes is all that can be shown
+    max_points = int(ax1.bbox.width)
     for static in data_static:
-        static["df"] = conf(static["filename"])
+        static["df"] = conf(static["filename"], max_points=max_points)
     for dyn in data_dyn:
-        dyn["df"] = conf(dyn["filename"])
+        dyn["df"] = conf(dyn["filename"], max_points=max_points)
 
     plotting(0, first=True)
 
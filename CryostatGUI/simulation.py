@@ -0,0 +1,947 @@
+"""Module containing simulated instruments, which stand in for the VISA
+resources of the drivers, so that ControlClients (and benchmarks of the
+whole acquisition stack) run without hardware
+
+An instrument is simulated if its address starts with 'SIM::', followed
+by the name of the model, e.g. 'SIM::LakeShore350::1', or if its address
+was registered with simulate() before the driver is opened, e.g.
+    simulate("GPIB0::1::INSTR", "LakeShore350", seed=1)
+get_rm() in drivers.py then hands out a SimulatedResourceManager, whose
+resources talk to one simulated device per address. The devices keep
+their state when the drivers reconnect.
+
+Every device implements the commands our drivers send, with the replies
+of the real instrument:
+    ITC503:       R<n>, X, $C $T $P $I $D $H $O $G $A $x $y $s $S
+    IPS120:       R<n>, X, $C $A $H $J $T $M
+    ILM211:       R<n>, X, $C $S $T
+    LakeShore350: KRDG? SRDG? SETP(?) RAMP(?) RANGE(?) HTR? PID(?)
+                  OUTMODE(?) HTRSET(?) ... (';' chains several commands)
+    Keithley2182: :READ? :SENS:VOLT:DC:NPLC ... :SYST:ERR?
+    Keithley6221: CURR, SOUR:CURR(:COMP), OUTP:STAT(?), :SYST:ERR? ...
+    SR830:        FREQ(?) SLVL(?) OUTP? OAUX? AUXV ...
+Temperatures relax towards their set points, magnetic fields are swept
+with the set rate, so readings change like on a cryostat.
+
+Every transaction takes the time of the interface (serial: the bytes at
+the baud rate, GPIB, Ethernet), plus the processing time of the device
+for the command, see Latency; readings carry noise, see Noise. Both are
+configurable per device, time_scale scales all waiting (0: no waiting).
+
+Classes:
+    Latency: duration of a transaction
+    Noise: noise of a reading
+    SimulatedDevice: base of all simulated instruments
+    SimulatedResource: stands in for a pyvisa resource
+    SimulatedResourceManager: stands in for a pyvisa ResourceManager
+
+Functions:
+    simulate: simulate the instrument at an address
+    is_simulated: whether an address is simulated
+    device: the simulated device of an address
+"""
+import re
+import math
+import time
+import random
+import logging
+import threading
+from collections import deque
+
+from pyvisa.errors import VisaIOError
+
+logger = logging.getLogger("CryoGUI." + __name__)
+
+PREFIX = "SIM::"
+VI_ERROR_TMO = -1073807339
+
+
+class Latency:
+    """duration of one transaction: base + per_byte * bytes + jitter
+
+    per_byte None uses the baud rate of a serial resource
+    (start bit, data bits and stop bits per byte)
+    """
+
+    def __init__(self, base=0.0, per_byte=0.0, jitter=0.0):
+        super().__init__()
+        self.base = base
+        self.per_byte = per_byte
+        self.jitter = jitter
+
+    def sample(self, rng, nbytes, resource=None):
+        per_byte = self.per_byte
+        if per_byte is None:
+            bits = 1 + getattr(resource, "data_bits", 8) + 2
+            per_byte = bits / getattr(resource, "baud_rate", 9600)
+        duration = self.base + per_byte * nbytes
+        if self.jitter:
+            duration += abs(rng.gauss(0, self.jitter))
+        return duration
+
+
+# interface timings, as measured at our instruments
+INTERFACES = dict(
+    serial=Latency(base=0.002, per_byte=None, jitter=0.001),
+    gpib=Latency(base=0.004, per_byte=1e-6, jitter=0.0005),
+    ethernet=Latency(base=0.003, per_byte=1e-7, jitter=0.0005),
+)
+
+
+class Noise:
+    """noise of a reading: gaussian, with sigma + relative * |value|"""
+
+    def __init__(self, sigma=0.0, relative=0.0):
+        super().__init__()
+        self.sigma = sigma
+        self.relative = relative
+
+    def apply(self, rng, value):
+        sigma = self.sigma + self.relative * abs(value)
+        return value + rng.gauss(0, sigma) if sigma else value
+
+
+class Relaxation:
+    """a value which relaxes exponentially towards its target,
+    which itself can be ramped with a rate (per second, 0: jump)"""
+
+    def __init__(self, value, tau=30.0, rate=0.0):
+        super().__init__()
+        self.value = self.target = self.ramped = value
+        self.tau = tau
+        self.rate = rate
+        self._t = time.monotonic()
+
+    def set(self, target):
+        self.update()
+        self.target = target
+        if not self.rate:
+            self.ramped = target
+
+    def update(self):
+        now = time.monotonic()
+        dt, self._t = now - self._t, now
+        if self.rate:
+            step = self.rate * dt
+            self.ramped += max(-step, min(step, self.target - self.ramped))
+        else:
+            self.ramped = self.target
+        if self.tau:
+            self.value = self.ramped + (self.value - self.ramped) * math.exp(
+                -dt / self.tau
+            )
+        else:
+            self.value = self.ramped
+        return self.value
+
+    @property
+    def ramping(self):
+        self.update()
+        return self.ramped != self.target
+
+
+class SimulatedDevice:
+    """base of all simulated instruments
+
+    seed: seed of the random numbers (noise, jitter), for reproducible runs
+    latency: Latency of the interface, default: by the address
+    processing: dict of command prefix: seconds the device needs to
+        process the command, overriding the defaults of the model
+    noise: Noise of the readings, overriding the default of the model
+    time_scale: factor for all waiting, 0 for none
+
+    handle(command) returns the reply, or None if the command has no
+    reply, and raises KeyError for unknown commands
+    """
+
+    interface = "gpib"
+    default_processing = 0.0
+    processing = {}
+    noise = Noise()
+
+    def __init__(
+        self, seed=None, latency=None, processing=None, noise=None, time_scale=1.0
+    ):
+        super().__init__()
+        self._logger = logging.getLogger(
+            "CryoGUI." + __name__ + "." + self.__class__.__name__
+        )
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.processing = dict(self.processing, **(processing or {}))
+        if noise is not None:
+            self.noise = noise
+        self.time_scale = time_scale
+        self.lock = threading.Lock()
+        self.commands = 0
+
+    def noisy(self, value):
+        return self.noise.apply(self.rng, value)
+
+    def processing_time(self, command):
+        """seconds to process command, the sum over commands chained with ';'"""
+        return sum(
+            self.command_processing_time(part.strip())
+            for part in command.split(";")
+            if part.strip()
+        )
+
+    def command_processing_time(self, command):
+        """seconds to process one command, by the longest matching prefix"""
+        matches = [prefix for prefix in self.processing if command.startswith(prefix)]
+        if not matches:
+            return self.default_processing
+        return self.processing[max(matches, key=len)]
+
+    def transaction(self, command, resource):
+        """handle command, returns (reply, seconds the transaction takes)"""
+        with self.lock:
+            self.commands += 1
+            reply = self.handle(command)
+        latency = self.latency or INTERFACES[resource.interface]
+        nbytes = len(command) + 1 + (len(reply) + 1 if reply is not None else 0)
+        duration = latency.sample(self.rng, nbytes, resource)
+        duration += self.processing_time(command)
+        return reply, duration * self.time_scale
+
+    def handle(self, command):
+        raise NotImplementedError
+
+
+class OxfordDevice(SimulatedDevice):
+    """Oxford Instruments protocol: one letter and a value, echoed in the
+    reply, no reply for commands prefixed by '$', '?<command>' for errors"""
+
+    interface = "serial"
+    default_processing = 0.015
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.control = 0
+
+    def handle(self, command):
+        quiet = command.startswith("$")
+        command = command.lstrip("$")
+        letter, argument = command[:1], command[1:]
+        try:
+            if letter == "R":
+                reply = "R" + self.format_value(int(argument), self.read(int(argument)))
+            elif letter == "X":
+                reply = self.status()
+            elif letter == "V":
+                reply = self.version
+            elif letter == "C":
+                self.control = int(argument)
+                reply = "C"
+            else:
+                self.set(letter, argument)
+                reply = letter
+        except (KeyError, ValueError):
+            reply = "?" + command
+        return None if quiet else reply
+
+    @staticmethod
+    def format_value(variable, value):
+        return "{:.4f}".format(value)
+
+    def read(self, variable):
+        raise KeyError(variable)
+
+    def set(self, letter, argument):
+        raise KeyError(letter)
+
+    def status(self):
+        raise KeyError("X")
+
+
+class ITC503(OxfordDevice):
+    """ITC 503 temperature controller, sensor 1 follows the set point
+    if the heater is in auto"""
+
+    version = "ITC503 Version 1.1 (c) OXFORD 1997"
+    noise = Noise(sigma=0.002)
+
+    def __init__(self, temperature=300.0, tau=60.0, **kwargs):
+        super().__init__(**kwargs)
+        self.setpoint = temperature
+        self.sensor = Relaxation(temperature, tau=tau)
+        self.pid = [10.0, 1.0, 0.0]
+        self.heater_sensor = 1
+        self.heater = 0.0
+        self.gas = 0.0
+        self.auto = 0
+        self.sweep = 0
+        self.sweep_table = {}
+        self.x = self.y = 0
+
+    def read(self, variable):
+        temperature = self.sensor.update()
+        error = self.setpoint - temperature
+        if self.auto & 1:
+            self.heater = min(99.9, max(0.0, self.pid[0] * error))
+        values = {
+            0: self.setpoint,
+            1: self.noisy(temperature),
+            2: self.noisy(temperature * 1.01),
+            3: self.noisy(temperature * 0.99),
+            4: error,
+            5: self.heater,
+            6: self.heater * 0.4,
+            7: self.gas,
+            8: self.pid[0],
+            9: self.pid[1],
+            10: self.pid[2],
+        }
+        return values[variable]
+
+    def set(self, letter, argument):
+        if letter == "T":
+            self.setpoint = float(argument)
+            if self.auto & 1:
+                self.sensor.set(self.setpoint)
+        elif letter in "PID":
+            self.pid["PID".index(letter)] = float(argument)
+        elif letter == "H":
+            self.heater_sensor = int(argument)
+        elif letter == "O":
+            self.heater = int(argument) / 10
+        elif letter == "G":
+            self.gas = int(argument) / 10
+        elif letter == "A":
+            self.auto = int(argument)
+            self.sensor.set(self.setpoint if self.auto & 1 else self.sensor.update())
+        elif letter == "x":
+            self.x = int(argument)
+        elif letter == "y":
+            self.y = int(argument)
+        elif letter == "s":
+            self.sweep_table[(self.x, self.y)] = float(argument)
+        elif letter == "S":
+            self.sweep = int(argument)
+        else:
+            raise KeyError(letter)
+
+    def status(self):
+        return "X0A{}C{}S{:02d}H{}L0".format(
+            self.auto, self.control, self.sweep, self.heater_sensor
+        )
+
+
+class IPS120(OxfordDevice):
+    """IPS 120 magnet power supply, the field is swept to the set point
+    (activity 1) or to zero (activity 2) with the sweep rate"""
+
+    version = "IPS120-10  Version 3.07  (c) OXFORD 1996"
+    tesla_per_ampere = 0.1
+    noise = Noise(sigma=1e-5)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.field = Relaxation(0.0, tau=0.0, rate=0.2 / 60)
+        self.setpoint = 0.0
+        self.activity = 0
+        self.switch_heater = 0
+        self.persistent = 0.0
+        self.display = 9
+
+    def _sweep(self):
+        """hold (0, 4), go to the set point (1) or to zero (2)"""
+        hold = self.field.update()
+        self.field.set({1: self.setpoint, 2: 0.0}.get(self.activity, hold))
+
+    def read(self, variable):
+        self._sweep()
+        field = self.field.update()
+        current = field / self.tesla_per_ampere
+        values = {
+            0: current,
+            1: self.noisy(0.01 * current),
+            2: self.noisy(current),
+            4: current,
+            5: self.setpoint / self.tesla_per_ampere,
+            6: self.field.rate * 60 / self.tesla_per_ampere,
+            7: field,
+            8: self.setpoint,
+            9: self.field.rate * 60,
+            10: 0.5,
+            15: 2.5,
+            16: self.persistent / self.tesla_per_ampere,
+            17: 120.0,
+            18: self.persistent,
+            19: 12.0,
+            21: -120.0,
+            22: 120.0,
+        }
+        return values[variable]
+
+    def set(self, letter, argument):
+        if letter == "A":
+            self.activity = int(argument)
+            self._sweep()
+        elif letter == "H":
+            self.switch_heater = int(argument)
+            if self.switch_heater == 0:
+                self.persistent = self.field.update()
+        elif letter == "J":
+            self.setpoint = float(argument)
+            self._sweep()
+        elif letter == "T":
+            self.field.rate = float(argument) / 60
+        elif letter == "M":
+            self.display = int(argument)
+        else:
+            raise KeyError(letter)
+
+    def status(self):
+        ramping = 1 if self.field.ramping else 0
+        return "X00A{}C{}H{}M{}{}P00".format(
+            self.activity, self.control, self.switch_heater, self.display, ramping
+        )
+
+
+class ILM211(OxfordDevice):
+    """ILM 211 level meter, helium in channel 1, nitrogen in channel 2,
+    the helium level decreases with the boil-off (percent per hour)"""
+
+    version = "ILM200 Version 1.08 (c) OXFORD 1994"
+    noise = Noise(sigma=0.05)
+
+    def __init__(self, helium=80.0, nitrogen=90.0, boiloff=0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.levels = {1: helium, 2: nitrogen, 3: 0.0}
+        self.boiloff = boiloff
+        self.fast = {1: False, 2: False}
+        self._t = time.monotonic()
+
+    @staticmethod
+    def format_value(variable, value):
+        return "{:d}".format(int(round(value)))
+
+    def read(self, variable):
+        now = time.monotonic()
+        self.levels[1] = max(
+            0.0, self.levels[1] - self.boiloff * (now - self._t) / 3600
+        )
+        self._t = now
+        values = {
+            1: self.noisy(self.levels[1]) * 10,
+            2: self.noisy(self.levels[2]) * 10,
+            3: 0.0,
+            6: 120.0,
+            7: 0.0,
+            10: 20.0,
+        }
+        return values[variable]
+
+    def set(self, letter, argument):
+        if letter in "ST":
+            self.fast[int(argument)] = letter == "T"
+        else:
+            raise KeyError(letter)
+
+    def status(self):
+        flags = [(0x04 if self.fast[1] else 0x02), (0x04 if self.fast[2] else 0x02), 0]
+        return "X210S{:02X}{:02X}{:02X}R{:02d}".format(*flags, self.control)
+
+
+class LakeShore350(SimulatedDevice):
+    """LakeShore 350 temperature controller, the input controlled by
+    output 1 follows the set point (ramped), if the heater range is on,
+    the other inputs follow at fixed offsets
+
+    several commands can be chained with ';', their replies are
+    joined with ';'
+    """
+
+    default_processing = 0.001
+    noise = Noise(sigma=0.0005, relative=1e-5)
+    inputs = "ABCD"
+
+    def __init__(self, temperature=300.0, tau=30.0, **kwargs):
+        super().__init__(**kwargs)
+        self.loop = Relaxation(temperature, tau=tau)
+        self.offsets = dict(A=0.0, B=0.05, C=0.5, D=1.0)
+        self.setpoint = {output: temperature for output in range(1, 5)}
+        self.ramp = {output: [0, 0.0] for output in range(1, 5)}
+        self.range = {output: 0 for output in range(1, 5)}
+        self.pid = {output: [50.0, 20.0, 0.0] for output in range(1, 5)}
+        self.outmode = {output: [1, 1, 0] for output in range(1, 5)}
+        self.htrset = {output: [1, 2, 0.0, 1] for output in range(1, 3)}
+        self.mout = {output: 0.0 for output in range(1, 5)}
+        self.other = {}
+
+    def handle(self, command):
+        replies = [self.handle_one(part.strip()) for part in command.split(";")]
+        replies = [reply for reply in replies if reply is not None]
+        return ";".join(replies) if replies else None
+
+    def _temperature(self, name):
+        temperature = self.loop.update()
+        return max(0.0, self.noisy(temperature + self.offsets[name]))
+
+    @staticmethod
+    def _resistance(temperature):
+        """Cernox-like curve"""
+        return 50.0 + 3000.0 / max(temperature, 0.1) ** 0.8
+
+    def _control(self):
+        """set the target of the loop from output 1"""
+        self.loop.rate = self.ramp[1][1] / 60 if self.ramp[1][0] else 0.0
+        if self.range[1] and self.outmode[1][0]:
+            self.loop.set(
+                self.setpoint[1] - self.offsets[self.inputs[self.outmode[1][1] - 1]]
+            )
+        else:
+            self.loop.set(self.loop.update())
+
+    def _inputs(self, argument):
+        argument = argument.strip()
+        return list(self.inputs) if argument == "0" else [argument]
+
+    def handle_one(self, command):
+        header, _, argument = command.partition(" ")
+        args = [arg.strip() for arg in argument.split(",")] if argument else []
+        header = header.upper()
+        if header == "*IDN?":
+            return "LSCI,MODEL350,SIM000,1.0"
+        if header in ("*CLS", "*RST", "*OPC", "MNMXRST", "ALMRST"):
+            return None
+        if header == "KRDG?":
+            return ",".join(
+                "{:+.3f}".format(self._temperature(name))
+                for name in self._inputs(args[0])
+            )
+        if header == "SRDG?":
+            return ",".join(
+                "{:+.3f}".format(self._resistance(self._temperature(name)))
+                for name in self._inputs(args[0])
+            )
+        if header == "SETP?":
+            return "{:+.3f}".format(self.setpoint[int(args[0])])
+        if header == "SETP":
+            self.setpoint[int(args[0])] = float(args[1])
+            self._control()
+            return None
+        if header == "RAMP?":
+            state, rate = self.ramp[int(args[0])]
+            return "{},{:+.3f}".format(state, rate)
+        if header == "RAMP":
+            self.ramp[int(args[0])] = [int(args[1]), float(args[2])]
+            self._control()
+            return None
+        if header == "RAMPST?":
+            return "1" if self.loop.ramping and int(args[0]) == 1 else "0"
+        if header == "RANGE?":
+            return str(self.range[int(args[0])])
+        if header == "RANGE":
+            self.range[int(args[0])] = int(args[1])
+            self._control()
+            return None
+        if header == "HTR?":
+            output = int(args[0])
+            error = self.setpoint[output] - self.loop.update()
+            power = self.pid[output][0] * error if self.range[output] else 0.0
+            return "{:+.2f}".format(min(100.0, max(0.0, power)))
+        if header == "PID?":
+            return "{:+.1f},{:+.1f},{:+.1f}".format(*self.pid[int(args[0])])
+        if header == "PID":
+            self.pid[int(args[0])] = [float(arg) for arg in args[1:4]]
+            return None
+        if header == "OUTMODE?":
+            return "{},{},{}".format(*self.outmode[int(args[0])])
+        if header == "OUTMODE":
+            self.outmode[int(args[0])] = [int(arg) for arg in args[1:4]]
+            self._control()
+            return None
+        if header == "HTRSET?":
+            return "{},{},{:+.3f},{}".format(*self.htrset[int(args[0])])
+        if header == "HTRSET":
+            self.htrset[int(args[0])] = [
+                int(args[1]),
+                int(args[2]),
+                float(args[3]),
+                int(args[4]),
+            ]
+            return None
+        if header == "MOUT?":
+            return "{:+.2f}".format(self.mout[int(args[0])])
+        if header == "MOUT":
+            self.mout[int(args[0])] = float(args[1])
+            return None
+        if header.endswith("?"):
+            return self.other[(header[:-1], tuple(args[:1]))]
+        # everything else which is configured (INTYPE, TLIMIT, ZONE, ...)
+        self.other[(header, tuple(args[:1]))] = ",".join(args[1:])
+        return None
+
+
+def _scpi_node(node):
+    """short form of a SCPI node: upper case, four letters, three if
+    the fourth is a vowel, keeping a numeric suffix"""
+    match = re.match(r"([A-Za-z*]+)(\d*)", node)
+    letters, suffix = match.group(1).upper(), match.group(2)
+    if len(letters) > 4:
+        letters = letters[:3] if letters[3] in "AEIOU" else letters[:4]
+    elif len(letters) == 4 and letters[3] in "AEIOU" and not letters.startswith("*"):
+        letters = letters[:3]
+    return letters + suffix
+
+
+def scpi_header(header):
+    """normalised header, e.g. ':SENSe:VOLTage:DC:NPLC' -> 'SENS:VOLT:DC:NPLC'"""
+    query = header.endswith("?")
+    nodes = [_scpi_node(node) for node in header.strip(":?").split(":") if node]
+    return ":".join(nodes) + ("?" if query else "")
+
+
+class ScpiDevice(SimulatedDevice):
+    """SCPI instruments: commands chained with ';', headers in short or
+    long form, errors in the error queue (':SYST:ERR?')"""
+
+    idn = ""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.settings = {}
+        self.errors = deque()
+
+    def command_processing_time(self, command):
+        return super().command_processing_time(scpi_header(command.partition(" ")[0]))
+
+    def handle(self, command):
+        replies = []
+        for part in command.split(";"):
+            part = part.strip()
+            if not part:
+                continue
+            header, _, argument = part.partition(" ")
+            header = scpi_header(header)
+            try:
+                reply = self.handle_one(header, argument.strip())
+            except (KeyError, ValueError, IndexError):
+                self.errors.append('-113,"Undefined header"')
+                if header.endswith("?"):
+                    raise KeyError(header)
+                continue
+            if reply is not None:
+                replies.append(reply)
+        return ";".join(replies) if replies else None
+
+    def handle_one(self, header, argument):
+        if header == "*IDN?":
+            return self.idn
+        if header == "*RST":
+            self.reset()
+            return None
+        if header in ("*CLS", "*OPC", "*WAI"):
+            if header == "*CLS":
+                self.errors.clear()
+            return None
+        if header == "SYST:ERR?":
+            return self.errors.popleft() if self.errors else '0,"No error"'
+        if header.endswith("?"):
+            return self.settings[header[:-1]]
+        self.settings[header] = argument
+        return None
+
+    def reset(self):
+        self.settings.clear()
+
+
+class Keithley2182(ScpiDevice):
+    """Keithley 2182 nanovoltmeter, reads resistance * the current of a
+    simulated current source (address of a Keithley6221), plus an offset;
+    the noise decreases with the integration time (NPLC)"""
+
+    idn = "KEITHLEY INSTRUMENTS INC.,MODEL 2182A,SIM000,C02"
+    default_processing = 0.002
+    noise = Noise(sigma=30e-9)
+    line_frequency = 50.0
+
+    def __init__(self, resistance=100.0, current_source=None, offset=1e-7, **kwargs):
+        super().__init__(**kwargs)
+        self.resistance = resistance
+        self.current_source = current_source
+        self.offset = offset
+        self.temperature = 300.0
+
+    def nplc(self):
+        return float(self.settings.get("SENS:VOLT:DC:NPLC", 5))
+
+    def command_processing_time(self, command):
+        header = scpi_header(command.partition(" ")[0])
+        if header in ("READ?", "FETC?", "MEAS?"):
+            return self.default_processing + self.nplc() / self.line_frequency
+        return super().command_processing_time(command)
+
+    def voltage(self):
+        current = 0.0
+        if self.current_source is not None:
+            current = device(self.current_source).output_current()
+        value = self.offset + self.resistance * current
+        sigma = self.noise.sigma / math.sqrt(max(self.nplc(), 0.01))
+        return value + self.rng.gauss(0, sigma)
+
+    def handle_one(self, header, argument):
+        if header in ("READ?", "FETC?", "MEAS?", "MEAS:VOLT?"):
+            return "{:+.9E}".format(self.voltage())
+        if header in ("SENS:TEMP:RTEM?", "CAL:UNPR:ACAL:TEMP?"):
+            return "{:+.4E}".format(self.noisy(self.temperature / 10))
+        return super().handle_one(header, argument)
+
+
+class Keithley6221(ScpiDevice):
+    """Keithley 6221 current source"""
+
+    idn = "KEITHLEY INSTRUMENTS INC.,MODEL 6221,SIM000,A03"
+    default_processing = 0.001
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.current = 0.0
+        self.output = False
+
+    def output_current(self):
+        return self.current if self.output else 0.0
+
+    def reset(self):
+        super().reset()
+        self.current = 0.0
+        self.output = False
+
+    def handle_one(self, header, argument):
+        if header in ("CURR", "SOUR:CURR"):
+            self.current = float(argument)
+            return None
+        if header in ("CURR?", "SOUR:CURR?"):
+            return "{:+.6E}".format(self.current)
+        if header == "OUTP:STAT" or header == "OUTP":
+            self.output = argument.upper() in ("ON", "1")
+            return None
+        if header == "OUTP:STAT?" or header == "OUTP?":
+            return "1" if self.output else "0"
+        if header == "SOUR:CLE:IMM" or header == "SOUR:CLE":
+            self.output = False
+            return None
+        return super().handle_one(header, argument)
+
+
+class SR830(SimulatedDevice):
+    """SR830 lock-in amplifier, measuring the reference voltage through a
+    resistance divider (gain), with a phase shift"""
+
+    default_processing = 0.002
+    noise = Noise(sigma=1e-8, relative=1e-4)
+
+    def __init__(self, gain=1e-3, phase=5.0, **kwargs):
+        super().__init__(**kwargs)
+        self.gain = gain
+        self.phase = phase
+        self.frequency = 77.77
+        self.amplitude = 0.1
+        self.aux_out = {1: 0.0, 2: 0.0, 3: 0.0, 4: 0.0}
+        self.settings = {}
+
+    def outputs(self):
+        r = self.noisy(self.amplitude * self.gain)
+        theta = self.noisy(self.phase)
+        x = r * math.cos(math.radians(theta))
+        y = r * math.sin(math.radians(theta))
+        return {1: x, 2: y, 3: r, 4: theta}
+
+    def handle(self, command):
+        replies = []
+        for part in command.split(";"):
+            match = re.match(r"\s*([A-Za-z*]+\??)\s*(.*)", part)
+            if not match:
+                continue
+            header, argument = match.group(1).upper(), match.group(2).strip()
+            args = [arg.strip() for arg in argument.split(",")] if argument else []
+            reply = self.handle_one(header, args)
+            if reply is not None:
+                replies.append(reply)
+        return ";".join(replies) if replies else None
+
+    def handle_one(self, header, args):
+        if header == "*IDN?":
+            return "Stanford_Research_Systems,SR830,s/n00000,ver1.07"
+        if header == "FREQ?":
+            return "{:.4f}".format(self.frequency)
+        if header == "FREQ":
+            self.frequency = float(args[0])
+            return None
+        if header == "SLVL?":
+            return "{:.3f}".format(self.amplitude)
+        if header == "SLVL":
+            self.amplitude = float(args[0])
+            return None
+        if header == "OUTP?":
+            return "{:.6e}".format(self.outputs()[int(args[0])])
+        if header == "SNAP?":
+            outputs = self.outputs()
+            return ",".join("{:.6e}".format(outputs[int(arg)]) for arg in args)
+        if header == "OAUX?":
+            return "{:.3f}".format(self.noisy(self.aux_out[int(args[0])]))
+        if header == "AUXV?":
+            return "{:.3f}".format(self.aux_out[int(args[0])])
+        if header == "AUXV":
+            self.aux_out[int(args[0])] = float(args[1])
+            return None
+        if header.endswith("?"):
+            return self.settings[(header[:-1], tuple(args[:1]))]
+        if header not in ("*CLS", "*RST"):
+            self.settings[(header, tuple(args[:1]))] = ",".join(args[1:]) or "0"
+        return None
+
+
+MODELS = dict(
+    ITC503=ITC503,
+    IPS120=IPS120,
+    ILM211=ILM211,
+    LakeShore350=LakeShore350,
+    Keithley2182=Keithley2182,
+    Keithley6221=Keithley6221,
+    SR830=SR830,
+)
+
+_registry = {}
+_devices = {}
+_registry_lock = threading.Lock()
+
+
+def simulate(address, model, **options):
+    """simulate the instrument at address with model (a name of MODELS,
+    or a SimulatedDevice class), options are passed to the model"""
+    with _registry_lock:
+        _registry[address] = (model, options)
+        _devices.pop(address, None)
+
+
+def is_simulated(address):
+    return address is not None and (address.startswith(PREFIX) or address in _registry)
+
+
+def device(address):
+    """the simulated device of address, created on first use"""
+    with _registry_lock:
+        if address not in _devices:
+            if address in _registry:
+                model, options = _registry[address]
+            else:
+                model, options = address[len(PREFIX) :].split("::")[0], {}
+            if isinstance(model, str):
+                model = MODELS[model]
+            _devices[address] = model(**options)
+            logger.info("simulating %s at %s", model.__name__, address)
+        return _devices[address]
+
+
+def _interface(address, simulated):
+    address = address.upper()
+    if address.startswith(("ASRL", "COM")):
+        return "serial"
+    if address.startswith("GPIB"):
+        return "gpib"
+    if address.startswith("TCPIP"):
+        return "ethernet"
+    return simulated.interface
+
+
+class SimulatedResource:
+    """stands in for a pyvisa resource of a simulated device
+
+    A write hands the command to the device, the reply is ready once the
+    transaction time has passed, the next read waits for it. A read
+    without a pending reply times out, as on a real bus.
+
+    ask and values make it usable as adapter of pymeasure instruments.
+    """
+
+    def __init__(self, address):
+        super().__init__()
+        self.resource_name = address
+        self.device = device(address)
+        self.interface = _interface(address, self.device)
+        self.timeout = 2000
+        self.read_termination = None
+        self.write_termination = None
+        self.baud_rate = 9600
+        self.data_bits = 8
+        self.stop_bits = None
+        self.parity = None
+        self.query_delay = 0.0
+        self._replies = deque()
+        self._ready = 0.0
+
+    def _wait(self, until):
+        delay = until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def write(self, command, **kwargs):
+        try:
+            reply, duration = self.device.transaction(command, self)
+        except (KeyError, ValueError, IndexError):
+            # the device does not understand the command, does not answer
+            reply, duration = None, 0.0
+        self._ready = max(self._ready, time.monotonic()) + duration
+        if reply is not None:
+            self._replies.append((self._ready, reply))
+        else:
+            self._wait(self._ready)
+        return len(command) + 1, 0
+
+    def read(self, **kwargs):
+        if not self._replies:
+            time.sleep(self.timeout / 1000 * self.device.time_scale)
+            raise VisaIOError(VI_ERROR_TMO)
+        ready, reply = self._replies.popleft()
+        self._wait(ready)
+        return reply
+
+    def query(self, command, delay=None):
+        self.write(command)
+        return self.read()
+
+    def ask(self, command):
+        return self.query(command)
+
+    def values(self, command, separator=",", cast=float, preprocess_reply=None):
+        reply = self.ask(command).strip()
+        if preprocess_reply is not None:
+            reply = preprocess_reply(reply)
+        return [cast(value) for value in reply.split(separator)]
+
+    def clear(self):
+        self._replies.clear()
+
+    def close(self):
+        self._replies.clear()
+
+
+class _SimulatedVisaLibrary:
+    def __init__(self):
+        self._registry = {}
+
+
+class SimulatedResourceManager:
+    """stands in for a pyvisa ResourceManager, for simulated addresses"""
+
+    def __init__(self):
+        super().__init__()
+        self.visalib = _SimulatedVisaLibrary()
+
+    def list_resources(self, query="?*::INSTR"):
+        with _registry_lock:
+            return tuple(_registry)
+
+    def open_resource(self, resource_name, **kwargs):
+        resource = SimulatedResource(resource_name)
+        for key, value in kwargs.items():
+            setattr(resource, key, value)
+        return resource
+
+    get_instrument = open_resource
+
+    def close(self):
+        pass
@@ -0,0 +1,30 @@
+"""pytest configuration: the modules are imported from the CryostatGUI
+directory, as when the GUI is started from there, Qt runs offscreen"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PyQt5.QtWidgets import QApplication
+
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def mainthread(qapp):
+    """stands in for the main window, which the loggers connect to"""
+    from PyQt5.QtCore import QObject
+    from PyQt5.QtCore import pyqtSignal
+
+    class MainThread(QObject):
+        sig_logging = pyqtSignal(dict)
+        sig_logging_newconf = pyqtSignal(dict)
+
+    return MainThread()
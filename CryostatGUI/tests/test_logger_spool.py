@@ -0,0 +1,86 @@
+"""main_Logger spooling the data it cannot store, and replaying it"""
+
+import sqlite3
+
+import pytest
+
+from loggingFunctionality.logger import main_Logger
+
+
+@pytest.fixture
+def impatient_sqlite(monkeypatch):
+    """a locked database fails at once, instead of after seconds"""
+    connect = sqlite3.connect
+    monkeypatch.setattr(
+        sqlite3,
+        "connect",
+        lambda *args, **kwargs: connect(*args, **{**kwargs, "timeout": 0.1}),
+    )
+
+
+@pytest.fixture
+def logger(tmp_path, mainthread, impatient_sqlite):
+    logger = main_Logger(mainthread=mainthread)
+    logger.names = ["ITC"]
+    logger.conf = {
+        "general": {
+            "logfile_location": str(tmp_path / "cooldown.db"),
+            "spool_location": str(tmp_path / "spool.bin"),
+        }
+    }
+    return logger
+
+
+def package(t):
+    return {"ITC": {"timeseconds": t, "Sensor_1_K": t}}
+
+
+def stored_times(dbname):
+    conn = sqlite3.connect(dbname)
+    try:
+        return [row[0] for row in conn.execute("SELECT timeseconds FROM ITC")]
+    finally:
+        conn.close()
+
+
+def locked(dbname):
+    conn = sqlite3.connect(dbname)
+    conn.execute("BEGIN EXCLUSIVE")
+    return conn
+
+
+def test_locked_database_is_spooled_and_replayed(logger):
+    dbname = logger.conf["general"]["logfile_location"]
+    logger.store_data(package(1.0))
+
+    other = locked(dbname)
+    logger.store_data(package(2.0))
+    assert logger.get_spool().pending() > 0
+    other.rollback()
+    other.close()
+    assert stored_times(dbname) == [1.0]
+
+    # the next package which is stored starts the replay
+    logger.store_data(package(3.0))
+    logger.replaying.join(10)
+    assert sorted(stored_times(dbname)) == [1.0, 2.0, 3.0]
+    assert logger.get_spool().pending() == 0
+
+
+def test_failed_replay_keeps_the_spool(logger):
+    dbname = logger.conf["general"]["logfile_location"]
+    logger.store_data(package(1.0))
+    spool = logger.get_spool()
+    spool.append(package(2.0))
+    pending = spool.pending()
+
+    other = locked(dbname)
+    logger.replay_spool(spool, dbname)
+    other.rollback()
+    other.close()
+    assert spool.pending() == pending
+    assert stored_times(dbname) == [1.0]
+
+    logger.replay_spool(spool, dbname)
+    assert spool.pending() == 0
+    assert stored_times(dbname) == [1.0, 2.0]
@@ -0,0 +1,47 @@
+"""main_Logger_adaptable with its SQLiteWriter, on a locked database"""
+
+import sqlite3
+import time
+
+from loggingFunctionality.logger import main_Logger_adaptable
+
+
+def wait_for(condition, timeout=10):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.05)
+
+
+def stored_times(dbname):
+    conn = sqlite3.connect(dbname)
+    try:
+        return [row[0] for row in conn.execute("SELECT timeseconds FROM ITC")]
+    finally:
+        conn.close()
+
+
+def test_locked_database_is_retried(tmp_path, mainthread):
+    dbname = str(tmp_path / "cooldown.db")
+    logger = main_Logger_adaptable(mainthread=mainthread)
+    logger.conf = {"logfile_location": dbname}
+    writer = logger.get_writer(dbname)
+    writer.timeout = 0.1
+    writer.retry_interval = 0.1
+    writer.commit_interval = 0.05
+    try:
+        logger.store_data({"ITC": {"timeseconds": 1.0, "Sensor_1_K": 1.0}})
+        wait_for(lambda: writer.stats()["commits"] == 1)
+
+        other = sqlite3.connect(dbname, timeout=5)
+        other.execute("BEGIN EXCLUSIVE")
+        logger.store_data({"ITC": {"timeseconds": 2.0, "Sensor_1_K": 2.0}})
+        wait_for(lambda: writer.stats()["errors"] > 0)
+        other.rollback()
+        other.close()
+
+        wait_for(lambda: writer.stats()["commits"] == 2)
+        assert stored_times(dbname) == [1.0, 2.0]
+        assert writer.stats()["dropped"] == 0
+    finally:
+        logger.close_writer(10)
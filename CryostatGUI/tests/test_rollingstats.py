@@ -0,0 +1,98 @@
+"""RollingStats against the reference calculations of live_Logger_bare
+(CALCULATIONS and SLOPES), over the whole window at every sample"""
+
+import numpy as np
+import pytest
+
+from util import RingBuffer
+from util import RollingStats
+from util import CALCULATIONS
+from util import SLOPES
+
+# largest deviation, relative to the largest magnitude during the run
+# (slopes pass through zero); the fit on epoch times is conditioned to
+# about 1e-6
+TOLERANCES = {
+    "ar_mean": 1e-12,
+    "stderr": 1e-9,
+    "stddev_rel": 1e-9,
+    "stderr_rel": 1e-9,
+    "slope": 1e-5,
+    "slope_rel": 1e-5,
+    "slope_residuals": 1e-5,
+}
+
+
+def reference(times, values):
+    """the reference calculations over the whole window
+
+    The fit of CALCULATIONS is fed the NaN values as well, which gives NaN
+    for any window containing one, while RollingStats fits the non-NaN
+    values only: for such windows, the fit is redone on those.
+    """
+    results = {c: f(times, values) for c, f in CALCULATIONS.items() if c != "slope"}
+    fit = CALCULATIONS["slope"](times, values)
+    results.update({c: f(fit, results["ar_mean"]) for c, f in SLOPES.items()})
+    valid = ~np.isnan(values)
+    if not valid.all():
+        assert all(np.isnan(results[c]) for c in SLOPES)
+        fit = CALCULATIONS["slope"](times[valid], values[valid])
+        results.update({c: f(fit, results["ar_mean"]) for c, f in SLOPES.items()})
+    return results
+
+
+def signal(kind, n, rng):
+    """times and values of a synthetic channel"""
+    k = np.arange(n)
+    times = 1.6e9 + k * 0.1 + rng.uniform(0, 0.01, n)
+    if kind == "offset_drift":
+        # a large offset with small noise and a drift
+        values = 300 + rng.normal(0, 1e-4, n) + k * 1e-6
+    else:
+        # a sine with missing values
+        values = 4.2 + 0.1 * np.sin(k / 50)
+        values[k % 97 == 0] = np.nan
+    return times, values
+
+
+@pytest.mark.parametrize("window", [50, 600])
+@pytest.mark.parametrize("kind", ["offset_drift", "sine_gaps"])
+def test_rollingstats_matches_reference(kind, window):
+    times, values = signal(kind, 3 * window, np.random.default_rng(0))
+    buffer = RingBuffer(window)
+    stats = RollingStats(reanchor=window)
+    worst, scale = {}, {}
+    with_nan = 0
+    for k, (timestamp, value) in enumerate(zip(times, values)):
+        dropped = buffer.append(value, timestamp)
+        if stats.due():
+            stats.recompute(buffer.times(), buffer.view())
+        else:
+            stats.push(timestamp, value, dropped)
+        if k < 3:
+            continue
+        results = stats.results()
+        expected = reference(buffer.times(), buffer.view())
+        with_nan += np.isnan(buffer.view()).any()
+        for calc, ref in expected.items():
+            assert np.isfinite(results[calc]), (k, calc)
+            deviation = abs(results[calc] - ref)
+            worst[calc] = max(worst.get(calc, 0), deviation)
+            scale[calc] = max(scale.get(calc, 0), abs(ref))
+
+    assert set(worst) == set(TOLERANCES)
+    for calc, deviation in worst.items():
+        assert deviation <= TOLERANCES[calc] * scale[calc], (
+            calc,
+            deviation / scale[calc],
+        )
+    if kind == "sine_gaps":
+        assert with_nan > 0
+
+
+def test_live_logger_uses_the_reference():
+    """the live logger calculates with the very same definitions"""
+    from loggingFunctionality import logger
+
+    assert logger.CALCULATIONS is CALCULATIONS
+    assert logger.SLOPES is SLOPES
@@ -18,6 +18,16 @@ from .util_misc import Window_plotting_specification
 from .util_misc import dummy
 
 from .util_misc import calculate_timediff
+from .util_misc import check_stability
+
+from .ringbuffer import RingBuffer
+from .rollingstats import RollingStats
+from .rollingstats import CALCULATIONS
+from .rollingstats import SLOPES
+from .stagestats import StageStats
+from .datafile import DataFileWriter
+from .datafile import CsvRowWriter
+from .datafile import MeasurementRowWriter
 
 
 from .abstractThreads import AbstractMainApp
@@ -34,6 +44,7 @@ from .zmqcomms import dec
 from .zmqcomms import dictdump
 from .zmqcomms import zmqClient
 from .zmqcomms import zmqMainControl
+from .zmqcomms import zmqMainControlAsync
 from .zmqcomms import zmqDataStore
 
 from .livedata import PrometheusGaugeClient
@@ -43,3 +54,5 @@ from .customExceptions import problemAbort
 from .customExceptions import ApplicationExit
 from .customExceptions import successExit
 from .customExceptions import genericAnswer
+from .customExceptions import HandshakeTimeoutError
+from .customExceptions import RequestTimeoutError
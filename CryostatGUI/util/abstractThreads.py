@@ -2,6 +2,7 @@ from PyQt5 import QtWidgets
 from PyQt5.QtCore import QObject
 from PyQt5.QtCore import QThread
 from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import QSocketNotifier
 from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtCore import pyqtSlot
 from PyQt5.uic import loadUi
@@ -20,6 +21,7 @@ from .livedata import PrometheusGaugeClient
 from datetime import datetime as dt
 from datetime import timedelta
 
+import zmq
 
 from visa import VisaIOError
 
@@ -49,7 +51,7 @@ class Timerthread(Thread):
     def run(self):
         self._logger.debug("entering the working loop")
         while not self.stopped.is_set():
-            self.stopped.wait(self.interval_now)
+            self.idle(self.interval_now)
             # self._logger.debug("not stopped, running")
             # print(f"my thread is working hard! {self.counter}")
             try:
@@ -61,6 +63,10 @@ class Timerthread(Thread):
                 end = dt.now()
                 self.interval_now = self.calculate_timeToWait(start, end)
 
+    def idle(self, timeout):
+        """wait for the next loop iteration, timeout in seconds"""
+        self.stopped.wait(timeout)
+
     def running(self):
         """to be implemented by child class!"""
         raise NotImplementedError
@@ -68,7 +74,7 @@ class Timerthread(Thread):
     def calculate_timeToWait(self, start, end):
         try:
             diff = timediff(start, end)
-            timeToWait = self.interval * 1e0 - diff
+            timeToWait = self.interval * 1e0 - diff * 1e-3
             if timeToWait < 0:
                 # self._logger.debug(
                 #     "no wait for loop iteration, len(lastIt) = %f s > wait = %f",
@@ -97,11 +103,21 @@ class Timerthread_Clients(zmqClient, PrometheusGaugeClient, Timerthread):
 
     def work(self):
         self.zmq_handle()  # inherited from zmqClient
-        with noblockLock(self.lock):
-            self.running()
-            if self.run_finished:
-                self.run_prometheus()  # inherited from PrometheusGaugeClient
-                self.send_data_upstream()  # inherited from zmqClient
+        try:
+            with noblockLock(self.lock):
+                self.running()
+                if self.run_finished:
+                    self.run_prometheus()  # inherited from PrometheusGaugeClient
+                    self.send_data_upstream()  # inherited from zmqClient
+        finally:
+            self.zmq_deferred_lock()
+
+    def idle(self, timeout):
+        """in reactor mode, handle zmq messages while waiting"""
+        if self.zmq_reactor:
+            self.zmq_serve(timeout)
+        else:
+            super().idle(timeout)
 
 
 class AbstractApp(QtWidgets.QMainWindow):
@@ -377,20 +393,54 @@ class AbstractLoopThread(AbstractThread):
 
 
 class AbstractLoopZmqThread(AbstractLoopThread):
-    """Abstract thread class to be used with instruments"""
+    """Abstract thread class to be used with instruments
+
+    In reactor mode (zmq_reactor=True), the zmq sockets are registered
+    with the Qt event loop of the thread, so that incoming messages are
+    handled as soon as they arrive, not only once per loop iteration.
+    """
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.run_finished = False
+        self._reactor_notifiers = None
         self._logger = logging.getLogger(
             "CryoGUI." + __name__ + "." + self.__class__.__name__
         )
 
+    def reactor_start(self):
+        """register all polled zmq sockets with the Qt event loop
+
+        needs to be called from within the thread the object lives in,
+        as the socket notifiers are bound to that thread's event loop
+        """
+        self._reactor_notifiers = []
+        for socket, _ in self.poller.sockets:
+            notifier = QSocketNotifier(
+                socket.getsockopt(zmq.FD), QSocketNotifier.Read, self
+            )
+            notifier.activated.connect(lambda *args: self.reactor_wakeup())
+            self._reactor_notifiers.append(notifier)
+        self._logger.debug("zmq reactor started")
+
+    @pyqtSlot()
+    def reactor_wakeup(self):
+        """handle zmq messages as soon as the sockets signal activity
+
+        the zmq file descriptors are edge-triggered, thus we come back
+        as long as the poller still reports events
+        """
+        self.zmq_handle()
+        if self.poller.poll(0):
+            QTimer.singleShot(0, self.reactor_wakeup)
+
     @pyqtSlot()  # int
     def work(self):
         """class method which is working all the time while the thread is running."""
         try:
             start = dt.now()
+            if self.zmq_reactor and self._reactor_notifiers is None:
+                self.reactor_start()
             self.zmq_handle()  # inherited later from zmqClient
             with noblockLock(self.lock):
                 self.running()
@@ -413,6 +463,8 @@ class AbstractLoopThreadClient(AbstractLoopZmqThread, zmqClient, PrometheusGauge
         """class method which is working all the time while the thread is running."""
         try:
             start = dt.now()
+            if self.zmq_reactor and self._reactor_notifiers is None:
+                self.reactor_start()
             self.zmq_handle()  # inherited later from zmqClient
             with noblockLock(self.lock):
                 self.run_here()
@@ -422,6 +474,7 @@ class AbstractLoopThreadClient(AbstractLoopZmqThread, zmqClient, PrometheusGauge
         except BlockedError:
             pass
         finally:
+            self.zmq_deferred_lock()
             end = dt.now()
             timeToWait = self.calculate_timeToWait(start, end)
             # self._logger.debug("waiting: %f", timeToWait)
@@ -4,14 +4,27 @@ It is different from the two other brokers, in that it does not shuffle
 messages from connections it subsribed to, by publishing them forward,
 (this would be one way only), but it is a broker for req-rep patterns.
 Thus, multiple GUI instances, or Sequence instances can work in parallel
+
+Messages sent to the empty address (BATCH_ADDRESS) are batch requests:
+    {"devices": [...], "command": {...}, "timeout": seconds, "uuid": ...}
+the command is fanned out to all devices, and a single answer is sent back
+once every device answered, or the timeout has passed:
+    {"answers": {device: answer}, "errors": {device: message}, "uuid": ...}
+a device is either in "answers", or, if it answered with an error or not
+at all, in "errors"
 """
+
+import os
+import sys
+import time
 import logging
 import zmq
-import time
 
-# from zmqcomms import dec, enc, dictdump
-from json import loads as dictload
-from json import dumps
+# the codecs do not depend on the rest of the package,
+# so this broker can still be run as a standalone script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from zmqcodecs import encode_message  # noqa: E402
+from zmqcodecs import decode_message  # noqa: E402
 
 
 def enc(msg):
@@ -22,16 +35,48 @@ def dec(msg):
     return msg.decode("utf-8")
 
 
-def dictdump(d):
-    return dumps(d, indent=4, sort_keys=True, default=str)
-
-
 port_backend = 5556
 port_frontend = 5564
 
+BATCH_ADDRESS = b""
+
 logger = logging.getLogger()
 
 
+class Batch:
+    """a batch request, waiting for the answers of its devices"""
+
+    def __init__(self, sender, payload, codec):
+        self.sender = sender
+        self.uuid = payload["uuid"]
+        self.codec = codec
+        # a device listed twice is asked, and answers, only once
+        self.devices = list(dict.fromkeys(payload["devices"]))
+        self.deadline = time.monotonic() + payload.get("timeout", 5)
+        self.answers = {}
+        self.errors = {}
+
+    def add(self, device, answer):
+        if "ERROR" in answer:
+            self.errors[device] = answer.get("Errors", answer.get("info", "ERROR"))
+        else:
+            self.answers[device] = answer
+
+    def done(self):
+        return len(self.answers) + len(self.errors) == len(self.devices)
+
+    def result(self):
+        for device in self.devices:
+            if device not in self.answers and device not in self.errors:
+                self.errors[device] = "timeout, the device did not answer"
+        return dict(
+            answers=self.answers,
+            errors=self.errors,
+            uuid=self.uuid,
+            deliverto=dec(self.sender),
+        )
+
+
 def main():
 
     context = zmq.Context()
@@ -52,10 +97,23 @@ def main():
     poller.register(frontend, zmq.POLLIN)
     poller.register(backend, zmq.POLLIN)
 
+    batches = {}  # uuid: Batch
+
+    def finish(batch):
+        del batches[batch.uuid]
+        sending_now = [batch.sender, encode_message(batch.result(), batch.codec)]
+        logger.debug("sending batch answer to frontend: %s", sending_now)
+        frontend.send_multipart(sending_now)
+
     logger.debug("starting loop")
     while True:
-        time.sleep(0.01)
-        evts = dict(poller.poll(zmq.DONTWAIT))
+        # block until there is something to pass on,
+        # or the next batch runs out of time
+        timeout = None
+        if batches:
+            deadline = min(batch.deadline for batch in batches.values())
+            timeout = max(0, (deadline - time.monotonic()) * 1e3)
+        evts = dict(poller.poll(timeout))
         # logger.debug("handling evts")
 
         if frontend in evts:
@@ -63,27 +121,55 @@ def main():
             sender, deliverto, message = frontend.recv_multipart()
             logger.debug("frontend received: %s, %s, %s", sender, deliverto, message)
 
-            m = dec(message)
-            m_payload = dictload(m[1:])
-            m_command = m[0]
-
-            newmessage = m_payload
-            newmessage["deliverto"] = dec(sender)
-            everything_new = [deliverto, enc(m_command + dictdump(newmessage))]
-
-            logger.debug("sending to backend: %s", everything_new)
-            backend.send_multipart(everything_new)
+            # pass the message on in the codec it arrived in
+            m_command, m_payload, codec = decode_message(message)
+
+            if deliverto == BATCH_ADDRESS:
+                batch = Batch(sender, m_payload, codec)
+                batches[batch.uuid] = batch
+                newmessage = dict(m_payload.get("command") or {})
+                newmessage.update(uuid=batch.uuid, deliverto=dec(sender))
+                for device in batch.devices:
+                    everything_new = [
+                        enc(device),
+                        encode_message(newmessage, codec, m_command),
+                    ]
+                    logger.debug("sending to backend: %s", everything_new)
+                    backend.send_multipart(everything_new)
+                if batch.done():  # no devices
+                    finish(batch)
+            else:
+                newmessage = m_payload
+                newmessage["deliverto"] = dec(sender)
+                everything_new = [
+                    deliverto,
+                    encode_message(newmessage, codec, m_command),
+                ]
+
+                logger.debug("sending to backend: %s", everything_new)
+                backend.send_multipart(everything_new)
 
         if backend in evts:
             logger.debug("backend received")
             sender, message = backend.recv_multipart()
-            logger.debug("backend received: %s, %s", deliverto, message)
-
-            m = dictload(dec(message))
-            deliverto = enc(m["deliverto"])
-            sending_now = [deliverto, message]
-            logger.debug("sending to frontend: %s", sending_now)
-            frontend.send_multipart(sending_now)
+            logger.debug("backend received: %s, %s", sender, message)
+
+            m = decode_message(message)[1]
+            batch = batches.get(m.get("uuid"))
+            if batch is not None:
+                batch.add(dec(sender), m)
+                if batch.done():
+                    finish(batch)
+            else:
+                deliverto = enc(m["deliverto"])
+                sending_now = [deliverto, message]
+                logger.debug("sending to frontend: %s", sending_now)
+                frontend.send_multipart(sending_now)
+
+        now = time.monotonic()
+        for batch in [b for b in batches.values() if b.deadline <= now]:
+            logger.warning("batch %s timed out: %s", batch.uuid, batch.result())
+            finish(batch)
 
     frontend.close()
     backend.close()
@@ -31,3 +31,13 @@ class successExit(Exception):
     """zmq: when waiting for an answer, trials are repeated without blocking
     however once the answer was received, we want to move on
     """
+
+
+class HandshakeTimeoutError(Exception):
+    """zmq: raised when a PUB/SUB socket could not confirm its connection
+    through the respective broker within the given timeout
+    """
+
+
+class RequestTimeoutError(Exception):
+    """zmq: raised when no answer to a request arrived before its deadline"""
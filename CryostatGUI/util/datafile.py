@@ -0,0 +1,194 @@
+"""Module containing writers for measurement datafiles, which keep the
+file open between data points
+
+Classes:
+    DataFileWriter: appends text to one datafile, with a flush/fsync policy
+    CsvRowWriter: appends one dict per row to a csv datafile,
+        as pandas.DataFrame.to_csv did
+    MeasurementRowWriter: appends the data points of measurement_Logger
+"""
+import os
+import csv
+import math
+import time
+import atexit
+import numbers
+import logging
+from datetime import datetime
+from datetime import time as dt_time
+
+
+class DataFileWriter:
+    """appends text to one datafile, keeping it open
+
+    header: written first if the file does not exist yet
+    flush_interval: seconds between flushes to the operating system,
+        0 flushes after every write
+    fsync: whether every flush is also forced to the disk
+
+    whatever is still buffered is written by close(), which is also
+    called at exit
+    """
+
+    def __init__(self, path, header="", flush_interval=0.0, fsync=False, newline=None):
+        super().__init__()
+        self._logger = logging.getLogger(
+            "CryoGUI." + __name__ + "." + self.__class__.__name__
+        )
+        self.path = path
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        new = not os.path.isfile(path)
+        self._file = open(path, "a", newline=newline)
+        self._last_flush = time.monotonic()
+        if new and header:
+            self.write(header)
+        atexit.register(self.close)
+
+    def write(self, text):
+        """append text, flush according to the policy"""
+        self._file.write(text)
+        self._written()
+
+    def _written(self):
+        if (
+            not self.flush_interval
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+            self._file = None
+            atexit.unregister(self.close)
+
+    @property
+    def closed(self):
+        return self._file is None
+
+
+def _csv_datetime(value):
+    """a datetime as pandas writes a column of only this value:
+    without the time at midnight, and the fraction of the seconds
+    in milliseconds if that is exact"""
+    if value.time() == dt_time(0):
+        return value.strftime("%Y-%m-%d")
+    text = value.strftime("%Y-%m-%d %H:%M:%S")
+    if value.microsecond % 1000:
+        return text + ".{:06d}".format(value.microsecond)
+    if value.microsecond:
+        return text + ".{:03d}".format(value.microsecond // 1000)
+    return text
+
+
+def _csv_field(value):
+    """a value as pandas writes it into a csv file"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return _csv_datetime(value)
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real):
+        if math.isnan(value):
+            return ""
+        # str of numpy floats (e.g. float32) is their shortest repr
+        return repr(value) if type(value) is float else str(value)
+    return str(value)
+
+
+class CsvRowWriter(DataFileWriter):
+    """appends one dict per row to a csv datafile
+
+    writes what
+        pd.DataFrame({key: [value]}).to_csv(f, header=f.tell() == 0, index=False)
+    wrote, for scalar values: the column names once, into an empty file,
+    then the values of every row in their order
+    """
+
+    def __init__(self, path, **kwargs):
+        super().__init__(path, newline="", **kwargs)
+        self._csv = csv.writer(self._file, lineterminator=os.linesep)
+        self._empty = os.path.getsize(path) == 0
+
+    def write_row(self, data):
+        if self._empty:
+            self._csv.writerow(list(data))
+            self._empty = False
+        self._csv.writerow([_csv_field(value) for value in data.values()])
+        self._written()
+
+
+class MeasurementRowWriter(DataFileWriter):
+    """appends the data points of measurement_Logger to a datafile
+
+    A 'multichannel' point holds dicts of temperatures and resistances,
+    and lists of voltages and currents, per instrument. The format of
+    a line is compiled once per layout of these (names and lengths),
+    so only the values need to be formatted for every point.
+    """
+
+    single = (
+        "\n {T_mean_K:.3E} {T_std_K:.3E} {R_mean_Ohm:.14E} {R_std_Ohm:.14E}"
+        " {timeseconds} {ReadableTime}"
+    )
+
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        self._layout = None
+        self._format = None
+
+    @staticmethod
+    def layout(data):
+        """names and lengths of the values of a 'multichannel' point"""
+        return (
+            tuple(zip(data["T_mean_K"], data["T_std_K"])),
+            tuple((name, tuple(res)) for name, res in data["resistances"].items()),
+            tuple((name, len(volt)) for name, volt in data["voltages"].items()),
+            tuple((name, len(curr)) for name, curr in data["currents"].items()),
+        )
+
+    @staticmethod
+    def compile(layout):
+        """the format of a line, for values in the order of values()"""
+        temperatures, resistances, voltages, currents = layout
+        line = "\n{} " + "{:.5E} {:.5E} " * len(temperatures)
+        for _, keys in resistances:
+            line += "{:.10E} " * len(keys)
+        for _, length in voltages + currents:
+            line += f"{length} " + "{:.5E} " * length
+        return line
+
+    def values(self, data):
+        temperatures, resistances, _, _ = self._layout
+        values = [data["ReadableTime"]]
+        for mean, std in temperatures:
+            values += [data["T_mean_K"][mean], data["T_std_K"][std]]
+        for name, keys in resistances:
+            values += [data["resistances"][name][key] for key in keys]
+        for group in ("voltages", "currents"):
+            for points in data[group].values():
+                values += points
+        return values
+
+    def write_point(self, data):
+        if data["type"] != "multichannel":
+            self.write(self.single.format(**data))
+            return
+        layout = self.layout(data)
+        if layout != self._layout:
+            self._layout, self._format = layout, self.compile(layout)
+        self.write(self._format.format(*self.values(data)))
@@ -0,0 +1,243 @@
+"""Module containing a fixed-capacity circular buffer for live data
+
+Classes:
+    RingBuffer: circular buffer backed by preallocated numpy arrays,
+        for values and their timestamps, optionally for several channels
+    Channel: one channel of a RingBuffer, behaving like a RingBuffer itself
+"""
+import numbers
+
+import numpy as np
+
+
+def is_numeric(value):
+    """whether value can be stored in a float64 RingBuffer"""
+    return isinstance(value, (numbers.Real, np.number)) or value is None
+
+
+class RingBuffer:
+    """fixed-capacity circular buffer, keeping the last `capacity` values
+
+    Every value (and its timestamp) is written twice, at position i
+    and at i + capacity, so the last n values are always one contiguous
+    slice of the storage: appending is O(1), and view() returns the data
+    in chronological order without copying.
+
+    Once the buffer is full, every append drops the oldest value.
+
+    Numeric buffers (float64) store None as NaN. If a value arrives
+    which does not fit into float64 (e.g. a string), the buffer is
+    converted to dtype object, keeping its data.
+
+    With channels=n, the buffer holds n numeric channels sharing their
+    timestamps, in storage of shape (channels, 2 * capacity): append()
+    takes n values at once, view() has the shape (channels, length).
+    Non-numeric values are stored as NaN there.
+    """
+
+    def __init__(self, capacity, dtype=np.float64, channels=None):
+        super().__init__()
+        self._capacity = int(capacity)
+        self._channels = channels
+        self._values = self._empty(self._capacity, dtype, channels)
+        self._times = np.full(2 * self._capacity, np.nan)
+        self._end = 0  # position of the next write
+        self._len = 0
+
+    @staticmethod
+    def _empty(capacity, dtype, channels=None):
+        shape = (2 * capacity,) if channels is None else (channels, 2 * capacity)
+        if np.dtype(dtype) == np.dtype(object):
+            return np.full(shape, None, dtype=object)
+        return np.full(shape, np.nan, dtype=dtype)
+
+    @classmethod
+    def for_value(cls, capacity, value):
+        """create a buffer with a dtype fitting value"""
+        return cls(capacity, dtype=np.float64 if is_numeric(value) else object)
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def dtype(self):
+        return self._values.dtype
+
+    @property
+    def channels(self):
+        return self._channels
+
+    def channel(self, index):
+        """the channel at index, as a Channel"""
+        return Channel(self, index)
+
+    def append(self, value, timestamp=np.nan):
+        """append value, dropping the oldest one if the buffer is full
+
+        for a buffer with channels, value is a sequence of one value
+        per channel
+
+        returns: the dropped (value, timestamp), or None
+        """
+        if self._channels is not None:
+            return self._append_channels(value, timestamp)
+        if value is None and self._values.dtype != object:
+            value = np.nan
+        i = self._end
+        dropped = None
+        if self._len == self._capacity:
+            dropped = (self._values[i], self._times[i])
+        try:
+            self._values[i] = self._values[i + self._capacity] = value
+        except (TypeError, ValueError):
+            self._values = self._values.astype(object)
+            self._values[i] = self._values[i + self._capacity] = value
+        self._advance(timestamp)
+        return dropped
+
+    def _append_channels(self, values, timestamp):
+        if not isinstance(values, np.ndarray) or values.dtype != self.dtype:
+            values = np.array(
+                [v if is_numeric(v) else np.nan for v in values], dtype=self.dtype
+            )
+        i = self._end
+        dropped = None
+        if self._len == self._capacity:
+            dropped = (self._values[:, i].copy(), self._times[i])
+        self._values[:, i] = self._values[:, i + self._capacity] = values
+        self._advance(timestamp)
+        return dropped
+
+    def _advance(self, timestamp):
+        i = self._end
+        self._times[i] = self._times[i + self._capacity] = timestamp
+        self._end = (i + 1) % self._capacity
+        self._len = min(self._len + 1, self._capacity)
+
+    def _window(self, storage, n):
+        n = self._len if n is None else min(n, self._len)
+        stop = self._end + self._capacity
+        view = storage[..., stop - n : stop]
+        view.flags.writeable = False
+        return view
+
+    def view(self, n=None):
+        """the last n (default: all) values in chronological order, zero-copy
+
+        for a buffer with channels, the shape is (channels, n)
+        """
+        return self._window(self._values, n)
+
+    def times(self, n=None):
+        """timestamps belonging to view(n), zero-copy"""
+        return self._window(self._times, n)
+
+    def extend(self, values, times):
+        """append several values at once, in chronological order
+
+        for a buffer with channels, values has the shape (channels, n)
+        """
+        values = np.asarray(values, dtype=self._values.dtype)
+        times = np.asarray(times, dtype=float)
+        capacity = self._capacity
+        values = np.concatenate([self.view(), values], axis=-1)[..., -capacity:]
+        times = np.concatenate([self.times(), times])[-capacity:]
+        n = len(times)
+        self._values[..., :n] = self._values[..., capacity : capacity + n] = values
+        self._times[:n] = self._times[capacity : capacity + n] = times
+        self._end = n % capacity
+        self._len = n
+
+    def resize(self, capacity):
+        """change the capacity, keeping the most recent values"""
+        capacity = int(capacity)
+        if capacity == self._capacity:
+            return
+        values, times = self.view(capacity), self.times(capacity)
+        n = len(times)
+        self._values = self._empty(capacity, self._values.dtype, self._channels)
+        self._times = np.full(2 * capacity, np.nan)
+        self._values[..., :n] = self._values[..., capacity : capacity + n] = values
+        self._times[:n] = self._times[capacity : capacity + n] = times
+        self._capacity = capacity
+        self._end = n % capacity
+        self._len = n
+
+    def clear(self):
+        self._end = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __array__(self, dtype=None, copy=None):
+        view = self.view()
+        if dtype is not None:
+            return view.astype(dtype)
+        return view.copy() if copy else view
+
+    def tolist(self):
+        return self.view().tolist()
+
+    def __repr__(self):
+        channels = "" if self._channels is None else f", {self._channels} channels"
+        return f"RingBuffer({self._len}/{self._capacity}, {self.dtype}{channels})"
+
+
+class Channel:
+    """one channel of a RingBuffer with channels
+
+    Reading works like for a RingBuffer of its own, without copying.
+    Values are appended through the parent buffer, for all channels at once.
+    """
+
+    def __init__(self, buffer, index):
+        super().__init__()
+        self.buffer = buffer
+        self.index = index
+
+    @property
+    def capacity(self):
+        return self.buffer.capacity
+
+    @property
+    def dtype(self):
+        return self.buffer.dtype
+
+    def view(self, n=None):
+        return self.buffer.view(n)[self.index]
+
+    def times(self, n=None):
+        return self.buffer.times(n)
+
+    def resize(self, capacity):
+        """resize the parent buffer (once, for all its channels)"""
+        self.buffer.resize(capacity)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __array__(self, dtype=None, copy=None):
+        view = self.view()
+        if dtype is not None:
+            return view.astype(dtype)
+        return view.copy() if copy else view
+
+    def tolist(self):
+        return self.view().tolist()
+
+    def __repr__(self):
+        return f"Channel({self.index} of {self.buffer!r})"
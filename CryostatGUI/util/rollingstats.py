@@ -0,0 +1,150 @@
+"""Module containing incremental statistics over a sliding window
+
+Classes:
+    RollingStats: mean, standard deviation and a linear fit of the values
+        in a sliding window, updated in O(1) per sample
+
+Constants:
+    CALCULATIONS, SLOPES: the statistics as calculated over the whole
+        window, which RollingStats reproduces (used by live_Logger_bare)
+"""
+
+import numpy as np
+from numpy.polynomial.polynomial import polyfit as nppolyfit
+
+# reference definitions: calculation name: function of (times, values)
+CALCULATIONS = {
+    "ar_mean": lambda time, value: np.nanmean(value),
+    # 'stddev': lambda time, value: np.nanstd(value),
+    "stderr": lambda time, value: np.nanstd(value) / np.sqrt(len(value)),
+    "stddev_rel": lambda time, value: np.nanstd(value) / np.nanmean(value),
+    "stderr_rel": lambda time, value: np.nanstd(value)
+    / (np.nanmean(value) * np.sqrt(len(value))),
+    # 'test': lambda time, value: print(time),
+    "slope": lambda time, value: nppolyfit(time, value, deg=1, full=True),
+    # 'slope_of_mean': lambda time, value: nppolyfit(time, value, deg=1)[1] * 60
+}
+
+# results derived from the fit of CALCULATIONS["slope"]:
+# name: function of (fit, ar_mean)
+SLOPES = {
+    "slope": lambda value, mean: value[0][1] * 60,  # minutes,
+    # minutes,
+    "slope_rel": lambda value, mean: value[0][1] / mean * 60,
+    "slope_residuals": lambda value, mean: (
+        value[1][0][0] * 60 if len(value[1][0]) > 0 else np.nan
+    ),
+}
+
+
+class RollingStats:
+    """running sums over a sliding window of (time, value) samples
+
+    Values may be scalars, or arrays of channels sharing the same times.
+    NaN values are left out of all sums (like np.nanmean), while the
+    window length n_total, used for the standard error, counts them.
+
+    To keep the sums accurate, times and values enter them relative to
+    an anchor (x0, y0), which is moved to the centre of the current
+    window by recompute(), whenever due() says so.
+
+    The results match CALCULATIONS and SLOPES over the whole window:
+        ar_mean:          np.nanmean(value)
+        stderr:           np.nanstd(value) / np.sqrt(len(value))
+        stddev_rel:       np.nanstd(value) / np.nanmean(value)
+        stderr_rel:       np.nanstd(value) / (np.nanmean(value) * np.sqrt(len(value)))
+        slope:            slope of a linear fit, per minute
+        slope_rel:        slope / ar_mean, per minute
+        slope_residuals:  sum of the squared residuals of the fit, times 60
+    The linear fit only takes the non-NaN values into account.
+    """
+
+    def __init__(self, shape=(), reanchor=600):
+        super().__init__()
+        self.reanchor = reanchor
+        self.n_total = 0
+        self.x0 = 0.0
+        self.y0 = np.zeros(shape)
+        self.n = np.zeros(shape)
+        self.sx = np.zeros(shape)
+        self.sy = np.zeros(shape)
+        self.sxx = np.zeros(shape)
+        self.sxy = np.zeros(shape)
+        self.syy = np.zeros(shape)
+        self._pushed = 0
+
+    def _add(self, x, y, sign):
+        y = np.asarray(y, dtype=float)
+        valid = ~np.isnan(y)
+        dx = np.where(valid, x - self.x0, 0.0)
+        dy = np.where(valid, y - self.y0, 0.0)
+        self.n += sign * valid
+        self.sx += sign * dx
+        self.sy += sign * dy
+        self.sxx += sign * dx * dx
+        self.sxy += sign * dx * dy
+        self.syy += sign * dy * dy
+
+    def push(self, x, y, dropped=None):
+        """add the sample (x, y), remove the sample dropped=(y, x) if given"""
+        self._add(x, y, 1)
+        self.n_total += 1
+        if dropped is not None:
+            self._add(dropped[1], dropped[0], -1)
+            self.n_total -= 1
+        self._pushed += 1
+
+    def due(self):
+        """whether it is time to recompute the sums
+
+        while the window fills up, this happens each time its length
+        doubled, afterwards every `reanchor` samples (amortised O(1))
+        """
+        return self._pushed >= min(self.reanchor, max(self.n_total, 1))
+
+    def recompute(self, times, values):
+        """compute the sums from scratch, anchored at the window centre
+
+        times: 1-D array, values: array with times along the last axis
+        """
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        self.n_total = times.shape[-1]
+        self.n = valid.sum(axis=-1).astype(float)
+        self.x0 = times.mean() if self.n_total else 0.0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            y0 = np.where(valid, values, 0.0).sum(axis=-1) / self.n
+        self.y0 = np.where(self.n > 0, y0, 0.0)
+        dx = np.where(valid, times - self.x0, 0.0)
+        dy = np.where(valid, values - self.y0[..., np.newaxis], 0.0)
+        self.sx = dx.sum(axis=-1)
+        self.sy = dy.sum(axis=-1)
+        self.sxx = (dx * dx).sum(axis=-1)
+        self.sxy = (dx * dy).sum(axis=-1)
+        self.syy = (dy * dy).sum(axis=-1)
+        self._pushed = 0
+
+    def results(self):
+        """dict of all statistics of the current window"""
+        n = self.n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.y0 + self.sy / n
+            syy_c = np.maximum(self.syy - self.sy * self.sy / n, 0.0)
+            sxx_c = self.sxx - self.sx * self.sx / n
+            sxy_c = self.sxy - self.sx * self.sy / n
+            std = np.sqrt(syy_c / n)
+            sqrt_total = np.sqrt(self.n_total)
+            slope = sxy_c / sxx_c
+            residuals = np.maximum(syy_c - sxy_c * sxy_c / sxx_c, 0.0)
+            # a line through two points leaves no residuals to speak of
+            residuals = np.where(n > 2, residuals, np.nan)
+            return dict(
+                ar_mean=mean,
+                stderr=std / sqrt_total,
+                stddev_rel=std / mean,
+                stderr_rel=std / (mean * sqrt_total),
+                slope=slope * 60,
+                slope_rel=slope / mean * 60,
+                slope_residuals=residuals * 60,
+            )
@@ -0,0 +1,69 @@
+"""Module containing the bookkeeping of queue depth and latency of the
+stages of a pipeline, e.g. of the threads of the zmq dataStore
+
+Classes:
+    StageStats: queue depths and latencies of one stage, per report window
+"""
+import math
+import time
+from threading import Lock
+
+
+class StageStats:
+    """queue depths and latencies of one stage of a pipeline
+
+    The stage records the depth of its queue whenever it takes up work
+    (e.g. the number of messages waiting), and the latency of every item
+    (e.g. from being taken up until being done), from its own thread.
+    report() hands out the figures of the window since the last report,
+    from any thread.
+    """
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self._lock = Lock()
+        self._total = 0
+        self._reset()
+
+    def _reset(self):
+        self._since = time.monotonic()
+        self._items = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+        self._depths = 0
+        self._depth_sum = 0
+        self._depth_max = 0
+
+    def depth(self, n):
+        """record the depth of the queue"""
+        with self._lock:
+            self._depths += 1
+            self._depth_sum += n
+            self._depth_max = max(self._depth_max, n)
+
+    def latency(self, seconds):
+        """record the latency of one item"""
+        with self._lock:
+            self._items += 1
+            self._total += 1
+            self._latency_sum += seconds
+            self._latency_max = max(self._latency_max, seconds)
+
+    def report(self):
+        """figures of the window since the last report, starts a new window"""
+        with self._lock:
+            elapsed = time.monotonic() - self._since
+            stats = dict(
+                items=self._items,
+                total=self._total,
+                rate=self._items / elapsed if elapsed > 0 else math.nan,
+                depth_mean=self._depth_sum / self._depths if self._depths else 0.0,
+                depth_max=self._depth_max,
+                latency_mean_s=(
+                    self._latency_sum / self._items if self._items else math.nan
+                ),
+                latency_max_s=self._latency_max if self._items else math.nan,
+            )
+            self._reset()
+        return stats
@@ -62,6 +62,7 @@ from PyQt5.QtWidgets import QSizePolicy
 
 from .customExceptions import BlockedError
 from .customExceptions import ApplicationExit
+from .ringbuffer import RingBuffer
 
 # from zmqcomms import zmqClient
 # from zmqcomms import zmqDataStore
@@ -118,6 +119,7 @@ def calculate_timediff(dt, allowed_delay_s=3):
 
 
 @calculate_timediff.register(list)
+@calculate_timediff.register(RingBuffer)
 def _(dt, allowed_delay_s=3):
     return calculate_timediff(dt[-1], allowed_delay_s)
 
@@ -146,6 +148,59 @@ def _(dt, allowed_delay_s=3):
     return uptodate, timediff
 
 
+# indicators of stability, in the order they are checked
+stability_indicators = (
+    "value",
+    "mean",
+    "stderr_rel",
+    "relslope_Xpmin",
+    "slope_residuals",
+)
+
+
+def check_stability(data, target, thresholds, direction=0, weak=False):
+    """check the stability criteria of a value
+
+    data: dict with the current 'value', and its statistics (see
+        stability_indicators): the running 'mean', the relative standard
+        error 'stderr_rel', the relative slope 'relslope_Xpmin' and the
+        'slope_residuals'
+    thresholds: dict of the thresholds for all of these
+    direction:
+         0: value and mean need to be close to target, the statistics
+            need to be small
+         1: the value needs to be above target
+        -1: the value needs to be below target
+    weak: if True, value and mean may be missing, if the statistics hold
+
+    returns: stable, the fulfilled indicators, the missing indicators
+    """
+    if direction:
+        try:
+            stable = (data["value"] - target) * direction >= 0
+        except TypeError:
+            stable = False
+        return stable, ["value"] if stable else [], [] if stable else ["value"]
+
+    stable_values = []
+    for ct, label in enumerate(stability_indicators):
+        try:
+            vn = data[label]
+            compared_value = abs(vn - target) if ct < 2 else abs(vn)
+            if compared_value < thresholds[label]:
+                stable_values.append(label)
+        except TypeError:
+            # received wrong type (possibly None)
+            continue
+    missing_values = [v for v in stability_indicators if v not in stable_values]
+    stable = len(stable_values) >= len(stability_indicators) or (
+        weak
+        and len(stable_values) >= 3
+        and all(v_missing in missing_values for v_missing in ("value", "mean"))
+    )
+    return stable, stable_values, missing_values
+
+
 def slope_from_timestampX(tmp_):
     """casting datetime into seconds:
     dt = pandas series of datetime objects
@@ -176,8 +231,9 @@ def shaping(entry):
     to prevent mismatches
     possibly this could be avoided with intelligent use of 'zip'
     """
-    ent0 = deepcopy(np.array(entry[0]))
-    ent1 = deepcopy(np.array(entry[1]))
+    # np.array copies, also out of a RingBuffer
+    ent0 = np.array(entry[0])
+    ent1 = np.array(entry[1])
     if ent0.shape > ent1.shape:
         # print('bad shape: ', ent0.shape, ent1.shape, self.legend[ct])
         ent0 = ent0[: len(ent1)]
@@ -196,7 +252,7 @@ def shaping_m(entry):
     to prevent mismatches
     possibly this could be avoided with intelligent use of 'zip'
     """
-    ent = [deepcopy(np.array(entry[i])) for i in range(len(entry))]
+    ent = [np.array(entry[i]) for i in range(len(entry))]
 
     # ent0 = deepcopy(np.array(entry[0]))
     # ent1 = deepcopy(np.array(entry[1]))
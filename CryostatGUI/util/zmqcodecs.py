@@ -0,0 +1,170 @@
+"""Codecs for the messages which are exchanged through zmqcomms
+
+Every message on the wire is in one of two formats:
+    legacy: utf-8 encoded JSON text, optionally preceded by a single
+        command character ('?' or '!') -- the way it has always been sent
+    tagged: b"\\x00" + codec tag + b"\\x00" + command + b"\\x00" + payload
+        the tag carries name and version of the codec, e.g. b"msgpack/1"
+
+Receivers detect the format of every message by themselves, and answers
+are given in the codec of the question. Peers running an older version,
+which only understand JSON, thus keep working as long as they are addressed
+in JSON -- which is the default. A binary codec for the upstream (PUB/SUB)
+should only be switched on once every subscriber understands it.
+
+This module does not depend on the rest of the package, so that the
+brokers can use it when they are run as standalone scripts.
+
+msgpack is an optional dependency, needed for the 'msgpack' codec only.
+"""
+import struct
+import logging
+from datetime import datetime
+from json import loads
+from json import dumps
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger("CryostatGUI.zmqCodecs")
+
+TAG_MARKER = b"\x00"
+
+
+class JsonCodec:
+    """compact JSON, understood by every peer
+
+    timestamps and other non-JSON objects are sent as strings
+    """
+
+    name = "json"
+    tag = None  # sent in the legacy format
+
+    def encode(self, obj) -> bytes:
+        return dumps(obj, separators=(",", ":"), default=str).encode("utf-8")
+
+    def decode(self, data: bytes):
+        return loads(data.decode("utf-8"))
+
+
+class MsgpackCodec:
+    """binary msgpack, with native timestamps and numpy arrays
+
+    datetime objects travel as float POSIX timestamps and come out as
+    (naive, local) datetime objects again, numpy arrays are sent as
+    their raw buffer.
+    """
+
+    name = "msgpack"
+    tag = b"msgpack/1"
+
+    EXT_DATETIME = 1
+    EXT_NDARRAY = 2
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("the msgpack codec needs the msgpack package")
+
+    def _default(self, obj):
+        if isinstance(obj, datetime):
+            return msgpack.ExtType(
+                self.EXT_DATETIME, struct.pack("<d", obj.timestamp())
+            )
+        if isinstance(obj, np.ndarray):
+            header = dumps([obj.dtype.str, obj.shape]).encode("ascii")
+            return msgpack.ExtType(
+                self.EXT_NDARRAY,
+                struct.pack("<H", len(header))
+                + header
+                + np.ascontiguousarray(obj).tobytes(),
+            )
+        if isinstance(obj, np.generic):
+            return obj.item()
+        return str(obj)
+
+    def _ext_hook(self, code, data):
+        if code == self.EXT_DATETIME:
+            return datetime.fromtimestamp(struct.unpack("<d", data)[0])
+        if code == self.EXT_NDARRAY:
+            (length,) = struct.unpack_from("<H", data)
+            dtype, shape = loads(data[2 : 2 + length].decode("ascii"))
+            return np.frombuffer(data, dtype=dtype, offset=2 + length).reshape(shape)
+        return msgpack.ExtType(code, data)
+
+    def encode(self, obj) -> bytes:
+        return msgpack.packb(obj, default=self._default, use_bin_type=True)
+
+    def decode(self, data: bytes):
+        return msgpack.unpackb(
+            data, ext_hook=self._ext_hook, raw=False, strict_map_key=False
+        )
+
+
+CODECS = {"json": JsonCodec, "msgpack": MsgpackCodec}
+_codecs_by_tag = {}
+
+
+def get_codec(name="json"):
+    """return an instance of the codec called name
+
+    falls back to JSON (with a warning) if the codec is not available
+    """
+    if not isinstance(name, str):
+        return name  # already a codec
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"unknown codec '{name}', choose from {list(CODECS)}")
+    except ImportError as e:
+        logger.warning("%s, falling back to json", e)
+        return JsonCodec()
+
+
+def _codec_for_tag(tag):
+    try:
+        return _codecs_by_tag[tag]
+    except KeyError:
+        for cls in CODECS.values():
+            if cls.tag == tag:
+                codec = _codecs_by_tag[tag] = cls()
+                return codec
+        raise ValueError(f"received message in unknown codec '{tag!r}'")
+
+
+_json = JsonCodec()
+
+
+def encode_message(obj, codec=_json, command="") -> bytes:
+    """encode obj, preceded by command ('?', '!' or nothing)"""
+    if codec.tag is None:
+        return command.encode("utf-8") + codec.encode(obj)
+    return b"".join(
+        (
+            TAG_MARKER,
+            codec.tag,
+            TAG_MARKER,
+            command.encode("utf-8"),
+            TAG_MARKER,
+            codec.encode(obj),
+        )
+    )
+
+
+def decode_message(data: bytes):
+    """decode a message in any of the known formats
+
+    returns: command ('?', '!' or ''), the decoded object, and the codec
+        which was used, so the answer can be sent in the same codec
+    """
+    if data[:1] == TAG_MARKER:
+        tag, command, payload = data[1:].split(TAG_MARKER, 2)
+        codec = _codec_for_tag(tag)
+        return command.decode("utf-8"), codec.decode(payload), codec
+    command = ""
+    if data[:1] in (b"?", b"!"):
+        command, data = data[:1].decode("utf-8"), data[1:]
+    return command, (_json.decode(data) if data.strip() else {}), _json
@@ -1,4 +1,6 @@
 import zmq
+import zmq.asyncio
+import asyncio
 import logging
 from json import loads as dictload
 from json import dumps
@@ -12,12 +14,23 @@ from copy import deepcopy
 import uuid
 
 from .customExceptions import problemAbort
-from .customExceptions import successExit
 from .customExceptions import genericAnswer
+from .customExceptions import HandshakeTimeoutError
+from .customExceptions import RequestTimeoutError
+
+from .zmqcodecs import get_codec
+from .zmqcodecs import encode_message
+from .zmqcodecs import decode_message
 
 from .util_misc import ExceptionHandling
+from .util_misc import check_stability
+from .util_misc import stability_indicators
+from .stagestats import StageStats
 
-# from threading import Thread
+import threading
+from threading import Thread
+from threading import Event
+from threading import Lock
 
 # from util import ExceptionHandling
 
@@ -36,6 +49,9 @@ def dictdump(d):
     return dumps(d, indent=4, sort_keys=True, default=str)
 
 
+HANDSHAKE_PREFIX = b"handshake."
+
+
 def HandleJsonException(func):
     @functools.wraps(func)
     def wrapper_HandleJsonException(*args, **kwargs):
@@ -92,48 +108,130 @@ def zmqquery_handle(socket, handlefun):
         # print('nothing to work')
 
 
-def zmqquery(socket, query):
+def zmq_wait(socket, deadline):
+    """block until socket is readable, or the deadline has passed
+
+    deadline: time.monotonic() value, or None to wait forever
+    raises: RequestTimeoutError once the deadline has passed
+    """
+    poller = zmq.Poller()
+    poller.register(socket, zmq.POLLIN)
+    while True:
+        if deadline is None:
+            remaining = None
+        else:
+            remaining = (deadline - time.monotonic()) * 1e3
+            if remaining <= 0:
+                raise RequestTimeoutError("no answer received in time")
+        if poller.poll(remaining):
+            return
+
+
+def zmq_request(socket, message, uuid, timeout, address=None):
+    """send a request and block until the answer with the same uuid arrives
+
+    Answers which carry a different uuid (e.g. late answers to an earlier
+    request which already timed out) are dropped on the way.
+
+    message: encoded request
+    address: identity to send to, through the req-rep broker
+    timeout: seconds to wait for the answer
+    returns: the decoded answer
+    raises: RequestTimeoutError if there was no answer within timeout
+    """
+    if address is None:
+        socket.send(message)
+    else:
+        socket.send_multipart([enc(address), message])
+    deadline = time.monotonic() + timeout
+    while True:
+        zmq_wait(socket, deadline)
+        answer = decode_message(socket.recv())[1]
+        if answer.get("uuid") == uuid:
+            return answer
+        logger.debug(
+            "dropping stale answer, uuid: %s, waiting for: %s",
+            answer.get("uuid"),
+            uuid,
+        )
+
+
+def zmqquery(socket, query, timeout=None):
     # signal.signal(signal.SIGINT, signal.SIG_DFL);
     # context = zmq.Context()
     # socket = context.socket(zmq.REQ)
     # socket.connect("tcp://localhost:5556")
     try:
         socket.send_string(f"{query}")
-        while True:
-            try:
-                message = socket.recv(flags=zmq.NOBLOCK)
-                raise successExit
-            except zmq.Again:
-                time.sleep(0.2)
-                logger.debug("no answer")
-
+        zmq_wait(socket, None if timeout is None else time.monotonic() + timeout)
+        return socket.recv()
     except zmq.ZMQError as e:
         logger.exception(e)
         return -1
-    except successExit:
-        return message
 
 
-def zmqquery_dict(socket, query):
+def zmqquery_dict(socket, query, timeout=None):
     # signal.signal(signal.SIGINT, signal.SIG_DFL);
     # context = zmq.Context()
     # socket = context.socket(zmq.REQ)
     # socket.connect("tcp://localhost:5556")
     try:
         socket.send_string(f"{query}")
-        while True:
-            try:
-                message = socket.recv_json(flags=zmq.NOBLOCK)
-                raise successExit
-            except zmq.Again:
-                time.sleep(0.2)
-                logger.debug("no answer")
-
+        zmq_wait(socket, None if timeout is None else time.monotonic() + timeout)
+        return socket.recv_json()
     except zmq.ZMQError as e:
         logger.exception(e)
         return -1
-    except successExit:
-        return message
+
+
+def zmq_handshake(socket, address, timeout=10):
+    """confirm that a PUB or SUB socket is connected through its broker
+
+    A temporary partner socket of the opposite kind is connected to the
+    other side of the broker (at address), and probe messages on a unique
+    topic are published until one of them arrives at the subscriber.
+    This replaces a blind sleep for the PUB/SUB sockets to find each other.
+    Messages which are not a probe and arrive at a SUB socket during the
+    handshake are dropped.
+
+    returns: the time it took in seconds
+    raises: HandshakeTimeoutError if no probe arrived within timeout seconds
+    """
+    if socket.type == zmq.SUB:
+        pub = partner = socket.context.socket(zmq.PUB)
+        sub = socket
+    else:
+        pub = socket
+        sub = partner = socket.context.socket(zmq.SUB)
+    partner.setsockopt(zmq.LINGER, 0)
+    partner.connect(address)
+
+    topic = HANDSHAKE_PREFIX + uuid.uuid4().hex.encode("ascii")
+    sub.setsockopt(zmq.SUBSCRIBE, topic)
+    poller = zmq.Poller()
+    poller.register(sub, zmq.POLLIN)
+
+    time_start = time.monotonic()
+    try:
+        while time.monotonic() - time_start < timeout:
+            pub.send_multipart([topic, b""])
+            if not poller.poll(20):
+                continue
+            try:
+                while True:
+                    msg = sub.recv_multipart(zmq.NOBLOCK)
+                    if msg[0] == topic:
+                        return time.monotonic() - time_start
+                    logger.debug("dropping message during handshake: %s", msg[0])
+            except zmq.Again:
+                pass
+        raise HandshakeTimeoutError(
+            f"no probe message went through {address} within {timeout}s, "
+            "is the broker running?"
+        )
+    finally:
+        sub.setsockopt(zmq.UNSUBSCRIBE, topic)
+        partner.close()
 
 
 # def raiseProblemAbort(_f=None, raising=False):
@@ -176,32 +274,43 @@ class loops_off_zmq:
         self.control = control
 
     def __enter__(self, *args, **kwargs):
-        for dev in self.devices:
-            # self.control.commanding(
-            #     dev, dictdump({"lock": None}),
-            # )
-            self.control._logger.debug("locking device %s", dev)
-            self.control.query_device_command(
-                dev,
-                command={"lock": None},
-            )
+        # all devices are locked in one round trip through the broker
+        self.control._logger.debug("locking devices %s", self.devices)
+        answers, errors = self.control.query_devices_command(
+            self.devices, command={"lock": None}
+        )
+        if errors:
+            self.control._logger.error("could not lock devices: %s", errors)
+            # do not leave the others locked
+            self.control.query_devices_command(list(answers), command={"unlock": None})
+            raise problemAbort(f"could not lock devices: {list(errors)}, abort")
 
     def __exit__(self, *args, **kwargs):
-        for dev in self.devices:
-            # self.control.commanding(
-            #     dev, dictdump({"lock": None}),
-            # )
-            self.control._logger.debug("unlocking device %s", dev)
-            self.control.query_device_command(
-                dev,
-                command={"unlock": None},
-            )
+        self.control._logger.debug("unlocking devices %s", self.devices)
+        answers, errors = self.control.query_devices_command(
+            self.devices, command={"unlock": None}
+        )
+        if errors:
+            self.control._logger.error("could not unlock devices: %s", errors)
 
 
 class zmqBare:
     """docstring for zmqBare"""
 
-    pass
+    zmq_reactor = False
+
+    def zmq_serve(self, timeout):
+        """reactor: block on the poller for up to timeout seconds
+
+        every message is handled as soon as it arrives, instead of
+        waiting for the next loop iteration to come by
+        """
+        deadline = time.monotonic() + timeout
+        remaining = timeout
+        while remaining > 0:
+            if self.poller.poll(remaining * 1e3):
+                self.zmq_handle()
+            remaining = deadline - time.monotonic()
 
 
 class zmqClient(zmqBare):
@@ -216,6 +325,11 @@ class zmqClient(zmqBare):
         port_reqp=5556,
         port_downstream=5561,
         port_upstream=5560,
+        port_handshake_downstream=5562,
+        port_handshake_upstream=5559,
+        handshake_timeout=10,
+        zmq_reactor=False,
+        codec="json",
         **kwargs,
     ):
         # print('zmqClient')
@@ -224,6 +338,7 @@ class zmqClient(zmqBare):
             "CryoGUI." + __name__ + "." + self.__class__.__name__
         )
         self.comms_name = identity
+        self.codec = get_codec(codec)
         self._zctx = context or zmq.Context()
 
         # setting up dealer-router-dealer through broker comms
@@ -253,10 +368,22 @@ class zmqClient(zmqBare):
         self.poller.register(self.comms_tcp, zmq.POLLIN)
         self.poller.register(self.comms_downstream, zmq.POLLIN)
 
-        time.sleep(4)
-        # sleep needed for the PUB/SUB sockets to find each other!
+        # make sure the PUB/SUB sockets found each other through the brokers
+        zmq_handshake(
+            self.comms_downstream,
+            f"tcp://{ip_maincontrol}:{port_handshake_downstream}",
+            timeout=handshake_timeout,
+        )
+        zmq_handshake(
+            self.comms_upstream,
+            f"tcp://{ip_data}:{port_handshake_upstream}",
+            timeout=handshake_timeout,
+        )
 
         self.data = {}
+        self.zmq_reactor = zmq_reactor
+        self._zmq_running_now = False
+        self._zmq_lock_deferred = None
 
     def act_on_general(self, command_dict):
         try:
@@ -268,12 +395,24 @@ class zmqClient(zmqBare):
                 self.setInterval(command_dict["interval"])
             if "lock" in command_dict:
                 self._logger.debug("   locking the loop now")
-                if not self.lock.acquire(blocking=False):
+                if self._zmq_running_now:
+                    # the loop holds its own lock while running(),
+                    # it is kept locked once the hardware cycle is done
+                    self._zmq_lock_deferred = "lock"
+                elif not self.lock.acquire(blocking=False):
                     self._logger.warning(
                         "tried to lock this loop, but it is locked already! "
                     )
             elif "unlock" in command_dict:
                 self._logger.debug("un-locking the loop now")
+                if self._zmq_running_now:
+                    # the lock is the one held by the loop for running(),
+                    # it must not be released from here
+                    if self._zmq_lock_deferred == "lock":
+                        self._zmq_lock_deferred = None
+                    else:
+                        self._zmq_lock_deferred = "unlock"
+                    return
                 try:
                     self.lock.release()
                 except RuntimeError:
@@ -295,24 +434,20 @@ class zmqClient(zmqBare):
                 while True:
                     # self._logger.debug("zmq: handling tcp")
                     msg = self.comms_tcp.recv(zmq.NOBLOCK)
-                    if dec(msg)[0] == "?":
+                    # answer in the codec of the question
+                    command, command_dict, codec = decode_message(msg)
+                    if command == "?":
                         # answer = retrieve_answer(dec(msg))
-                        try:
-                            command_dict = dictload(dec(msg)[1:])
-                            answer = deepcopy(self.data)
-                            for keycopy in ("uuid", "deliverto"):
-                                try:
-                                    answer[keycopy] = command_dict[keycopy]
-                                except KeyError:
-                                    pass
-                        except IndexError:
-                            answer = self.data
-                        answer = enc(dictdump(answer))
-                        self.comms_tcp.send(answer)
+                        answer = deepcopy(self.data)
+                        for keycopy in ("uuid", "deliverto"):
+                            try:
+                                answer[keycopy] = command_dict[keycopy]
+                            except KeyError:
+                                pass
+                        self.comms_tcp.send(encode_message(answer, codec))
                         # self._logger.debug("zmq: answered tcp")
 
-                    elif dec(msg)[0] == "!":
-                        command_dict = dictload(dec(msg)[1:])
+                    elif command == "!":
                         self.act_on_general(command_dict)
                         answer = self.query_on_command(command_dict)
                         try:
@@ -328,14 +463,15 @@ class zmqClient(zmqBare):
                                 uuid=command_dict["uuid"],
                                 deliverto=command_dict["deliverto"],
                             )
-                        self.comms_tcp.send(enc(dictdump(answer)))
+                        self.comms_tcp.send(encode_message(answer, codec))
                         # self._logger.debug("zmq: answered tcp")
 
                     else:
                         self._logger.error(
-                            "received unintelligable message: '%s' ", dec(msg)
+                            "received unintelligable message: '%s' ", msg
                         )
-                        self.comms_tcp.send(enc(dictdump({"ERROR": True}) + dec(msg)))
+                        answer = dict(ERROR=True, message=command_dict)
+                        self.comms_tcp.send(encode_message(answer, codec))
                         # self._logger.debug("zmq: answered tcp: ERROR")
 
             except zmq.Again:
@@ -345,7 +481,7 @@ class zmqClient(zmqBare):
                 while True:
                     # self._logger.debug("zmq: handling downstream")
                     msg = self.comms_downstream.recv_multipart(zmq.NOBLOCK)
-                    command_dict = dictload(dec(msg[1]))
+                    command_dict = decode_message(msg[1])[1]
                     self._logger.info(
                         "received command from downstream: %s", command_dict
                     )
@@ -356,6 +492,35 @@ class zmqClient(zmqBare):
             except zmq.Again:
                 pass
 
+    def zmq_interleave(self):
+        """handle pending messages in the middle of a hardware cycle
+
+        to be called from within running(), e.g. between two slow
+        device queries, so that commands do not need to wait for the
+        whole cycle to finish. Only active in reactor mode.
+        """
+        if not self.zmq_reactor:
+            return
+        self._zmq_running_now = True
+        try:
+            self.zmq_handle()
+        finally:
+            self._zmq_running_now = False
+
+    def zmq_deferred_lock(self):
+        """lock or unlock the loop, if a command arrived during running()"""
+        deferred, self._zmq_lock_deferred = self._zmq_lock_deferred, None
+        if deferred == "lock":
+            if not self.lock.acquire(blocking=False):
+                self._logger.warning(
+                    "tried to lock this loop, but it is locked already! "
+                )
+        elif deferred == "unlock":
+            try:
+                self.lock.release()
+            except RuntimeError:
+                self._logger.warning("tried to unlock this loop, but it is not locked!")
+
     def act_on_command(self, command: dict) -> None:
         raise NotImplementedError
 
@@ -366,13 +531,20 @@ class zmqClient(zmqBare):
         self.data["noblock"] = False
         self.data["realtime"] = dt.now()
         self.comms_upstream.send_multipart(
-            [self.comms_name.encode("ascii"), enc(dictdump(self.data))]
+            [self.comms_name.encode("ascii"), encode_message(self.data, self.codec)]
         )
 
 
 class zmqMainControl(zmqBare):
     """docstring for zmqDev"""
 
+    # seconds the dataStore may hold a request of readDataFromList,
+    # until the requested data is up to date
+    readData_wait = 2.0
+    # seconds the dataStore may hold a request of watchStable,
+    # until the value is stable
+    watch_wait = 5.0
+
     def __init__(
         self,
         context=None,
@@ -383,6 +555,9 @@ class zmqMainControl(zmqBare):
         port_downstream=5562,
         # port_upstream=5558,
         port_data=5563,
+        port_handshake_downstream=5561,
+        handshake_timeout=10,
+        codec="json",
         **kwargs,
     ):
         super().__init__(**kwargs)
@@ -390,6 +565,9 @@ class zmqMainControl(zmqBare):
             "CryoGUI." + __name__ + "." + self.__class__.__name__
         )
         self.comms_name = _ident
+        self.codec = get_codec(codec)
+        # questions registered with the dataStore, by handle
+        self._prepared_queries = {}
         self._zctx = context or zmq.Context()
         self.comms_tcp = self._zctx.socket(zmq.DEALER)
         self.comms_tcp.identity = enc(_ident)  # id
@@ -413,9 +591,13 @@ class zmqMainControl(zmqBare):
         self.poller.register(self.comms_tcp, zmq.POLLIN)
         self.poller.register(self.comms_inproc, zmq.POLLIN)
 
-        time.sleep(4)
+        # make sure the PUB/SUB sockets found each other through the broker
+        zmq_handshake(
+            self.comms_downstream,
+            f"tcp://{ip_maincontrol}:{port_handshake_downstream}",
+            timeout=handshake_timeout,
+        )
         self._logger.info("mainControl zmq initialisation finished!")
-        # needed for the PUB/SUB sockets to find each other!
 
     def zmq_handle(self):
         evts = dict(self.poller.poll(zmq.DONTWAIT))
@@ -438,7 +620,7 @@ class zmqMainControl(zmqBare):
             try:
                 while True:
                     address, message = self.comms_inproc.recv_multipart(zmq.NOBLOCK)
-                    if dec(message)[0] == "?":
+                    if decode_message(message)[0] == "?":
                         pass
                         # do something - here, most likely a query is passed on to
                         # the dataStore, and the answer is returned in turn
@@ -450,31 +632,38 @@ class zmqMainControl(zmqBare):
                 pass
 
     def commanding(self, ID, message):
+        """send a command downstream, message is a dict or a JSON string"""
         # self.comms_downstream.send_multipart([ID.encode('asii'), enc(message)])
-        self._logger.debug(
-            "sending command to %s: %s",
-            ID,
-            message.replace("\n", " ").replace("\r", ""),
-        )
-        self.comms_downstream.send_multipart([enc(ID), enc(message)])
+        self._logger.debug("sending command to %s: %s", ID, message)
+        if isinstance(message, dict):
+            message = encode_message(message, self.codec)
+        else:
+            message = enc(message)
+        self.comms_downstream.send_multipart([enc(ID), message])
+
+    def _bare_retrieveDataIndividual(
+        self, dataindicator1, dataindicator2, Live=True, wait=None, newer_than=None
+    ):
+        """retrieve one value from the dataStore
 
-    def _bare_retrieveDataIndividual(self, dataindicator1, dataindicator2, Live=True):
+        wait: seconds the dataStore may hold the request, until the
+            data is up to date (and newer than newer_than, seconds since
+            the epoch), the answer then states whether it is 'fresh'
+        """
         uuid_now = uuid.uuid4().hex
-        message = enc(
-            "?"
-            + dictdump(
-                dict(
-                    instr=dataindicator1, value=dataindicator2, live=Live, uuid=uuid_now
-                )
-            )
+        question = dict(
+            instr=dataindicator1, value=dataindicator2, live=Live, uuid=uuid_now
         )
+        if wait:
+            question.update(wait=wait, newer_than=newer_than)
+        message = encode_message(question, self.codec, "?")
         try:
             message = self._bare_requestData_retries(
                 message,
-                fun_send=self.comms_data.send,
-                fun_recv=self.comms_data.recv,
+                socket=self.comms_data,
                 id_send=None,
                 uuid=uuid_now,
+                timeout=7.5 + (wait or 0),
             )
             return message
         except zmq.ZMQError as e:
@@ -493,21 +682,19 @@ class zmqMainControl(zmqBare):
             is actually up to date (as is done here in _bare_readDataFromList)
         """
         uuid_now = uuid.uuid4().hex
-        message = enc(
-            "?"
-            + dictdump(
-                dict(
-                    multiple=dataindicators,
-                    live=Live,
-                    uuid=uuid_now,
-                )
-            )
+        message = encode_message(
+            dict(
+                multiple=dataindicators,
+                live=Live,
+                uuid=uuid_now,
+            ),
+            self.codec,
+            "?",
         )
         try:
             message = self._bare_requestData_retries(
                 message,
-                fun_send=self.comms_data.send,
-                fun_recv=self.comms_data.recv,
+                socket=self.comms_data,
                 id_send=None,
                 uuid=uuid_now,
             )
@@ -517,88 +704,143 @@ class zmqMainControl(zmqBare):
             # raise problemAbort("")
             return None  # , "zmq error, no data available, abort"
 
+    def prepareDataMultiple(self, dataindicators: dict, Live=True):
+        """register the question of retrieveDataMultiple with the dataStore
+
+        returns: a handle for retrieveDataPrepared
+        """
+        handle = uuid.uuid4().hex
+        self._prepared_queries[handle] = dataindicators, Live
+        self._prepare(handle)
+        return handle
+
+    def _prepare(self, handle):
+        dataindicators, Live = self._prepared_queries[handle]
+        uuid_now = uuid.uuid4().hex
+        message = encode_message(
+            dict(prepare=dataindicators, live=Live, handle=handle, uuid=uuid_now),
+            self.codec,
+            "?",
+        )
+        return self._bare_requestData_retries(
+            message, socket=self.comms_data, id_send=None, uuid=uuid_now
+        )
+
+    def retrieveDataPrepared(self, handle, wait=None):
+        """retrieve the values of a question registered with prepareDataMultiple
+
+        returns: the answer, its 'data' is the list of values, in the
+            order of the dataindicators, 'uptodate' is for all of them
+        """
+        while True:
+            uuid_now = uuid.uuid4().hex
+            question = dict(handle=handle, uuid=uuid_now)
+            if wait:
+                question.update(wait=wait)
+            answer = self._bare_requestData_retries(
+                encode_message(question, self.codec, "?"),
+                socket=self.comms_data,
+                id_send=None,
+                uuid=uuid_now,
+                timeout=7.5 + (wait or 0),
+            )
+            if not answer.get("unknown"):
+                return answer
+            # the dataStore does not know the handle (anymore)
+            self._logger.debug("preparing handle %s again", handle)
+            self._prepare(handle)
+
+    def watchStable(
+        self,
+        dataindicator1,
+        dataindicator2,
+        target,
+        thresholds,
+        direction=0,
+        weak=False,
+        wait=None,
+    ):
+        """ask the dataStore whether a value is stable
+
+        The dataStore checks the criteria (see util_misc.check_stability)
+        on every sample it receives, and answers as soon as they hold,
+        or after wait seconds (default: watch_wait). The answer holds
+        'stable', the 'data' which was checked, the 'stable_values' and
+        the 'missing_values'.
+        """
+        wait = self.watch_wait if wait is None else wait
+        uuid_now = uuid.uuid4().hex
+        message = encode_message(
+            dict(
+                watch=dict(
+                    instr=dataindicator1,
+                    value=dataindicator2,
+                    target=target,
+                    thresholds=thresholds,
+                    direction=direction,
+                    weak=weak,
+                ),
+                wait=wait,
+                uuid=uuid_now,
+            ),
+            self.codec,
+            "?",
+        )
+        return self._bare_requestData_retries(
+            message,
+            socket=self.comms_data,
+            id_send=None,
+            uuid=uuid_now,
+            timeout=7.5 + wait,
+        )
+
     def _bare_requestData_retries(
         self,
         message,
-        fun_send,
-        fun_recv,
+        socket,
         id_send=None,
         retries_n1=10,
         retries_n2=5,
         uuid=None,
+        timeout=None,
+        retry_interval=0.1,
     ):
-        if id_send:
-            fun_send([enc(id_send), enc(message)])
-            self._logger.debug("sending message: %s", [enc(id_send), enc(message)])
-        else:
-            fun_send(message)
-            self._logger.debug("sending message: %s", message)
-
-        time_start = dt.now()
-        uuid_back = ""
+        """send a request and wait for the answer carrying the same uuid
 
-        while uuid != uuid_back:
+        timeout: seconds to wait for the answer, by default derived from
+            retries_n1 and retries_n2, as long as the former polling
+            loop was waiting (7.5s)
+        if the answer is an error which asks to be retried, the request
+        is sent again after retry_interval seconds, with a fresh timeout
+        """
+        if timeout is None:
+            timeout = retries_n2 * (retries_n1 * 0.1 + 0.5)
+        while True:
+            self._logger.debug("sending message to %s: %s", id_send, message)
             try:
-                for _ in range(retries_n2):
-                    for _ in range(retries_n1):
-                        try:
-                            # if id_send:
-                            msg = fun_recv(flags=zmq.NOBLOCK)
-                            self._logger.debug("received message: %s", msg)
-                            answer = dictload(dec(msg))
-                            uuid_back = answer["uuid"]
-                            self._logger.debug(
-                                "received answer, comparing uuids: forward: %s, back: %s",
-                                uuid,
-                                uuid_back,
-                            )
-                            if "ERROR" in answer:
-                                self._logger.warning(
-                                    "received error from data source: %s -- %s",
-                                    answer["ERROR_message"],
-                                    answer["info"],
-                                )
-                                try:
-                                    if answer["retry"] is True:
-                                        self._logger.debug(
-                                            "retry in error is True, requesting again"
-                                        )
-                                        answer = self._bare_requestData_retries(
-                                            message,
-                                            fun_send,
-                                            fun_recv,
-                                            id_send,
-                                            retries_n1,
-                                            retries_n2,
-                                            uuid,
-                                        )
-                                    else:
-                                        self._logger.debug(
-                                            "retry in error is False, aborting"
-                                        )
-                                        raise KeyError  # not really the KeyError, but less copying of vode
-                                except KeyError:
-                                    raise problemAbort(
-                                        "problem with data retrieval, possibly the requested data is missing"
-                                    )
-                            raise successExit
-                        except zmq.Again:
-                            time.sleep(0.1)
-                    self._logger.debug("no answer after 5 trials, sleeping for a while")
-                    time.sleep(0.5)
-                time_delta = (dt.now() - time_start).seconds
+                answer = zmq_request(socket, message, uuid, timeout, address=id_send)
+            except RequestTimeoutError:
                 self._logger.warning(
-                    "got no answer from dataStorage within %.0fs", time_delta
+                    "got no answer from %s within %.1fs",
+                    "dataStorage" if id_send is None else id_send or "broker (batch)",
+                    timeout,
                 )
                 raise problemAbort("data source unresponsive, abort")
-            # except zmq.ZMQError as e:
-            #     self._logger.exception(e)
-            #     # raise problemAbort("")
-            #     return None, None
-            except successExit:
-                # self._logger.debug("received answer, comparing uuids: forward: %s, back: %s", uuid, uuid_back)
-                pass
-        return answer
+            self._logger.debug("received answer, uuid: %s", uuid)
+            if "ERROR" not in answer:
+                return answer
+            self._logger.warning(
+                "received error from data source: %s -- %s",
+                answer.get("ERROR_message"),
+                answer.get("info"),
+            )
+            if answer.get("retry", False) is not True:
+                self._logger.debug("retry in error is False, aborting")
+                raise problemAbort(
+                    "problem with data retrieval, possibly the requested data is missing"
+                )
+            self._logger.debug("retry in error is True, requesting again")
+            time.sleep(retry_interval)
 
     @ExceptionHandling
     def _bare_readDataFromList(
@@ -626,10 +868,13 @@ class zmqMainControl(zmqBare):
                     dataindicator1=dataindicator1,
                     dataindicator2=dataindicator2,
                     Live=Live,
+                    wait=self.readData_wait,
                 )
                 uptodate = dataPackage["uptodate"]
                 if not uptodate:
-                    time.sleep(0.2)
+                    if "fresh" not in dataPackage:
+                        # the dataStore did not hold the request
+                        time.sleep(0.2)
                     if (dt.now() - startdate) / dtdelta(minutes=1) > 2:
                         self._logger.error(
                             "retrieved data %s, %s exists, but after trying for 2min, there is none which is up to date, aborting",
@@ -672,8 +917,12 @@ class zmqMainControl(zmqBare):
         #     return None, e
 
     # @raiseProblemAbort(raising=False)
-    def retrieveDataIndividual(self, dataindicator1, dataindicator2, Live=True):
-        return self._bare_retrieveDataIndividual(dataindicator1, dataindicator2, Live)
+    def retrieveDataIndividual(
+        self, dataindicator1, dataindicator2, Live=True, wait=None, newer_than=None
+    ):
+        return self._bare_retrieveDataIndividual(
+            dataindicator1, dataindicator2, Live, wait=wait, newer_than=newer_than
+        )
 
     # @raiseProblemAbort(raising=False)
     def readDataFromList(
@@ -684,37 +933,324 @@ class zmqMainControl(zmqBare):
     def query_device_data(self, device_id, noblock=False):
         """query data from device directly"""
         uuid_now = uuid.uuid4().hex
-        data = "?" + dictdump({"uuid": uuid_now})
+        data = encode_message({"uuid": uuid_now}, self.codec, "?")
         return self._query_device_ensureResult(device_id, data, uuid_now)
 
     def query_device_command(self, device_id, command=None, **kwargs):
         """dictate action and return answer"""
         uuid_now = uuid.uuid4().hex
         command.update({"uuid": uuid_now})
-        data = "!" + dictdump(command)
+        data = encode_message(command, self.codec, "!")
         # return self._query_device(device_id, data, noblock=noblock)
         return self._query_device_ensureResult(device_id, data, uuid_now, **kwargs)
 
+    def query_devices_command(self, device_ids, command=None, timeout=5):
+        """dictate the same action to several devices in one round trip
+
+        the broker sends the command to all devices at once, and answers
+        when every device answered, or after timeout seconds
+
+        returns:
+            answers: dict of the answers of all devices which answered
+                without an error
+            errors: dict of error messages, for every device which
+                answered with an error, or did not answer in time
+        """
+        uuid_now = uuid.uuid4().hex
+        batch = dict(
+            devices=list(device_ids), command=command, timeout=timeout, uuid=uuid_now
+        )
+        data = encode_message(batch, self.codec, "!")
+        answer = self._bare_requestData_retries(
+            message=data,
+            socket=self.comms_tcp,
+            id_send="",  # the broker's batch address
+            uuid=uuid_now,
+            timeout=timeout + 2,
+        )
+        return answer["answers"], answer["errors"]
+
     def _query_device_ensureResult(self, device_id, msg, uuid_now, **kwargs):
-        address = device_id
-        message = {"uuid": ""}
-        while uuid_now != message["uuid"]:
-            self._logger.debug(
-                "querying (ensureResult) %s, uuid: %s: %s",
-                address,
-                uuid_now,
-                msg.replace("\n", " ").replace("\r", ""),
+        """answers with a different uuid are dropped by zmq_request"""
+        self._logger.debug(
+            "querying (ensureResult) %s, uuid: %s: %s",
+            device_id,
+            uuid_now,
+            msg,
+        )
+        return self._bare_requestData_retries(
+            message=msg,
+            socket=self.comms_tcp,
+            id_send=device_id,
+            uuid=uuid_now,
+            **kwargs,
+        )
+
+
+class zmqMainControlAsync:
+    """asyncio variant of zmqMainControl, for concurrent requests
+
+    Any number of uuid-tagged requests can be in flight at the same time
+    over the same DEALER socket, a receiver task per socket hands every
+    answer to the request waiting for its uuid, e.g.:
+
+        control = zmqMainControlAsync()
+
+        async def measure():
+            return await control.gather(
+                dict(
+                    temp=control.readDataFromList("LakeShore350", "Sensor_1_K"),
+                    V1=control.query_device_command(
+                        "Keithley2182_1", command={"measure_Voltage": None}
+                    ),
+                    V2=control.query_device_command(
+                        "Keithley2182_2", command={"measure_Voltage": None}
+                    ),
+                    field=control.readDataFromList("IPS", "FIELD_output"),
+                )
             )
-            message = self._bare_requestData_retries(
-                message=msg,
-                fun_send=self.comms_tcp.send_multipart,
-                fun_recv=self.comms_tcp.recv,
-                id_send=address,
-                uuid=uuid_now,
-                **kwargs,
+
+        results = control.run(measure())  # or: await measure()
+
+    run() is the sync facade: it executes a coroutine on a background
+    event loop owned by this instance and blocks until it is finished.
+    Within one instance, either use run() or a single event loop of
+    your own, not both.
+
+    Commands downstream (PUB) are not part of this class, they do not
+    wait for an answer anyway, see zmqMainControl.commanding.
+    """
+
+    readData_wait = zmqMainControl.readData_wait
+    watch_wait = zmqMainControl.watch_wait
+
+    def __init__(
+        self,
+        context=None,
+        _ident="mainControlAsync",
+        ip_maincontrol="127.0.0.1",
+        ip_data="localhost",
+        port_reqp_c=5564,
+        port_data=5563,
+        codec="json",
+        timeout=7.5,
+        retry_interval=0.1,
+    ):
+        super().__init__()
+        self._logger = logging.getLogger(
+            "CryoGUI." + __name__ + "." + self.__class__.__name__
+        )
+        self.comms_name = _ident
+        self.codec = get_codec(codec)
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+
+        self._zctx = context or zmq.asyncio.Context()
+        self.comms_tcp = self._zctx.socket(zmq.DEALER)
+        self.comms_tcp.identity = enc(_ident)  # id
+        self.comms_tcp.connect(f"tcp://{ip_maincontrol}:{port_reqp_c}")
+
+        self.comms_data = self._zctx.socket(zmq.DEALER)
+        self.comms_data.identity = enc(_ident)  # id
+        self.comms_data.connect(f"tcp://{ip_data}:{port_data}")
+
+        self._pending = {}  # uuid: future waiting for the answer
+        self._receivers = []
+        self._loop = None  # background event loop for run()
+
+    def _start_receivers(self):
+        if not self._receivers:
+            for socket in (self.comms_tcp, self.comms_data):
+                self._receivers.append(asyncio.ensure_future(self._receive(socket)))
+
+    async def _receive(self, socket):
+        """hand every answer to the request waiting for it"""
+        while True:
+            msg = await socket.recv()
+            try:
+                answer = decode_message(msg)[1]
+            except ValueError as e:
+                self._logger.error("could not decode answer %s: %s", msg, e)
+                continue
+            future = self._pending.pop(answer.get("uuid"), None)
+            if future is None or future.done():
+                self._logger.debug(
+                    "dropping stale answer, uuid: %s", answer.get("uuid")
+                )
+                continue
+            future.set_result(answer)
+
+    async def _request(self, socket, payload, command, address=None, timeout=None):
+        """send a request and wait for its answer
+
+        handles errors in answers the same way as
+        zmqMainControl._bare_requestData_retries
+        """
+        timeout = self.timeout if timeout is None else timeout
+        self._start_receivers()
+        while True:
+            uuid_now = uuid.uuid4().hex
+            payload["uuid"] = uuid_now
+            message = encode_message(payload, self.codec, command)
+            future = asyncio.get_running_loop().create_future()
+            self._pending[uuid_now] = future
+            try:
+                if address is None:
+                    await socket.send(message)
+                else:
+                    await socket.send_multipart([enc(address), message])
+                answer = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                self._logger.warning(
+                    "got no answer from %s within %.1fs",
+                    "dataStorage" if address is None else address or "broker (batch)",
+                    timeout,
+                )
+                raise problemAbort("data source unresponsive, abort")
+            finally:
+                self._pending.pop(uuid_now, None)
+            if "ERROR" not in answer:
+                return answer
+            self._logger.warning(
+                "received error from data source: %s -- %s",
+                answer.get("ERROR_message"),
+                answer.get("info"),
             )
-            self._logger.debug("received data uuid: %s", message["uuid"])
-        return message  # dictload(dec(msg)) already done
+            if answer.get("retry", False) is not True:
+                raise problemAbort(
+                    "problem with data retrieval, possibly the requested data is missing"
+                )
+            await asyncio.sleep(self.retry_interval)
+
+    async def retrieveDataIndividual(
+        self,
+        dataindicator1,
+        dataindicator2,
+        Live=True,
+        timeout=None,
+        wait=None,
+        newer_than=None,
+    ):
+        """wait, newer_than: see zmqMainControl.retrieveDataIndividual"""
+        question = dict(instr=dataindicator1, value=dataindicator2, live=Live)
+        if wait:
+            question.update(wait=wait, newer_than=newer_than)
+            timeout = (self.timeout if timeout is None else timeout) + wait
+        return await self._request(self.comms_data, question, "?", timeout=timeout)
+
+    async def retrieveDataMultiple(self, dataindicators: dict, Live=True, timeout=None):
+        """dataindicators: see zmqMainControl.retrieveDataMultiple"""
+        return await self._request(
+            self.comms_data,
+            dict(multiple=dataindicators, live=Live),
+            "?",
+            timeout=timeout,
+        )
+
+    async def readDataFromList(
+        self, dataindicator1: str, dataindicator2: str, Live: bool = False
+    ) -> float:
+        """retrieve a datapoint from dataStorage, waiting until it is up to date
+
+        see zmqMainControl._bare_readDataFromList
+        """
+        startdate = dt.now()
+        while True:
+            dataPackage = await self.retrieveDataIndividual(
+                dataindicator1, dataindicator2, Live=Live, wait=self.readData_wait
+            )
+            if dataPackage["uptodate"]:
+                return dataPackage["data"]
+            if (dt.now() - startdate) / dtdelta(minutes=1) > 2:
+                raise problemAbort(
+                    f"no up-to-date data available for {dataindicator1}, {dataindicator2}, abort"
+                )
+            if "fresh" not in dataPackage:
+                await asyncio.sleep(0.2)
+
+    async def watchStable(
+        self,
+        dataindicator1,
+        dataindicator2,
+        target,
+        thresholds,
+        direction=0,
+        weak=False,
+        wait=None,
+    ):
+        """see zmqMainControl.watchStable"""
+        wait = self.watch_wait if wait is None else wait
+        watch = dict(
+            instr=dataindicator1,
+            value=dataindicator2,
+            target=target,
+            thresholds=thresholds,
+            direction=direction,
+            weak=weak,
+        )
+        return await self._request(
+            self.comms_data,
+            dict(watch=watch, wait=wait),
+            "?",
+            timeout=self.timeout + wait,
+        )
+
+    async def query_device_data(self, device_id, timeout=None):
+        """query data from device directly"""
+        return await self._request(
+            self.comms_tcp, {}, "?", address=device_id, timeout=timeout
+        )
+
+    async def query_device_command(self, device_id, command=None, timeout=None):
+        """dictate action and return answer"""
+        return await self._request(
+            self.comms_tcp,
+            dict(command or {}),
+            "!",
+            address=device_id,
+            timeout=timeout,
+        )
+
+    async def query_devices_command(self, device_ids, command=None, timeout=5):
+        """dictate the same action to several devices in one round trip
+
+        see zmqMainControl.query_devices_command
+        """
+        answer = await self._request(
+            self.comms_tcp,
+            dict(devices=list(device_ids), command=command, timeout=timeout),
+            "!",
+            address="",  # the broker's batch address
+            timeout=timeout + 2,
+        )
+        return answer["answers"], answer["errors"]
+
+    async def gather(self, requests: dict) -> dict:
+        """await all coroutines in requests concurrently
+
+        returns: dict of the answers, with the same keys as requests
+        """
+        answers = await asyncio.gather(*requests.values())
+        return dict(zip(requests, answers))
+
+    def run(self, coro):
+        """sync facade: run coro on the background event loop, block for its result"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            Thread(
+                target=self._loop.run_forever,
+                name=f"{self.comms_name}_eventloop",
+                daemon=True,
+            ).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self):
+        for receiver in self._receivers:
+            receiver.get_loop().call_soon_threadsafe(receiver.cancel)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self.comms_tcp.close(linger=0)
+        self.comms_data.close(linger=0)
 
 
 class zmqDataStore(zmqBare):
@@ -730,6 +1266,12 @@ class zmqDataStore(zmqBare):
         port_downstream=5557,
         port_upstream=5559,
         port_data=5563,
+        port_handshake_upstream=5560,
+        port_handshake_downstream=None,
+        handshake_timeout=10,
+        zmq_reactor=False,
+        max_wait=60,
+        max_prepared=256,
         **kwargs,
     ):
         super().__init__(**kwargs)
@@ -737,6 +1279,16 @@ class zmqDataStore(zmqBare):
             "CryoGUI." + __name__ + "." + self.__class__.__name__
         )
         self.comms_name = _ident
+        self.zmq_reactor = zmq_reactor
+        # held requests (long-poll), see question_to_self
+        self.max_wait = max_wait
+        self._waiting = []
+        # prepared queries by handle, the oldest are dropped first
+        self.max_prepared = max_prepared
+        self._prepared = {}
+        # separate threads for ingest and questions, see start_pipeline
+        self.pipeline_running = False
+        self.pipeline_stats = {}
         self._zctx = context or zmq.Context()
         self.comms_tcp = self._zctx.socket(zmq.DEALER)
         self.comms_tcp.identity = b"dataStore"  # id
@@ -762,24 +1314,57 @@ class zmqDataStore(zmqBare):
         self.poller.register(self.comms_downstream, zmq.POLLIN)
         self.poller.register(self.comms_data, zmq.POLLIN)
 
-        time.sleep(4)
-        # needed for the PUB/SUB sockets to find each other!
+        # make sure the PUB/SUB sockets found each other through the brokers
+        zmq_handshake(
+            self.comms_upstream,
+            f"tcp://{ip_data}:{port_handshake_upstream}",
+            timeout=handshake_timeout,
+        )
+        if port_handshake_downstream is not None:
+            # by default, no broker serves port_downstream=5557
+            zmq_handshake(
+                self.comms_downstream,
+                f"tcp://{ip_maincontrol}:{port_handshake_downstream}",
+                timeout=handshake_timeout,
+            )
 
-    def question_to_self(self, msg):
-        if dec(msg)[0] == "?":
-            try:
-                questiondict = dictload(dec(msg)[1:])
-                self._logger.debug("received questiondict: %s", questiondict)
-                answer = self.get_answer(questiondict)
-            except decoder.JSONDecodeError as e:
-                answer = dict(
-                    ERROR="ERROR",
-                    ERROR_message=e.args[0],
-                    info="something went wrong when decoding your json",
-                    retry=False,
-                )
+    def question_to_self(self, msg, reply=None):
+        """answer a question, encoded in the same codec as the question
 
-        else:
+        A question with 'wait' (seconds) is held, if its answer is not
+        fresh yet (see answer_fresh), until a sample arrives which makes it
+        fresh, or until the wait is over, then its answer is handed to
+        reply. In this case, None is returned.
+
+        A question with 'watch' asks whether a value is stable (see
+        watch_answer), held with 'wait', it is answered as soon as the
+        value is stable.
+        """
+        questiondict, codec = {}, get_codec("json")
+        try:
+            command, questiondict, codec = decode_message(msg)
+        except (ValueError, UnicodeDecodeError) as e:
+            # JSONDecodeError is a ValueError
+            command = None
+            answer = dict(
+                ERROR="ERROR",
+                ERROR_message=e.args[0],
+                info="something went wrong when decoding your message",
+                retry=False,
+            )
+        if command == "?":
+            self._logger.debug("received questiondict: %s", questiondict)
+            answer = self.answer_question(questiondict)
+            if questiondict.get("wait") and reply is not None:
+                fresh = self.answer_fresh(questiondict, answer)
+                if not fresh:
+                    wait = min(float(questiondict["wait"]), self.max_wait)
+                    self._waiting.append(
+                        (questiondict, codec, reply, time.monotonic() + wait)
+                    )
+                    return None
+                answer["fresh"] = fresh
+        elif command is not None:
             answer = dict(
                 ERROR="ERROR",
                 ERROR_message="",
@@ -787,61 +1372,432 @@ class zmqDataStore(zmqBare):
                 retry=False,
             )
 
-        answer["uuid"] = questiondict["uuid"]
+        answer["uuid"] = questiondict.get("uuid", "")
         self._logger.debug("sending answer: %s", answer)
-        return dictdump(answer)
+        return encode_message(answer, codec)
+
+    def answer_question(self, qdict):
+        if "watch" in qdict:
+            return self.watch_answer(qdict["watch"])
+        if "prepare" in qdict:
+            return self.prepare_query(qdict)
+        if "handle" in qdict:
+            return self.prepared_answer(qdict["handle"])
+        return self.get_answer(qdict)
+
+    def prepare_query(self, qdict):
+        """register the question of several values under a handle
+
+        qdict: 'prepare': dataindicators as for 'multiple',
+            'live': bool, 'handle': chosen by the asking client
+
+        Questions with only the handle are answered with the values as a
+        list, in the order of the dataindicators, see prepared_answer.
+        """
+        handle = qdict["handle"]
+        indicators = qdict["prepare"]
+        live = qdict.get("live", True)
+        self._prepared.pop(handle, None)
+        while len(self._prepared) >= self.max_prepared:
+            self._prepared.pop(next(iter(self._prepared)))
+        self._prepared[handle] = (
+            {indicator["instr"] for indicator in indicators.values()},
+            self.compile_query(indicators, live),
+        )
+        return dict(handle=handle, names=list(indicators))
+
+    def compile_query(self, indicators, live):
+        """return a function answering the question of the values in
+        indicators, as dict with their 'data' as list
+
+        may be overridden to resolve the values once, here all values are
+        looked up through get_answer
+        """
+        names = list(indicators)
+
+        def answer():
+            adict = self.get_answer(dict(multiple=indicators, live=live))
+            if "ERROR" not in adict:
+                adict["data"] = [adict["data"][name] for name in names]
+            return adict
+
+        return answer
+
+    def prepared_answer(self, handle):
+        """answer a prepared question, or state that the handle is
+        unknown (e.g. after a restart), so that the client prepares it again"""
+        try:
+            _, answer = self._prepared[handle]
+        except KeyError:
+            return dict(handle=handle, unknown=True)
+        adict = answer()
+        adict["handle"] = handle
+        return adict
+
+    def watch_answer(self, watch):
+        """check whether a value is stable, see util_misc.check_stability
+
+        watch: dict of 'instr' and 'value' (key) of the value, its
+            'target', the 'thresholds', 'direction' and 'weak'
+
+        The value is taken as stored, its statistics from the live data,
+        as '<value>_calc_ar_mean', ..., both through get_answer.
+        """
+        answer = self.get_answer(
+            dict(instr=watch["instr"], value=watch["value"], live=False)
+        )
+        if "ERROR" in answer:
+            return answer
+        data = dict(value=answer["data"])
+        if not watch.get("direction"):
+            statistics = self.get_answer(
+                dict(
+                    multiple={
+                        label: dict(instr=watch["instr"], value=watch["value"] + suffix)
+                        for label, suffix in zip(
+                            stability_indicators[1:],
+                            (
+                                "_calc_ar_mean",
+                                "_calc_stderr_rel",
+                                "_calc_slope_rel",
+                                "_calc_slope_residuals",
+                            ),
+                        )
+                    },
+                    live=True,
+                )
+            )
+            if "ERROR" in statistics:
+                return statistics
+            data.update(statistics["data"])
+        stable, stable_values, missing_values = check_stability(
+            data,
+            watch["target"],
+            watch.get("thresholds"),
+            direction=watch.get("direction", 0),
+            weak=watch.get("weak", False),
+        )
+        answer.update(
+            data=data,
+            stable=stable,
+            stable_values=stable_values,
+            missing_values=missing_values,
+        )
+        return answer
+
+    def answer_fresh(self, qdict, answer):
+        """whether answer fulfills a held question: up to date, and if
+        'newer_than' (seconds since the epoch) is given, with data which
+        arrived later, for a watch: stable"""
+        if answer.get("unknown"):
+            # the handle needs to be prepared first, nothing to wait for
+            return True
+        if "ERROR" in answer or not answer.get("uptodate"):
+            return False
+        if "watch" in qdict:
+            return answer["stable"]
+        newer_than = qdict.get("newer_than")
+        return newer_than is None or answer.get("timeseconds", 0) > newer_than
+
+    def _asked_instruments(self, qdict):
+        if "multiple" in qdict:
+            return {indicator["instr"] for indicator in qdict["multiple"].values()}
+        if "watch" in qdict:
+            return {qdict["watch"]["instr"]}
+        if "handle" in qdict:
+            return self._prepared.get(qdict["handle"], (set(),))[0]
+        return {qdict.get("instr")}
+
+    def answer_waiting(self, instruments=None):
+        """answer the held questions which are fresh or due by now
+
+        instruments: set of instruments which got new data, only questions
+            about these are asked again (and those which are due),
+            None for all
+        """
+        now = time.monotonic()
+        waiting = []
+        for held in self._waiting:
+            qdict, codec, reply, deadline = held
+            if (
+                now < deadline
+                and instruments is not None
+                and not self._asked_instruments(qdict) & instruments
+            ):
+                waiting.append(held)
+                continue
+            answer = self.answer_question(qdict)
+            fresh = self.answer_fresh(qdict, answer)
+            if not fresh and now < deadline:
+                waiting.append(held)
+                continue
+            answer["fresh"] = fresh
+            answer["uuid"] = qdict.get("uuid", "")
+            reply(encode_message(answer, codec))
+        self._waiting = waiting
 
     def zmq_handle(self):
         evts = dict(self.poller.poll(zmq.DONTWAIT))
+        stored = set()
         if self.comms_tcp in evts:
-            try:
-                while True:
-                    msg = self.comms_tcp.recv(zmq.NOBLOCK)
-                    answer = self.question_to_self(msg)
-                    self.comms_tcp.send(enc(answer))
-                    self._logger.debug("sent answer")
-                    # do something - most likely hand out data to an asking
-                    # process
-            except zmq.Again:
-                pass
+            self._handle_tcp()
         if self.comms_data in evts:
-            self._logger.debug("handling data evt")
-            try:
-                while True:
-                    address, msg = self.comms_data.recv_multipart(zmq.NOBLOCK)
-                    self._logger.debug("message received: %s, %s", address, msg)
-                    answer = self.question_to_self(msg)
-                    self.comms_data.send_multipart([address, enc(answer)])
-                    self._logger.debug("sent answer to %s", address)
-                    # do something - most likely hand out data to an asking
-                    # process
-            except zmq.Again:
-                pass
+            self._handle_data()
         if self.comms_upstream in evts:
-            try:
-                while True:
-                    msg = self.comms_upstream.recv_multipart(zmq.NOBLOCK)
-                    # print(msg)
-                    self.store_data(dec(msg[0]), dictload(dec(msg[1])))
-                    # store data!
-            except zmq.Again:
-                pass
+            stored = self._handle_upstream()
         if self.comms_downstream in evts:
+            self._handle_downstream()
+        if self._waiting and not self.pipeline_running:
+            self.answer_waiting(stored)
+
+    def _handle_tcp(self, stage=None):
+        try:
+            while True:
+                msg = self.comms_tcp.recv(zmq.NOBLOCK)
+                start = time.monotonic()
+                answer = self.question_to_self(msg, reply=self.comms_tcp.send)
+                if answer is None:
+                    continue
+                self.comms_tcp.send(answer)
+                self._logger.debug("sent answer")
+                if stage is not None:
+                    stage.latency(time.monotonic() - start)
+                # do something - most likely hand out data to an asking
+                # process
+        except zmq.Again:
+            pass
+
+    def _handle_data(self, stage=None):
+        self._logger.debug("handling data evt")
+        start = time.monotonic()
+        questions = 0
+        try:
+            while True:
+                address, msg = self.comms_data.recv_multipart(zmq.NOBLOCK)
+                questions += 1
+                self._logger.debug("message received: %s, %s", address, msg)
+                answer = self.question_to_self(
+                    msg,
+                    reply=functools.partial(self._send_data_answer, address),
+                )
+                if answer is None:
+                    self._logger.debug("holding question of %s", address)
+                    continue
+                self.comms_data.send_multipart([address, answer])
+                self._logger.debug("sent answer to %s", address)
+                if stage is not None:
+                    # questions received together wait for each other
+                    stage.latency(time.monotonic() - start)
+                # do something - most likely hand out data to an asking
+                # process
+        except zmq.Again:
+            pass
+        if stage is not None:
+            stage.depth(questions)
+
+    def _handle_upstream(self, stage=None):
+        """store all received data, returns the IDs which got data"""
+        stored = set()
+        start = time.monotonic()
+        messages = 0
+        try:
+            while True:
+                msg = self.comms_upstream.recv_multipart(zmq.NOBLOCK)
+                # print(msg)
+                if msg[0].startswith(HANDSHAKE_PREFIX):
+                    # probe of a client confirming its connection
+                    continue
+                messages += 1
+                self.store_data(dec(msg[0]), decode_message(msg[1])[1])
+                stored.add(dec(msg[0]))
+                if stage is not None:
+                    stage.latency(time.monotonic() - start)
+                # store data!
+        except zmq.Again:
+            pass
+        if stage is not None:
+            stage.depth(messages)
+        return stored
+
+    def _handle_downstream(self):
+        try:
+            while True:
+                msg = self.comms_downstream.recv_multipart(zmq.NOBLOCK)
+                command_dict = decode_message(msg[1])[1]
+                try:
+                    if "lock" in command_dict:
+                        self.lock.acquire()
+                    elif "unlock" in command_dict:
+                        self.lock.release()
+                except AttributeError as e:
+                    self._logger.exception(e)
+                self.act_on_command(command_dict)
+                # act on commands!
+        except zmq.Again:
+            pass
+
+    def start_pipeline(self):
+        """handle ingest and questions in threads of their own
+
+        The ingest thread stores the data from the upstream, the
+        responder thread answers the questions (comms_data and comms_tcp),
+        and the thread which runs the loop of the dataStore only handles
+        the commands from the downstream, and whatever the subclass does
+        in its loop (e.g. statistics). The ingest thread, and any other
+        thread through notify_responder, tell the responder which
+        instruments got new data, for the held questions.
+
+        The subclass needs to make store_data and get_answer safe for
+        being called from these threads. The queue depths and latencies
+        of the stages are in pipeline_stats, see pipeline_report.
+        """
+        if self.pipeline_running:
+            return
+        for socket in (self.comms_tcp, self.comms_data, self.comms_upstream):
+            self.poller.unregister(socket)
+        self._pipeline_address = f"inproc://{self.comms_name}-pipeline-{id(self)}"
+        self._pipeline_pull = self._zctx.socket(zmq.PULL)
+        self._pipeline_pull.bind(self._pipeline_address)
+        self._pipeline_push = threading.local()
+        self._pipeline_push_sockets = []
+        self._pipeline_push_lock = Lock()
+        self._pipeline_stop = Event()
+        self.pipeline_stats = dict(
+            ingest=StageStats("ingest"), respond=StageStats("respond")
+        )
+        self._pipeline_threads = [
+            Thread(target=loop, name=f"{self.comms_name}_{name}", daemon=True)
+            for name, loop in (
+                ("ingest", self._ingest_loop),
+                ("respond", self._respond_loop),
+            )
+        ]
+        # before the threads start, for notify_responder
+        self.pipeline_running = True
+        for thread in self._pipeline_threads:
+            thread.start()
+        self._logger.info("dataStore pipeline started")
+
+    def stop_pipeline(self):
+        if not self.pipeline_running:
+            return
+        self._pipeline_stop.set()
+        for thread in self._pipeline_threads:
+            thread.join()
+        self.pipeline_running = False
+        with self._pipeline_push_lock:
+            for socket in self._pipeline_push_sockets:
+                socket.close(linger=0)
+            self._pipeline_push_sockets = []
+        self._pipeline_push = threading.local()
+        self._pipeline_pull.close(linger=0)
+        for socket in (self.comms_tcp, self.comms_data, self.comms_upstream):
+            self.poller.register(socket, zmq.POLLIN)
+        self._logger.info("dataStore pipeline stopped")
+
+    def notify_responder(self, instruments=None):
+        """tell the responder which instruments got new data,
+        None for all, from any thread"""
+        if not self.pipeline_running:
+            return
+        push = getattr(self._pipeline_push, "socket", None)
+        if push is None:
+            push = self._pipeline_push.socket = self._zctx.socket(zmq.PUSH)
+            push.connect(self._pipeline_address)
+            # closed by stop_pipeline
+            with self._pipeline_push_lock:
+                self._pipeline_push_sockets.append(push)
+        push.send(enc(dumps(None if instruments is None else list(instruments))))
+
+    def _ingest_loop(self):
+        poller = zmq.Poller()
+        poller.register(self.comms_upstream, zmq.POLLIN)
+        while not self._pipeline_stop.is_set():
+            if not poller.poll(100):
+                continue
             try:
-                while True:
-                    msg = self.comms_downstream.recv_multipart(zmq.NOBLOCK)
-                    command_dict = dictload(dec(msg[1]))
+                stored = self._handle_upstream(self.pipeline_stats["ingest"])
+            except Exception as e:
+                self._logger.exception(e)
+                continue
+            if stored:
+                self.notify_responder(stored)
+
+    def _respond_loop(self):
+        poller = zmq.Poller()
+        for socket in (self.comms_tcp, self.comms_data, self._pipeline_pull):
+            poller.register(socket, zmq.POLLIN)
+        stage = self.pipeline_stats["respond"]
+        while not self._pipeline_stop.is_set():
+            timeout = 0.1
+            if self._waiting:
+                # stay responsive to stop_pipeline while questions are held
+                timeout = min(
+                    min(held[3] for held in self._waiting) - time.monotonic(), 0.1
+                )
+            evts = dict(poller.poll(max(timeout, 0) * 1e3))
+            try:
+                if self.comms_tcp in evts:
+                    self._handle_tcp(stage)
+                if self.comms_data in evts:
+                    self._handle_data(stage)
+                instruments = set()
+                if self._pipeline_pull in evts:
                     try:
-                        if "lock" in command_dict:
-                            self.lock.acquire()
-                        elif "unlock" in command_dict:
-                            self.lock.release()
-                    except AttributeError as e:
-                        self._logger.exception(e)
-                    self.act_on_command(command_dict)
-                    # act on commands!
-            except zmq.Again:
-                pass
+                        while True:
+                            notified = dictload(self._pipeline_pull.recv(zmq.NOBLOCK))
+                            if notified is None or instruments is None:
+                                instruments = None
+                            else:
+                                instruments.update(notified)
+                    except zmq.Again:
+                        pass
+                if self._waiting:
+                    self.answer_waiting(instruments)
+            except Exception as e:
+                self._logger.exception(e)
+
+    def pipeline_report(self):
+        """queue depths and latencies of the pipeline stages since the last
+        report, which are also logged
+
+        returns: dict of dicts of the stages, see StageStats.report
+        """
+        report = {name: stage.report() for name, stage in self.pipeline_stats.items()}
+        report["respond"]["held"] = len(self._waiting)
+        for name, stats in report.items():
+            self._logger.info(
+                "pipeline %s: %d items (%.1f/s), depth mean %.1f max %d, "
+                "latency mean %.2f ms max %.2f ms",
+                name,
+                stats["items"],
+                stats["rate"],
+                stats["depth_mean"],
+                stats["depth_max"],
+                stats["latency_mean_s"] * 1e3,
+                stats["latency_max_s"] * 1e3,
+            )
+        return report
+
+    def zmq_serve(self, timeout):
+        """see zmqBare.zmq_serve, held questions are answered when due,
+        even if no message arrives"""
+        end = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            step = end - now
+            # with the pipeline, the held questions belong to the responder
+            holding = self._waiting and not self.pipeline_running
+            if holding:
+                step = min(step, min(held[3] for held in self._waiting) - now)
+            super().zmq_serve(max(step, 0))
+            if holding:
+                self.answer_waiting(set())
+            if time.monotonic() >= end:
+                break
+
+    def _send_data_answer(self, address, answer):
+        self.comms_data.send_multipart([address, answer])
 
     def store_data(self, ID, data):
         raise NotImplementedError
@@ -23,6 +23,10 @@ setuptools.setup(
         "pymeasure",
         "measureSequences",
     ],
+    extras_require={
+        # for the 'msgpack' codec of the zmq comms
+        "msgpack": ["msgpack"],
+    },
     dependency_links=[
         "https://github.com/bklebel/measureSequences/archive/v0.1.7.tar.gz"
     ],